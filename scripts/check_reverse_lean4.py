@@ -0,0 +1,4 @@
+﻿from _proxy import run
+
+if __name__ == '__main__':
+    run('check_reverse_lean4.py')
@@ -0,0 +1,67 @@
+"""Audit-wide time budget split across steps by estimated cost.
+
+``DeadlineBudget`` holds an absolute deadline and one cost estimate (expected
+seconds) per step. Each time a step starts it gets a slice of whatever time is
+left, proportional to its estimate among the steps that have not started yet,
+but never less than 1.5x its own estimate while that much time remains. With ``lanes``
+steps running in parallel the slice is scaled up accordingly, but it never
+exceeds the remaining time. Slices are computed when the step starts, not
+upfront, so steps that finish early leave more time for the ones after them.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+# Below this many seconds a step cannot do anything useful: treat the budget as spent.
+MIN_SLICE_SECONDS = 1.0
+
+
+class DeadlineBudget:
+    def __init__(
+        self,
+        seconds: float,
+        costs: dict[str, float],
+        lanes: int = 1,
+        min_slice: float = MIN_SLICE_SECONDS,
+    ):
+        self.seconds = float(seconds)
+        self.deadline = time.monotonic() + self.seconds
+        self.lanes = max(1, int(lanes or 1))
+        self.min_slice = float(min_slice)
+        self._pending = {key: max(float(cost or 0), 0.001) for key, cost in costs.items()}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() < self.min_slice
+
+    def allocate(self, key: str) -> float:
+        """Seconds granted to ``key``, which now counts as started. Returns 0 once expired."""
+        with self._lock:
+            remaining = self.remaining()
+            total = sum(self._pending.values())
+            weight = self._pending.pop(key, None)
+            if weight is None:
+                # Unknown or re-run step: give it an average share.
+                weight = total / len(self._pending) if self._pending else 1.0
+                total += weight
+        if remaining < self.min_slice:
+            return 0.0
+        share = remaining * min(1.0, self.lanes * weight / total) if total else remaining
+        return max(self.min_slice, share, min(remaining, 1.5 * weight))
+
+    def discard(self, key: str) -> None:
+        """``key`` finished without running (cache hit, reuse): drop its weight."""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def summary(self) -> dict:
+        return {
+            "seconds": self.seconds,
+            "remaining_seconds": round(self.remaining(), 3),
+            "expired": self.expired(),
+        }
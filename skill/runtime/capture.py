@@ -0,0 +1,94 @@
+"""Bounded output capture with an optional spill-to-disk log.
+
+Long Lean runs (traces, large ``#print`` output) can produce hundreds of MB.
+``BoundedCapture`` keeps only the first and last ``max_bytes / 2`` bytes in
+memory, counts the total, and streams every byte to ``spill_path`` (if given)
+so the full output is still available in the run directory.
+"""
+
+from __future__ import annotations
+
+import collections
+from pathlib import Path
+
+DEFAULT_MAX_OUTPUT_BYTES = 256 * 1024
+
+
+class BoundedCapture:
+    """Head/tail byte buffer plus total count; ``max_bytes <= 0`` keeps everything."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES, spill_path: str | Path | None = None):
+        self.max_bytes = int(max_bytes or 0)
+        self.half = max(1, self.max_bytes // 2)
+        self.head = bytearray()
+        self.tail: collections.deque[bytes] = collections.deque()
+        self.tail_bytes = 0
+        self.total = 0
+        self.spill_path = Path(spill_path) if spill_path else None
+        self._spill = None
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.total += len(chunk)
+        self._write_spill(chunk)
+        if self.max_bytes <= 0:
+            self.head += chunk
+            return
+        room = self.half - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if not chunk:
+            return
+        self.tail.append(chunk)
+        self.tail_bytes += len(chunk)
+        while self.tail and self.tail_bytes - len(self.tail[0]) >= self.half:
+            self.tail_bytes -= len(self.tail.popleft())
+
+    def _write_spill(self, chunk: bytes) -> None:
+        if self.spill_path is None:
+            return
+        try:
+            if self._spill is None:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                self._spill = open(self.spill_path, "wb")
+            self._spill.write(chunk)
+        except OSError:
+            # A full disk must not fail the verification itself; keep the in-memory view.
+            self.spill_path = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + min(self.tail_bytes, self.half)
+
+    def text(self) -> str:
+        tail = b"".join(self.tail)[-self.half:] if self.tail else b""
+        dropped = self.total - len(self.head) - len(tail)
+        out = bytes(self.head)
+        if dropped > 0:
+            hint = f", full log: {self.spill_path}" if self.spill_path else ""
+            out += f"\n... [{dropped} bytes omitted{hint}] ...\n".encode("utf-8")
+        return (out + tail).decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        if self._spill is not None:
+            try:
+                self._spill.close()
+            except OSError:
+                pass
+            self._spill = None
+        if self.spill_path is not None and self.total == 0:
+            # Nothing was written; still leave an (empty) log so callers can rely on the path.
+            try:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                self.spill_path.touch()
+            except OSError:
+                self.spill_path = None
+
+    def summary(self) -> dict:
+        return {
+            "output_bytes": self.total,
+            "output_truncated": self.truncated,
+            "output_log": str(self.spill_path) if self.spill_path else None,
+        }
@@ -116,9 +116,16 @@ def default_config() -> dict:
     return {
         "skill": {"name": "mathprove", "version": "3.0.0"},
         "workspace_dir": "../mathprove_workspace/",
+        "cache": {"enabled": True, "max_mb": 256, "lean_env": True, "timings": True},
         "paths": {"python": "python", "lean": "lean", "lake": "lake"},
         "routes": {
-            "sympy": {"enabled": True, "python": "python", "timeout_seconds": 20},
+            "sympy": {
+                "enabled": True,
+                "python": "python",
+                "timeout_seconds": 20,
+                "memory_limit_mb": 4096,
+                "cpu_limit_seconds": 0,
+            },
             "lean": {
                 "enabled": True,
                 "lean_cmd": "lean",
@@ -127,7 +134,13 @@ def default_config() -> dict:
                 "watchdog_no_output_seconds": 30,
                 "static_precheck": True,
                 "require_mathlib": True,
+                "repl_workers": 1,
+                "repl_worker_memory_mb": 6144,
+                "repl_memory_budget_mb": 0,
+                "memory_limit_mb": 12288,
+                "cpu_limit_seconds": 0,
             },
+            "hybrid": {"policy": "both"},
             "web": {"enabled": False, "provider": None},
             "subagent": {
                 "enabled": False,
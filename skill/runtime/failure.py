@@ -0,0 +1,107 @@
+"""Classify checker failures so that only the retryable ones are retried.
+
+Three classes:
+
+- ``deterministic``: the same input fails the same way again (``SyntaxError``,
+  ``AssertionError``, a Lean type error, ``sorry``, a malformed checker).
+  Retrying only multiplies the cost of a failing step.
+- ``transient``: timeouts, resource-limit kills, crashed workers / REPLs,
+  processes killed by a signal. A retry may pass.
+- ``environment``: missing interpreter, toolchain or package (``NotFound``,
+  ``ModuleNotFoundError``, ``unknown package 'Mathlib'``). Retrying cannot
+  help; the setup has to be fixed.
+
+``classify_failure`` works on the result dicts produced by ``verify_sympy``,
+``lean_repl_client`` and ``final_audit`` (``error_type`` + stdout/stderr),
+falling back to a few text patterns when no ``error_type`` is available.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+DETERMINISTIC = "deterministic"
+TRANSIENT = "transient"
+ENVIRONMENT = "environment"
+
+DEFAULT_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+_BY_ERROR_TYPE = {
+    "Timeout": TRANSIENT,
+    "ResourceLimit": TRANSIENT,
+    "NotFound": ENVIRONMENT,
+    "LeanError": DETERMINISTIC,
+    "LeanSorry": DETERMINISTIC,
+    "ReplError": DETERMINISTIC,
+    "ValueError": DETERMINISTIC,
+}
+
+_ENVIRONMENT_RE = re.compile(
+    r"ModuleNotFoundError|No module named|unknown package|unknown module prefix|object file .* does not exist"
+    r"|command not found|No such file or directory|could not find .*toolchain",
+)
+# Python exceptions that say nothing about the checked statement itself.
+_TRANSIENT_EXCEPTIONS = {"MemoryError", "BrokenPipeError", "ConnectionResetError", "OSError"}
+_EXCEPTION_RE = re.compile(r"^(\w+(?:\.\w+)*(?:Error|Exception|Interrupt|Exit)|AssertionError)\b", re.M)
+_LEAN_ERROR_RE = re.compile(r"(?m)(?::\d+:\d+: error|^error):")
+
+
+def _text(result: dict) -> str:
+    return "\n".join(str(result.get(k) or "") for k in ("stderr", "stdout", "message", "error"))
+
+
+def _last_exception(text: str) -> str | None:
+    # `python -` reports a SyntaxError without a "Traceback" header, so look at the exception lines only.
+    names = _EXCEPTION_RE.findall(text)
+    return names[-1].rsplit(".", 1)[-1] if names else None
+
+
+def classify_failure(result: Any) -> str | None:
+    """Class of a failed checker result, or None if ``result`` is a success."""
+    if not isinstance(result, dict):
+        return TRANSIENT
+    if result.get("status") == "success":
+        return None
+    if result.get("failure_class"):
+        return str(result["failure_class"])
+    if "static_lint" in result:
+        return DETERMINISTIC
+
+    text = _text(result)
+    error_type = result.get("error_type")
+    if error_type in _BY_ERROR_TYPE:
+        kind = _BY_ERROR_TYPE[error_type]
+        # A REPL that cannot load its imports is a setup problem, not a bad proof.
+        return ENVIRONMENT if kind == DETERMINISTIC and _ENVIRONMENT_RE.search(text) else kind
+    if _ENVIRONMENT_RE.search(text):
+        return ENVIRONMENT
+
+    returncode = result.get("returncode")
+    if returncode == 127:
+        return ENVIRONMENT
+    if isinstance(returncode, int) and returncode < 0:
+        # Killed by a signal (OOM killer, SIGKILL from outside).
+        return TRANSIENT
+    exception = _last_exception(text)
+    if exception is not None:
+        return TRANSIENT if exception in _TRANSIENT_EXCEPTIONS else DETERMINISTIC
+    if _LEAN_ERROR_RE.search(text):
+        return DETERMINISTIC
+    if error_type is None and returncode is None:
+        # Checker-level problems reported by final_audit itself (missing code, ...).
+        return DETERMINISTIC
+    # Non-zero exit without a traceback or a Lean error: the worker / REPL crashed.
+    return TRANSIENT
+
+
+def should_retry(failure_class: str | None) -> bool:
+    return failure_class == TRANSIENT
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BACKOFF_SECONDS, cap: float = MAX_BACKOFF_SECONDS) -> float:
+    """Exponential backoff before retry number ``attempt`` (1-based): base, 2*base, 4*base, ..."""
+    if base <= 0:
+        return 0.0
+    return min(cap, base * 2 ** max(0, attempt - 1))
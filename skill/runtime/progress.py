@@ -0,0 +1,77 @@
+"""Line-delimited JSON progress events for long audits.
+
+``ProgressStream`` writes one compact JSON object per line and flushes it
+immediately, so a dashboard (``tail -f``, a FIFO reader, a pipe) sees each
+event as it happens. ``"-"`` means stdout; any other target is opened for
+writing (opening a FIFO blocks until a reader attaches). Every event carries
+``ts`` (Unix time) and ``elapsed`` (seconds since the stream was opened).
+
+Emitting is thread-safe. If the reader goes away (``BrokenPipeError``) the
+stream silently stops writing: losing the progress feed must not abort the
+audit itself.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from typing import IO, Any
+
+
+class ProgressStream:
+    def __init__(self, target: str | None):
+        self.target = target
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._fp: IO[str] | None = None
+        self._owned = False
+        if target == "-":
+            self._fp = sys.stdout
+        elif target:
+            self._fp = open(target, "w", encoding="utf-8", buffering=1)
+            self._owned = True
+
+    @property
+    def enabled(self) -> bool:
+        return self._fp is not None
+
+    @property
+    def to_stdout(self) -> bool:
+        return self.target == "-"
+
+    def emit(self, event: str, **fields: Any) -> None:
+        if self._fp is None:
+            return
+        record = {
+            "event": event,
+            "ts": round(time.time(), 3),
+            "elapsed": round(time.monotonic() - self._started, 3),
+            **fields,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._fp is None:
+                return
+            try:
+                self._fp.write(line + "\n")
+                self._fp.flush()
+            except (BrokenPipeError, ValueError):
+                # Reader gone (or file closed underneath us): stop streaming, keep auditing.
+                self._fp = None
+
+    def close(self) -> None:
+        with self._lock:
+            fp, self._fp = self._fp, None
+        if fp is not None and self._owned:
+            try:
+                fp.close()
+            except OSError:
+                pass
+
+    def __enter__(self) -> "ProgressStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
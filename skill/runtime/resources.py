@@ -0,0 +1,296 @@
+"""Host resource helpers: worker-pool sizing and process-tree budgets.
+
+``tree_usage`` samples the RSS and CPU time of a process together with its
+descendants (psutil when installed, ``/proc`` otherwise); ``ResourceMonitor``
+does that periodically for long-lived workers and calls back when a memory or
+CPU budget is exceeded. The asyncio supervisor uses ``tree_usage`` directly.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+DEFAULT_SAMPLE_INTERVAL = 0.2
+
+try:  # pragma: no cover - exercised only when psutil is installed
+    import psutil  # type: ignore
+except Exception:  # noqa: BLE001
+    psutil = None
+
+
+def total_memory_mb() -> int | None:
+    """Physical memory in MiB, or None when it cannot be determined."""
+    if psutil is not None:
+        try:
+            return int(psutil.virtual_memory().total // (1024 * 1024))
+        except Exception:  # noqa: BLE001
+            pass
+    try:
+        pages = os.sysconf("SC_PHYS_PAGES")
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        if pages > 0 and page_size > 0:
+            return int(pages * page_size // (1024 * 1024))
+    except (AttributeError, ValueError, OSError):
+        pass
+    return None
+
+
+def plan_workers(requested: int, memory_per_worker_mb: int = 0, memory_budget_mb: int = 0) -> int:
+    """Cap ``requested`` workers so that workers * per-worker memory fits the budget.
+
+    A zero budget means "80% of physical memory"; a zero per-worker figure
+    disables the cap. Always returns at least one worker.
+    """
+    workers = max(1, int(requested or 1))
+    if not memory_per_worker_mb:
+        return workers
+    budget = int(memory_budget_mb or 0)
+    if not budget:
+        total = total_memory_mb()
+        if not total:
+            return workers
+        budget = int(total * 0.8)
+    return max(1, min(workers, budget // int(memory_per_worker_mb)))
+
+
+def route_limits(route_cfg: dict | None) -> dict:
+    """``memory_limit_mb`` / ``cpu_limit_seconds`` from a ``routes.<name>`` config block (0 = off)."""
+    cfg = route_cfg or {}
+    return {
+        "memory_limit_mb": float(cfg.get("memory_limit_mb") or 0),
+        "cpu_limit_seconds": float(cfg.get("cpu_limit_seconds") or 0),
+    }
+
+
+def _parse_stat(raw: str, ticks: int, page: int) -> tuple[int, int, float, float, int] | None:
+    """(ppid, pgrp, user, system, rss_bytes) from the text of /proc/<pid>/stat."""
+    # The command name may contain spaces/parens: split after the last ')'.
+    fields = raw[raw.rfind(")") + 2 :].split()
+    try:
+        ppid, pgrp = int(fields[1]), int(fields[2])
+        # utime + cutime / stime + cstime: reaped children count towards their parent.
+        user = (int(fields[11]) + int(fields[13])) / ticks
+        system = (int(fields[12]) + int(fields[14])) / ticks
+        rss = int(fields[21]) * page
+    except (IndexError, ValueError):
+        return None
+    return ppid, pgrp, user, system, rss
+
+
+def _read_stat(pid: int, ticks: int, page: int) -> tuple[int, int, float, float, int] | None:
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as fp:
+            raw = fp.read().decode("ascii", "replace")
+    except OSError:
+        return None
+    return _parse_stat(raw, ticks, page)
+
+
+def _proc_children(pid: int) -> list[int] | None:
+    """Direct children of ``pid`` from /proc/<pid>/task/*/children, or None if the kernel lacks that file."""
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return []
+    children: list[int] = []
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "rb") as fp:
+                children.extend(int(c) for c in fp.read().split())
+        except FileNotFoundError:
+            # CONFIG_PROC_CHILDREN is off (or the thread just exited): tell the caller to scan.
+            if os.path.isdir(f"/proc/{pid}/task/{tid}"):
+                return None
+        except (OSError, ValueError):
+            continue
+    return children
+
+
+def _proc_table() -> dict[int, tuple[int, int, float, float, int]]:
+    """pid -> (ppid, pgrp, user, system, rss_bytes) for every process in /proc."""
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    table = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        row = _read_stat(int(name), ticks, page)
+        if row is not None:
+            table[int(name)] = row
+    return table
+
+
+def _proc_tree(pid: int) -> dict[int, tuple[int, int, float, float, int]] | None:
+    """``_proc_table`` restricted to ``pid`` and its descendants.
+
+    Walks the tree through the children files, so the cost follows the size of
+    the supervised tree rather than the number of processes on the host; only
+    kernels without those files fall back to scanning all of /proc.
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    table = {}
+    todo = [pid]
+    while todo:
+        cur = todo.pop()
+        if cur in table:
+            continue
+        row = _read_stat(cur, ticks, page)
+        if row is None:
+            continue
+        children = _proc_children(cur)
+        if children is None:
+            return _proc_table()
+        table[cur] = row
+        todo.extend(children)
+    return table
+
+
+def tree_usage(pid: int) -> dict | None:
+    """Current RSS (bytes) and user/system CPU seconds of ``pid`` plus its descendants.
+
+    Returns None when the process is gone or the platform offers no way to
+    measure it (no psutil and no /proc).
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except Exception:  # noqa: BLE001
+            return None
+        rss = user = system = 0.0
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    rss += proc.memory_info().rss
+                    times = proc.cpu_times()
+            except Exception:  # noqa: BLE001
+                continue
+            user += times.user + getattr(times, "children_user", 0.0)
+            system += times.system + getattr(times, "children_system", 0.0)
+        return {"rss": int(rss), "user": user, "system": system}
+    if not os.path.isdir("/proc"):
+        return None
+    try:
+        table = _proc_tree(pid)
+    except (OSError, ValueError):
+        return None
+    if not table or pid not in table:
+        return None
+    children: dict[int, list[int]] = {}
+    for child, row in table.items():
+        children.setdefault(row[0], []).append(child)
+    rss = user = system = 0.0
+    todo = [pid]
+    seen = set()
+    while todo:
+        cur = todo.pop()
+        if cur in seen or cur not in table:
+            continue
+        seen.add(cur)
+        _, _, u, s, r = table[cur]
+        user += u
+        system += s
+        rss += r
+        todo.extend(children.get(cur, ()))
+    return {"rss": int(rss), "user": user, "system": system}
+
+
+class UsageTracker:
+    """Fold successive ``tree_usage`` samples into a per-step resource record.
+
+    After ``baseline(pid)`` CPU is reported relative to that sample (long-lived
+    workers), so each step only pays for its own work; RSS is always absolute.
+    """
+
+    def __init__(self, memory_limit_mb: float = 0, cpu_limit_seconds: float = 0):
+        self.memory_limit_mb = float(memory_limit_mb or 0)
+        self.cpu_limit_seconds = float(cpu_limit_seconds or 0)
+        self.started = time.monotonic()
+        self.peak_rss = 0
+        self.user = 0.0
+        self.system = 0.0
+        self._base: tuple[float, float] | None = None
+        self.exceeded: str | None = None
+
+    def baseline(self, pid: int) -> None:
+        usage = tree_usage(pid)
+        if usage is not None:
+            self._base = (usage["user"], usage["system"])
+
+    def update(self, usage: dict | None) -> str | None:
+        """Record one sample; return "memory"/"cpu" the first time a budget is exceeded."""
+        if usage is None:
+            return None
+        base_user, base_system = self._base or (0.0, 0.0)
+        self.peak_rss = max(self.peak_rss, usage["rss"])
+        self.user = max(self.user, usage["user"] - base_user)
+        self.system = max(self.system, usage["system"] - base_system)
+        if self.exceeded is None:
+            if self.memory_limit_mb and usage["rss"] > self.memory_limit_mb * 1024 * 1024:
+                self.exceeded = "memory"
+                return self.exceeded
+            if self.cpu_limit_seconds and self.user + self.system > self.cpu_limit_seconds:
+                self.exceeded = "cpu"
+                return self.exceeded
+        return None
+
+    def describe(self) -> str:
+        if self.exceeded == "memory":
+            return f"memory budget exceeded (peak {self.peak_rss / 1048576:.0f} MiB > {self.memory_limit_mb:g} MiB)"
+        if self.exceeded == "cpu":
+            return f"CPU budget exceeded ({self.user + self.system:.1f}s > {self.cpu_limit_seconds:g}s)"
+        return ""
+
+    def summary(self) -> dict:
+        return {
+            "peak_rss_mb": round(self.peak_rss / 1048576, 1),
+            "user_cpu_seconds": round(self.user, 3),
+            "sys_cpu_seconds": round(self.system, 3),
+            "wall_seconds": round(time.monotonic() - self.started, 4),
+            "limit_exceeded": self.exceeded,
+        }
+
+
+class ResourceMonitor:
+    """Sample a (long-lived) process tree in a background thread for the duration of a step.
+
+    ``on_exceed(kind)`` is called once, from the monitor thread, when a budget
+    is exceeded; callers typically kill the worker there.
+    """
+
+    def __init__(
+        self,
+        pid: int,
+        memory_limit_mb: float = 0,
+        cpu_limit_seconds: float = 0,
+        on_exceed=None,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        self.pid = pid
+        self.tracker = UsageTracker(memory_limit_mb, cpu_limit_seconds)
+        self.tracker.baseline(pid)
+        self.on_exceed = on_exceed
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="mathprove-resource-monitor", daemon=True)
+
+    def _loop(self) -> None:
+        while True:
+            kind = self.tracker.update(tree_usage(self.pid))
+            if kind and self.on_exceed is not None:
+                self.on_exceed(kind)
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "ResourceMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join(timeout=self.interval * 5 + 1)
+        # One last sample so short steps still report something.
+        self.tracker.update(tree_usage(self.pid))
@@ -0,0 +1,164 @@
+"""Content-addressed cache of passed verification results.
+
+Entries live under ``<workspace>/cache/results`` so every run in the workspace
+can reuse them. Each entry is a small JSON file named after the SHA-256 of its
+key material; the file mtime doubles as the LRU clock (hits touch the file) and
+eviction removes the least recently used entries once the total size exceeds
+``max_bytes``. ``put`` keeps a running size total (one scan on first use) and
+only scans and evicts when a write takes it over the limit; entries written
+by other processes are picked up by the next full ``evict()``, which callers
+run once at the end of an audit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+_DEFAULT_MAX_MB = 256
+
+
+def fingerprint(*parts: Any) -> str:
+    """Hash JSON-serialisable ``parts`` into a stable hex digest."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        else:
+            data = json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def file_digest(path: str | Path | None) -> str:
+    """SHA-256 of a file's content, or ``""`` if it cannot be read."""
+    if not path:
+        return ""
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return ""
+
+
+class ResultCache:
+    """LRU-bounded on-disk map from content hash to a JSON result."""
+
+    def __init__(self, root: str | Path, max_bytes: int = _DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._size: int | None = None
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("key") != key:
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry.get("result")
+
+    def put(self, key: str, result: dict) -> None:
+        path = self._path(key)
+        entry = {"key": key, "created": time.time(), "result": result}
+        tmp = None
+        try:
+            old_size = path.stat().st_size if path.exists() else 0
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename keeps concurrent readers (other runs) from
+            # ever seeing a half-written entry.
+            fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(entry, fh, ensure_ascii=False)
+            new_size = os.stat(tmp).st_size
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError):
+            # e.g. a result that is not JSON-serialisable: do not leave the partial file behind.
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += new_size - old_size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def entries(self) -> list[tuple[float, int, Path]]:
+        out: list[tuple[float, int, Path]] = []
+        if not self.root.is_dir():
+            return out
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        """Drop least recently used entries until under ``max_bytes``."""
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._size = total
+            return removed
+
+    def clear(self) -> int:
+        removed = 0
+        for _, _, path in self.entries():
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect or prune the verification result cache")
+    parser.add_argument("root", help="cache directory (e.g. <workspace>/cache/results)")
+    parser.add_argument("--max-mb", type=int, default=_DEFAULT_MAX_MB, help="size limit in MB")
+    parser.add_argument("--clear", action="store_true", help="remove all entries")
+    args = parser.parse_args()
+    cache = ResultCache(args.root, max_bytes=args.max_mb * 1024 * 1024)
+    removed = cache.clear() if args.clear else cache.evict()
+    print(json.dumps({"root": str(cache.root), "entries": len(cache.entries()), "bytes": cache.size(), "removed": removed}))
+
+
+if __name__ == "__main__":
+    main()
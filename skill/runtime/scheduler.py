@@ -0,0 +1,124 @@
+"""Dependency-aware concurrent scheduler for audit steps.
+
+Items run as soon as all of their dependencies have passed, subject to a
+global concurrency limit and optional per-engine caps. Results are returned
+aligned with the input order, so reports stay deterministic no matter in which
+order work actually finished.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+from typing import Any, Callable, Iterable
+
+
+def run_dag(
+    items: list[Any],
+    run: Callable[[Any], dict],
+    *,
+    key: Callable[[Any], str],
+    deps: Callable[[Any], Iterable[str]],
+    engine: Callable[[Any], str],
+    skip: Callable[[Any, list[str], str], dict],
+    jobs: int = 1,
+    limits: dict[str, int] | None = None,
+    passed: Callable[[dict], bool] = lambda r: r.get("status") == "passed",
+    stop: Callable[[], str | None] | None = None,
+    priority: Callable[[Any], Any] | None = None,
+) -> list[dict]:
+    """Run ``items`` respecting ``deps`` and concurrency limits.
+
+    ``skip(item, blockers, reason)`` builds the result for items that never
+    run; ``reason`` is one of ``unknown_dependency``, ``dependency_failed``,
+    ``dependency_cycle`` or whatever ``stop`` returned. Ready items are
+    started in ascending ``priority(item)`` order (input order by default, and
+    for ties); results are still returned in input order.
+
+    ``stop()`` is checked before every launch round; once it returns a reason
+    (e.g. ``budget_exhausted``) nothing new is started, every item that has not
+    been launched yet is skipped with that reason, and in-flight items are
+    waited for (cancelling them is the caller's business).
+    """
+    n = len(items)
+    jobs = max(1, int(jobs or 1))
+    limits = {k: int(v) for k, v in (limits or {}).items() if v}
+    results: list[dict | None] = [None] * n
+
+    index: dict[str, int] = {}
+    for i, item in enumerate(items):
+        index.setdefault(key(item), i)
+
+    waiting_on: list[set[int]] = [set() for _ in range(n)]
+    dependents: list[list[int]] = [[] for _ in range(n)]
+    invalid: list[int] = []
+    for i, item in enumerate(items):
+        missing = []
+        for dep in deps(item) or []:
+            j = index.get(str(dep))
+            if j is None or j == i:
+                missing.append(str(dep))
+                continue
+            waiting_on[i].add(j)
+            dependents[j].append(i)
+        if missing:
+            results[i] = skip(item, missing, "unknown_dependency")
+            invalid.append(i)
+
+    def settle(i: int, ok: bool) -> None:
+        stack = [(i, ok)]
+        while stack:
+            cur, cur_ok = stack.pop()
+            for k in dependents[cur]:
+                if results[k] is not None:
+                    continue
+                if cur_ok:
+                    waiting_on[k].discard(cur)
+                else:
+                    results[k] = skip(items[k], [key(items[cur])], "dependency_failed")
+                    stack.append((k, False))
+
+    for i in invalid:
+        settle(i, False)
+
+    sequence = list(range(n))
+    if priority is not None:
+        sequence.sort(key=lambda i: (priority(items[i]), i))
+
+    launched: set[int] = set()
+    in_flight: collections.Counter[str] = collections.Counter()
+    running: dict[concurrent.futures.Future, int] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            reason = stop() if stop is not None else None
+            if reason:
+                for i in range(n):
+                    if results[i] is None and i not in launched:
+                        results[i] = skip(items[i], [], reason)
+            for i in sequence:
+                if len(running) >= jobs:
+                    break
+                if results[i] is not None or i in launched or waiting_on[i]:
+                    continue
+                eng = engine(items[i])
+                cap = limits.get(eng)
+                if cap and in_flight[eng] >= cap:
+                    continue
+                launched.add(i)
+                in_flight[eng] += 1
+                running[executor.submit(run, items[i])] = i
+            if not running:
+                break
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                in_flight[engine(items[i])] -= 1
+                result = future.result()
+                results[i] = result
+                settle(i, passed(result))
+
+    for i in range(n):
+        if results[i] is None:
+            blockers = sorted(key(items[j]) for j in waiting_on[i])
+            results[i] = skip(items[i], blockers, "dependency_cycle")
+    return [r for r in results if r is not None]
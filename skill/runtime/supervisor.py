@@ -0,0 +1,391 @@
+"""Event-driven subprocess supervision shared by the Lean file mode and the watchdog.
+
+All supervised processes run on one background asyncio loop. Each one is a
+coroutine that waits on "more output", "process exited" and "deadline reached"
+together, so there is no polling loop and no reader thread per process. On a
+timeout the process group gets SIGTERM; the supervisor waits for the exit up to
+``grace`` seconds and only then sends SIGKILL, and it records how long that
+took (``kill_seconds``) instead of sleeping a fixed grace period.
+
+When a ``memory_limit_mb`` / ``cpu_limit_seconds`` budget is set (or
+``record_usage`` asks for it) a sampler task watches the process tree's RSS
+and CPU time alongside, kills the tree when a budget is exceeded, and reports
+the peak usage in ``resources``. Without either, nothing is sampled.
+
+``supervise`` is the coroutine (usable from async code); ``run_supervised`` is
+the blocking wrapper that submits it to the shared loop from any thread, and
+``run_on_loop`` does the same for any coroutine built on top of it.
+``CancelScope`` groups such blocking calls from many threads so they can all
+be cancelled at once (which terminates their process groups); ``AbortGroup``
+does the same for thread-based workers (REPL sessions, SymPy pool workers).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import os
+import signal
+import threading
+import time
+from typing import Any
+
+try:
+    from .capture import DEFAULT_MAX_OUTPUT_BYTES, BoundedCapture
+    from .resources import DEFAULT_SAMPLE_INTERVAL, UsageTracker, tree_usage
+except ImportError:  # pragma: no cover - executed as a script
+    from capture import DEFAULT_MAX_OUTPUT_BYTES, BoundedCapture
+    from resources import DEFAULT_SAMPLE_INTERVAL, UsageTracker, tree_usage
+
+DEFAULT_GRACE_SECONDS = 1.0
+_READ_CHUNK = 64 * 1024
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    # Lake spawns lean as a child: signal the whole group so nothing keeps the pipe open.
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, sig)
+        elif sig == signal.SIGTERM:  # pragma: no cover - Windows
+            proc.terminate()
+        else:  # pragma: no cover - Windows
+            proc.kill()
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+async def _terminate(proc: asyncio.subprocess.Process, grace: float) -> tuple[float, str]:
+    """SIGTERM, wait up to ``grace`` seconds, then SIGKILL; return (seconds, signal used)."""
+    started = time.perf_counter()
+    how = "terminate"
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), timeout=max(0.0, grace))
+    except asyncio.TimeoutError:
+        how = "kill"
+        _signal_group(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+        await proc.wait()
+    return round(time.perf_counter() - started, 4), how
+
+
+async def supervise(
+    cmd: list[str],
+    *,
+    cwd: str | None = None,
+    timeout: float = 0,
+    no_output_timeout: float = 0,
+    grace: float = DEFAULT_GRACE_SECONDS,
+    env: dict | None = None,
+    input: str | bytes | None = None,
+    merge_stderr: bool = True,
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+    output_log: str | None = None,
+    memory_limit_mb: float = 0,
+    cpu_limit_seconds: float = 0,
+    sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    record_usage: bool = False,
+) -> dict[str, Any]:
+    """Run ``cmd`` and return a result dict.
+
+    Keys: ``returncode`` (None if it could not be started), ``output`` (text),
+    ``output_bytes``, ``seconds``, ``timeout`` (None / ``"total"`` /
+    ``"no_output"``), ``kill_seconds`` and ``killed`` (None / ``"terminate"`` /
+    ``"kill"``). Only non-blank output resets the ``no_output_timeout`` clock.
+    ``input`` is written to stdin (then closed). With ``merge_stderr=False``
+    stderr is captured separately into ``stderr`` instead of ``output``.
+
+    Output is held in a :class:`BoundedCapture` (head + tail of
+    ``max_output_bytes``, ``0`` = unbounded); ``output_log`` receives the full
+    stream. ``output_truncated`` / ``output_log`` report what happened.
+
+    ``resources`` holds the sampled peak RSS, user/system CPU and wall time of
+    the process tree; ``limit_exceeded`` is None / ``"memory"`` / ``"cpu"``
+    when a budget (0 = none) got the tree killed. The tree is only sampled
+    when a budget is set or ``record_usage`` is true; otherwise ``resources``
+    carries the wall time and zero RSS/CPU.
+    """
+    started = time.monotonic()
+    result: dict[str, Any] = {
+        "returncode": None,
+        "output": "",
+        "output_bytes": 0,
+        "seconds": 0.0,
+        "timeout": None,
+        "kill_seconds": None,
+        "killed": None,
+        "output_truncated": False,
+        "output_log": None,
+        "limit_exceeded": None,
+    }
+    tracker = UsageTracker(memory_limit_mb, cpu_limit_seconds)
+    result["resources"] = tracker.summary()
+    if not merge_stderr:
+        result["stderr"] = ""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=cwd,
+            env=env,
+            stdin=asyncio.subprocess.DEVNULL if input is None else asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT if merge_stderr else asyncio.subprocess.PIPE,
+            start_new_session=os.name == "posix",
+        )
+    except (FileNotFoundError, PermissionError) as exc:
+        result["output"] = str(exc)
+        result["error"] = type(exc).__name__
+        return result
+
+    helpers = []
+    if input is not None:
+        helpers.append(asyncio.ensure_future(_feed(proc, input)))
+    errors = BoundedCapture(max_output_bytes)
+    if not merge_stderr:
+        helpers.append(asyncio.ensure_future(_drain(proc.stderr, errors)))
+    capture = BoundedCapture(max_output_bytes, output_log)
+    sampler = None
+    if memory_limit_mb or cpu_limit_seconds or record_usage:
+        sampler = asyncio.ensure_future(_sample(proc, tracker, grace, sample_interval, result))
+    deadline = started + timeout if timeout else None
+    last_output = started
+    reason = None
+    assert proc.stdout is not None
+    try:
+        while True:
+            now = time.monotonic()
+            waits = []
+            if deadline is not None:
+                waits.append((deadline - now, "total"))
+            if no_output_timeout:
+                waits.append((last_output + no_output_timeout - now, "no_output"))
+            wait, why = min(waits) if waits else (None, None)
+            if wait is not None and wait <= 0:
+                reason = why
+                break
+            try:
+                chunk = await asyncio.wait_for(proc.stdout.read(_READ_CHUNK), timeout=wait)
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                break
+            capture.feed(chunk)
+            if chunk.strip():
+                last_output = time.monotonic()
+        if reason is None:
+            # stdout closed; a child that detached from the pipe may still be running.
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                reason = "total"
+        if sampler is not None and tracker.exceeded is not None:
+            # The sampler is already terminating the tree; let it record how long that took.
+            await sampler
+        elif reason is not None:
+            result["kill_seconds"], result["killed"] = await _terminate(proc, grace)
+        if helpers:
+            # The process is gone; give the stderr reader a moment to hit EOF.
+            await asyncio.wait(helpers, timeout=1.0)
+    except asyncio.CancelledError:
+        await _terminate(proc, grace)
+        raise
+    finally:
+        if sampler is not None:
+            if not sampler.done():
+                sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+        for task in helpers:
+            if not task.done():
+                task.cancel()
+        if helpers:
+            await asyncio.gather(*helpers, return_exceptions=True)
+        capture.close()
+
+    if not merge_stderr:
+        result["stderr"] = errors.text()
+    result.update(capture.summary())
+    result.update(
+        {
+            "returncode": proc.returncode,
+            "output": capture.text(),
+            "seconds": round(time.monotonic() - started, 4),
+            "timeout": reason,
+            "limit_exceeded": tracker.exceeded,
+            "resources": tracker.summary(),
+        }
+    )
+    if tracker.exceeded is not None:
+        result["limit_message"] = tracker.describe()
+    return result
+
+
+async def _sample(
+    proc: asyncio.subprocess.Process, tracker: UsageTracker, grace: float, interval: float, result: dict
+) -> None:
+    """Sample the tree until it exits; terminate it when a budget is exceeded."""
+    while proc.returncode is None:
+        if tracker.update(tree_usage(proc.pid)):
+            result["kill_seconds"], result["killed"] = await _terminate(proc, grace)
+            return
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=max(0.01, interval))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _feed(proc: asyncio.subprocess.Process, data: str | bytes) -> None:
+    assert proc.stdin is not None
+    try:
+        proc.stdin.write(data.encode("utf-8") if isinstance(data, str) else data)
+        await proc.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        proc.stdin.close()
+
+
+async def _drain(stream: asyncio.StreamReader | None, sink: BoundedCapture) -> None:
+    if stream is None:
+        return
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            return
+        sink.feed(chunk)
+
+
+def _shared_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="mathprove-supervisor", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run_on_loop(coro: Any) -> Any:
+    """Run ``coro`` on the shared supervisor loop and block until it finishes."""
+    future = asyncio.run_coroutine_threadsafe(coro, _shared_loop())
+    try:
+        return future.result()
+    except BaseException:
+        # e.g. KeyboardInterrupt in the caller: cancelling kills the process group.
+        future.cancel()
+        raise
+
+
+def run_supervised(cmd: list[str], **kwargs: Any) -> dict[str, Any]:
+    """Blocking wrapper: run :func:`supervise` on the shared loop and wait for it."""
+    return run_on_loop(supervise(cmd, **kwargs))
+
+
+class CancelScope:
+    """Run coroutines on the shared loop from several threads and cancel them together.
+
+    ``run`` blocks like :func:`run_on_loop`; after ``cancel()`` every pending
+    and future ``run`` raises ``concurrent.futures.CancelledError``. Pending
+    calls only return once their coroutine has handled the cancellation (for
+    ``supervise``: once the process group is gone), so nothing outlives the
+    scope's callers.
+
+    ``child()`` makes a scope that can be cancelled on its own (e.g. one engine
+    of a hybrid check) but is also cancelled with its parent; ``close()``
+    detaches it again. ``wait(seconds)`` sleeps (e.g. a retry backoff) but wakes
+    up early, returning True, when the scope is cancelled.
+    """
+
+    def __init__(self, parent: "CancelScope | None" = None) -> None:
+        self._lock = threading.Lock()
+        self._running: dict[concurrent.futures.Future, list] = {}
+        self._children: set[CancelScope] = set()
+        self._parent = parent
+        self._event = threading.Event()
+        self.cancelled = False
+
+    def run(self, coro: Any) -> Any:
+        loop = _shared_loop()
+        holder: list = []
+        with self._lock:
+            if self.cancelled:
+                coro.close()
+                raise concurrent.futures.CancelledError()
+            future = asyncio.run_coroutine_threadsafe(_tracked(coro, holder), loop)
+            self._running[future] = holder
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            with self._lock:
+                self._running.pop(future, None)
+
+    def child(self) -> "CancelScope":
+        scope = CancelScope(parent=self)
+        with self._lock:
+            if self.cancelled:
+                scope.cancelled = True
+                scope._event.set()
+            else:
+                self._children.add(scope)
+        return scope
+
+    def close(self) -> None:
+        if self._parent is not None:
+            with self._parent._lock:
+                self._parent._children.discard(self)
+
+    def wait(self, seconds: float) -> bool:
+        return self._event.wait(max(0.0, seconds))
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            self._event.set()
+            running = list(self._running.items())
+            children = list(self._children)
+        for child in children:
+            child.cancel()
+        loop = _shared_loop()
+        for future, holder in running:
+            if holder:
+                # Cancel the task itself: the future settles only after its cleanup ran.
+                loop.call_soon_threadsafe(holder[0].cancel)
+            else:
+                future.cancel()
+
+
+async def _tracked(coro: Any, holder: list) -> Any:
+    holder.append(asyncio.current_task())
+    return await coro
+
+
+class AbortGroup:
+    """Workers assigned to one cancellable call, for ``on_worker`` / ``on_session`` hooks.
+
+    ``abort()`` aborts every worker added so far; a worker added afterwards
+    (the call was still queued for one) makes ``add`` raise
+    ``concurrent.futures.CancelledError`` so it never starts the work.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._items: list = []
+        self._aborted = False
+
+    def add(self, item: Any) -> None:
+        with self._lock:
+            if self._aborted:
+                raise concurrent.futures.CancelledError()
+            self._items.append(item)
+
+    def abort(self) -> None:
+        with self._lock:
+            self._aborted = True
+            items = list(self._items)
+        for item in items:
+            item.abort()
@@ -0,0 +1,324 @@
+"""Pre-warmed SymPy worker pool.
+
+Each worker is a long-lived Python process that imports SymPy once and then
+executes snippets in a fresh namespace. The per-call contract mirrors
+``python -`` (returncode / stdout / stderr), so callers can swap the pool in
+for ``subprocess.run`` without changing how results are interpreted.
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import traceback
+
+try:
+    from .resources import ResourceMonitor
+except ImportError:  # pragma: no cover - executed as a script (--worker)
+    from resources import ResourceMonitor
+
+_DEFAULT_STARTUP_TIMEOUT = 120.0
+_DEFAULT_MAX_TASKS = 200
+
+
+def _execute(source: str) -> dict:
+    out = io.StringIO()
+    err = io.StringIO()
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    returncode = 0
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            exec(compile(source, "<stdin>", "exec"), namespace)  # noqa: S102
+        except SystemExit as exc:
+            if exc.code is None:
+                returncode = 0
+            elif isinstance(exc.code, int):
+                returncode = exc.code
+            else:
+                print(exc.code, file=sys.stderr)
+                returncode = 1
+        except BaseException:  # noqa: BLE001
+            traceback.print_exc()
+            returncode = 1
+    return {"returncode": returncode, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+
+def _worker_loop() -> int:
+    # Keep the protocol channel private: anything user code writes to fd 1
+    # directly (os.system, C extensions) is redirected to stderr instead.
+    proto = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+    os.dup2(2, 1)
+
+    import sympy  # noqa: F401  # the whole point: pay the import once
+
+    proto.write(json.dumps({"ready": True}) + "\n")
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        response = _execute(str(request.get("code") or ""))
+        proto.write(json.dumps(response) + "\n")
+    return 0
+
+
+class _Worker:
+    def __init__(self, python_path: str):
+        self.tasks = 0
+        self.ready = False
+        self.proc = subprocess.Popen(
+            [python_path, os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        self._lines: queue.Queue[str | None] = queue.Queue()
+        t = threading.Thread(target=self._reader, daemon=True)
+        t.start()
+
+    def _reader(self) -> None:
+        assert self.proc.stdout is not None
+        try:
+            for line in self.proc.stdout:
+                if line.strip():
+                    self._lines.put(line)
+        except Exception:  # noqa: BLE001
+            pass
+        finally:
+            self._lines.put(None)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _next(self, timeout: float | None) -> dict | None:
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError from None
+        if line is None:
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
+
+    def wait_ready(self, timeout: float) -> bool:
+        if self.ready:
+            return True
+        try:
+            msg = self._next(timeout)
+        except TimeoutError:
+            return False
+        self.ready = bool(msg and msg.get("ready"))
+        return self.ready
+
+    def call(self, source: str, timeout: float | None) -> dict | None:
+        """Run one snippet. Return None if the worker died mid-task."""
+        assert self.proc.stdin is not None
+        self.tasks += 1
+        try:
+            self.proc.stdin.write(json.dumps({"code": source}) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return None
+        return self._next(timeout)
+
+    def abort(self) -> None:
+        """Kill the worker from another thread; the pending ``call`` returns None."""
+        try:
+            self.proc.kill()
+        except Exception:  # noqa: BLE001
+            pass
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5)
+        except Exception:  # noqa: BLE001
+            pass
+
+
+class SympyWorkerPool:
+    """A bounded set of warm SymPy workers shared by concurrent callers."""
+
+    def __init__(
+        self,
+        size: int | None = None,
+        python_path: str | None = None,
+        max_tasks: int = _DEFAULT_MAX_TASKS,
+        startup_timeout: float = _DEFAULT_STARTUP_TIMEOUT,
+        prewarm: bool = True,
+    ):
+        self.size = max(1, int(size or min(4, os.cpu_count() or 1)))
+        self.python_path = python_path or sys.executable or "python"
+        self.max_tasks = max(1, int(max_tasks))
+        self.startup_timeout = startup_timeout
+        self._idle: list[_Worker] = []
+        self._live = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        if prewarm:
+            with self._cond:
+                for _ in range(self.size):
+                    self._idle.append(_Worker(self.python_path))
+                    self._live += 1
+
+    def _acquire(self) -> _Worker:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("SymPy worker pool is closed")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        return worker
+                    self._live -= 1
+                if self._live < self.size:
+                    self._live += 1
+                    break
+                self._cond.wait()
+        try:
+            return _Worker(self.python_path)
+        except Exception:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, worker: _Worker, reusable: bool) -> None:
+        with self._cond:
+            if reusable and not self._closed and worker.alive() and worker.tasks < self.max_tasks:
+                self._idle.append(worker)
+            else:
+                worker.kill()
+                self._live -= 1
+            self._cond.notify()
+
+    def run(
+        self,
+        source: str,
+        timeout: float | None = None,
+        on_worker=None,
+        limits: dict | None = None,
+        usage: dict | None = None,
+    ) -> subprocess.CompletedProcess:
+        """Execute ``source`` like ``python -`` would.
+
+        Raises ``subprocess.TimeoutExpired`` on timeout; the offending worker is
+        killed and replaced lazily. ``on_worker(worker)`` is called once a worker
+        is assigned, so another thread can ``abort()`` it (cancellation).
+
+        The worker is sampled while the snippet runs: ``limits``
+        (``memory_limit_mb`` / ``cpu_limit_seconds``) kill it when exceeded, and
+        ``usage`` (if given) receives the per-call resource summary.
+        """
+        worker = self._acquire()
+        reusable = False
+        try:
+            if on_worker is not None:
+                on_worker(worker)
+            if not worker.wait_ready(self.startup_timeout):
+                rc = worker.proc.poll()
+                return subprocess.CompletedProcess(
+                    worker.proc.args, rc if rc else 1, "", "SymPy worker failed to start"
+                )
+            monitor = ResourceMonitor(worker.proc.pid, on_exceed=lambda kind: worker.abort(), **(limits or {}))
+            try:
+                with monitor:
+                    response = worker.call(source, timeout)
+            except TimeoutError:
+                raise subprocess.TimeoutExpired(worker.proc.args, timeout) from None
+            finally:
+                if usage is not None:
+                    usage.update(monitor.tracker.summary())
+            if response is None:
+                worker.kill()
+                rc = worker.proc.returncode
+                message = "SymPy worker exited unexpectedly"
+                if monitor.tracker.exceeded:
+                    message = f"SymPy worker killed: {monitor.tracker.describe()}"
+                return subprocess.CompletedProcess(worker.proc.args, rc if rc else 1, "", message)
+            reusable = True
+            return subprocess.CompletedProcess(
+                worker.proc.args,
+                int(response.get("returncode") or 0),
+                response.get("stdout") or "",
+                response.get("stderr") or "",
+            )
+        finally:
+            self._release(worker, reusable)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._live -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.kill()
+
+    def __enter__(self) -> "SympyWorkerPool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_POOLS: dict[str, SympyWorkerPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(python_path: str | None = None, size: int | None = None) -> SympyWorkerPool:
+    """Return the process-wide pool for ``python_path`` (created on first use)."""
+    key = python_path or sys.executable or "python"
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None or pool._closed:
+            pool = SympyWorkerPool(size=size, python_path=key)
+            _POOLS[key] = pool
+        return pool
+
+
+def shutdown_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(shutdown_pools)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="SymPy worker pool")
+    parser.add_argument("--worker", action="store_true", help="run as a pool worker (internal)")
+    parser.add_argument("--code", help="run one snippet through a temporary pool")
+    parser.add_argument("--timeout", type=float, default=10, help="timeout seconds")
+    args = parser.parse_args()
+    if args.worker:
+        return _worker_loop()
+    if not args.code:
+        raise SystemExit("missing --code")
+    with SympyWorkerPool(size=1) as pool:
+        proc = pool.run(args.code, timeout=args.timeout)
+    print(json.dumps({"returncode": proc.returncode, "stdout": proc.stdout, "stderr": proc.stderr}, ensure_ascii=False))
+    return proc.returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
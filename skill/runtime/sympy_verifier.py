@@ -1,18 +1,346 @@
-"""SymPy-based symbolic verifier."""
+"""SymPy-based symbolic verifier.
+
+``verify`` decides whether two expressions are equivalent in stages, cheapest
+first, and reports which stage decided:
+
+1. ``numeric``: evaluate both sides at random complex points (vectorized with
+   ``lambdify`` + numpy when available, mpmath otherwise). A mismatch that
+   survives a 30-digit re-evaluation is a counterexample: ``not_equal``
+   within milliseconds, no symbolic work at all.
+2. ``exact``: cheap canonical forms of the difference (``expand``,
+   ``cancel``, ``Poly`` equality). A nonzero polynomial difference, or a
+   symbol-free difference that is provably nonzero, is a proof of
+   inequality too.
+3. ``simplify``: ``simplify(lhs - rhs)`` in a child process under a time
+   budget, since it can take minutes (or hang) on large trigonometric or
+   rational expressions. The child is a long-lived worker that imported SymPy
+   once; it is only replaced after a timeout. A nonzero numeric residual
+   means ``not_equal``; a symbolic residual is ``unknown`` (the numeric
+   tolerance cannot see tiny perturbations such as ``cos(x)/10**12``).
+
+``status`` is ``verified``, ``not_equal``, ``unknown`` or ``error``. Callers
+must treat ``unknown`` as "not proved": pairs that no stage can settle, such
+as ``Max(x, 1)`` vs ``x`` (different, but never at the complex sample points,
+and simplify leaves ``Max(1, x) - x``), now end there instead of in
+``not_equal``.
+
+Only if simplify runs out of time and every numeric sample agreed is the
+verdict numeric-only: ``verified`` with ``stage="numeric"`` and a
+``confidence`` of ``high`` / ``medium`` / ``low`` depending on how many
+samples could be evaluated. Exact verdicts carry ``confidence="exact"``.
+"""
 import argparse
+import cmath
 import json
+import multiprocessing
+import os
+import random
 import sys
-from sympy import sympify, simplify
+import threading
+import time
+
+from sympy import Float, I, Poly, cancel, expand, lambdify, simplify, sympify
+from sympy.polys.polyerrors import PolynomialError
+
+try:  # optional: vectorized sampling
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+DEFAULT_SAMPLES = 64
+DEFAULT_TOLERANCE = 1e-9
+DEFAULT_SIMPLIFY_TIMEOUT = 10.0
+# Without numpy (or for functions numpy lacks) every point is a Python-level mpmath call: sample fewer.
+_MPMATH_SAMPLES = 16
+_CONFIRM_DIGITS = 30
+_MAX_CONFIRM = 3
+# A symbol-free difference smaller than this at 50 digits is not decided either way.
+_ZERO_DIGITS = 50
+_ZERO_THRESHOLD = 1e-40
+_WORKER_START_TIMEOUT = 60.0
+_MAX_IDLE_WORKERS = max(1, os.cpu_count() or 1)
+
+
+def _random_points(count, nvars, seed):
+    """``count`` complex points per variable, away from 0 and the real axis."""
+    rng = random.Random(seed)
+
+    def one():
+        return cmath.rect(rng.uniform(0.2, 2.0), rng.uniform(0.1, 3.0) * rng.choice((1, -1)))
+
+    return [[one() for _ in range(nvars)] for _ in range(count)]
+
+
+def _close(a, b, tolerance):
+    return abs(a - b) <= tolerance * (1 + max(abs(a), abs(b)))
+
+
+def _evaluate_numpy(syms, sym1, sym2, points):
+    """Values of both sides at ``points`` (one vectorized call per side)."""
+    columns = [np.array([p[i] for p in points], dtype=complex) for i in range(len(syms))]
+    with np.errstate(all="ignore"):
+        values = []
+        for expr in (sym1, sym2):
+            out = lambdify(syms, expr, modules="numpy")(*columns)
+            values.append(np.broadcast_to(np.asarray(out, dtype=complex), (len(points),)))
+    return [complex(v) for v in values[0]], [complex(v) for v in values[1]]
+
+
+def _evaluate_mpmath(syms, sym1, sym2, points):
+    f1 = lambdify(syms, sym1, modules="mpmath")
+    f2 = lambdify(syms, sym2, modules="mpmath")
+    left, right = [], []
+    for point in points:
+        try:
+            left.append(complex(f1(*point)))
+            right.append(complex(f2(*point)))
+        except (ArithmeticError, ValueError, TypeError):
+            left.append(complex("nan"))
+            right.append(complex("nan"))
+    return left, right
+
+
+def _finite(z):
+    return z == z and abs(z) != float("inf")
+
+
+def _confirm(diff, syms, point, tolerance):
+    """Re-evaluate ``diff`` at ``point`` with 30 significant digits; True if clearly nonzero."""
+    # evalf(subs=...) needs SymPy numbers: a Python complex breaks e.g. floor / ceiling.
+    subs = {s: Float(z.real, _CONFIRM_DIGITS) + I * Float(z.imag, _CONFIRM_DIGITS) for s, z in zip(syms, point)}
+    try:
+        value = complex(diff.evalf(_CONFIRM_DIGITS, subs=subs))
+    except Exception:  # noqa: BLE001 - an unevaluable point is just not a counterexample
+        return False
+    return _finite(value) and abs(value) > tolerance
+
+
+def _numeric_stage(sym1, sym2, samples, tolerance, seed):
+    """Return (counterexample or None, number of points where both sides were finite)."""
+    syms = sorted(sym1.free_symbols | sym2.free_symbols, key=lambda s: s.sort_key())
+    left = right = None
+    if np is not None:
+        points = _random_points(samples, len(syms), seed)
+        try:
+            left, right = _evaluate_numpy(syms, sym1, sym2, points)
+        except Exception:  # noqa: BLE001 - e.g. special functions numpy does not provide
+            left = right = None
+    if left is None:
+        points = _random_points(min(samples, _MPMATH_SAMPLES), len(syms), seed)
+        try:
+            left, right = _evaluate_mpmath(syms, sym1, sym2, points)
+        except Exception:  # noqa: BLE001 - relationals, unknown functions, ...
+            return None, 0
+    valid = 0
+    suspects = []
+    for point, a, b in zip(points, left, right):
+        if not (_finite(a) and _finite(b)):
+            continue
+        valid += 1
+        if not _close(a, b, tolerance):
+            suspects.append(point)
+    diff = sym1 - sym2
+    for point in suspects[:_MAX_CONFIRM]:
+        # Float noise (catastrophic cancellation) must not turn into a false "not equal".
+        if _confirm(diff, syms, point, tolerance):
+            return {str(s): str(v) for s, v in zip(syms, point)}, valid
+    return None, valid
+
+
+def _constant_is_zero(value):
+    """Decide a symbol-free expression: True / False, or None if it cannot be told from 0."""
+    if value.is_zero is not None:
+        return bool(value.is_zero)
+    try:
+        approx = complex(value.evalf(_ZERO_DIGITS))
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+    return False if _finite(approx) and abs(approx) > _ZERO_THRESHOLD else None
 
 
-def verify(expr1: str, expr2: str) -> dict:
+def _exact_stage(sym1, sym2):
+    """True (proved equal), False (proved different) or None (inconclusive)."""
+    diff = sym1 - sym2
+    if diff == 0:
+        return True
+    for canonical in (expand, cancel):
+        reduced = canonical(diff)
+        if reduced == 0:
+            return True
+        if not reduced.free_symbols:
+            return _constant_is_zero(reduced)
+    syms = sorted(diff.free_symbols, key=lambda s: s.sort_key())
+    try:
+        p1, p2 = Poly(sym1, *syms), Poly(sym2, *syms)
+    except PolynomialError:
+        return None
+    if p1 == p2:
+        return True
+    # Unequal coefficients only prove inequality when they are canonical (integers / rationals):
+    # EX coefficients such as sin(1)**2 + cos(1)**2 may still hide a zero.
+    exact = all(p.domain.is_ZZ or p.domain.is_QQ for p in (p1, p2))
+    return False if exact else None
+
+
+def _simplify_worker(conn):
+    """Long-lived child: ``simplify`` each expression it receives until the pipe closes."""
+    conn.send(("ready", None))
+    while True:
+        try:
+            diff = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            conn.send(("ok", simplify(diff)))
+        except Exception as exc:  # noqa: BLE001
+            conn.send(("error", str(exc)))
+
+
+class _SimplifyWorker:
+    def __init__(self):
+        # spawn, not fork: callers such as final_audit run this from worker threads, and a
+        # forked child can deadlock on a lock another thread held at fork time.
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_simplify_worker, args=(child,), daemon=True)
+        self.proc.start()
+        child.close()
+        # Importing SymPy in the child is paid once here, not against the first simplify timeout.
+        if not self.conn.poll(_WORKER_START_TIMEOUT) or self.conn.recv()[0] != "ready":
+            self.kill()
+            raise RuntimeError("simplify worker did not start")
+
+    def kill(self):
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.proc.join()
+        self.conn.close()
+
+
+_idle_workers = []
+_idle_lock = threading.Lock()
+
+
+def _take_worker():
+    with _idle_lock:
+        while _idle_workers:
+            worker = _idle_workers.pop()
+            if worker.proc.is_alive():
+                return worker
+            worker.kill()
+    return _SimplifyWorker()
+
+
+def _return_worker(worker):
+    with _idle_lock:
+        if len(_idle_workers) < _MAX_IDLE_WORKERS:
+            _idle_workers.append(worker)
+            return
+    worker.kill()
+
+
+def _simplify_within(diff, timeout):
+    """``simplify(diff)``, or None if it did not finish within ``timeout`` seconds.
+
+    Runs in a reusable worker process (one per concurrent caller); a worker is
+    only replaced after a timeout or a crash.
+    """
+    if timeout <= 0:
+        return None
+    worker = _take_worker()
+    try:
+        worker.conn.send(diff)
+        if not worker.conn.poll(timeout):
+            worker.kill()
+            return None
+        kind, value = worker.conn.recv()
+    except (EOFError, OSError):
+        worker.kill()
+        return None
+    _return_worker(worker)
+    if kind == "error":
+        raise RuntimeError(value)
+    return value
+
+
+def _confidence(valid, samples):
+    if valid >= max(16, samples * 3 // 4):
+        return "high"
+    if valid >= 8:
+        return "medium"
+    return "low"
+
+
+def verify(
+    expr1: str,
+    expr2: str,
+    *,
+    samples: int = DEFAULT_SAMPLES,
+    tolerance: float = DEFAULT_TOLERANCE,
+    simplify_timeout: float = DEFAULT_SIMPLIFY_TIMEOUT,
+    seed: int = 0,
+) -> dict:
     try:
         sym1 = sympify(expr1)
         sym2 = sympify(expr2)
-        diff = simplify(sym1 - sym2)
+
+        counterexample, valid = _numeric_stage(sym1, sym2, samples, tolerance, seed)
+        if counterexample is not None:
+            return {
+                "status": "not_equal",
+                "stage": "numeric",
+                "confidence": "high",
+                "message": "sides differ at a random point",
+                "counterexample": counterexample,
+                "samples": valid,
+            }
+
+        exact = _exact_stage(sym1, sym2)
+        if exact is not None:
+            return {
+                "status": "verified" if exact else "not_equal",
+                "stage": "exact",
+                "confidence": "exact",
+                "message": "equivalent" if exact else "polynomials differ",
+                "samples": valid,
+            }
+
+        diff = _simplify_within(sym1 - sym2, simplify_timeout)
+        if diff is None:
+            if valid:
+                # simplify ran out of time, but every evaluable sample agreed.
+                return {
+                    "status": "verified",
+                    "stage": "numeric",
+                    "confidence": _confidence(valid, samples),
+                    "message": f"numerically equivalent at {valid} random points (simplify timed out)",
+                    "samples": valid,
+                }
+            return {
+                "status": "unknown",
+                "stage": "simplify",
+                "confidence": None,
+                "message": f"simplify timed out after {simplify_timeout}s",
+                "samples": 0,
+            }
         if diff == 0:
-            return {"status": "verified", "message": "equivalent"}
-        return {"status": "not_equal", "message": f"difference: {diff}"}
+            return {"status": "verified", "stage": "simplify", "confidence": "exact", "message": "equivalent", "samples": valid}
+        if not diff.free_symbols and _constant_is_zero(diff) is False:
+            return {
+                "status": "not_equal",
+                "stage": "simplify",
+                "confidence": "exact",
+                "message": f"difference: {diff}",
+                "samples": valid,
+            }
+        # A symbolic residual may be zero in disguise, or a perturbation below the numeric tolerance.
+        return {
+            "status": "unknown",
+            "stage": "simplify",
+            "confidence": None,
+            "message": f"simplify left: {diff}",
+            "samples": valid,
+        }
     except Exception as exc:  # noqa: BLE001
         return {"status": "error", "message": str(exc)}
 
@@ -21,8 +349,24 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="SymPy equivalence verifier")
     parser.add_argument("expr1", help="left expression")
     parser.add_argument("expr2", help="right expression")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="random points for the numeric stage")
+    parser.add_argument(
+        "--simplify-timeout",
+        type=float,
+        default=DEFAULT_SIMPLIFY_TIMEOUT,
+        help="seconds allowed for the final simplify stage",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random points")
     args = parser.parse_args()
-    result = verify(args.expr1, args.expr2)
+    started = time.perf_counter()
+    result = verify(
+        args.expr1,
+        args.expr2,
+        samples=args.samples,
+        simplify_timeout=args.simplify_timeout,
+        seed=args.seed,
+    )
+    result["seconds"] = round(time.perf_counter() - started, 4)
     print(json.dumps(result, ensure_ascii=False))
     return 0 if result["status"] == "verified" else 1
 
@@ -0,0 +1,81 @@
+"""Per-checker timing history used to order and budget audit steps.
+
+A small JSON sidecar (``<workspace>/cache/timings.json`` by default) maps a
+checker hash to an exponentially weighted mean of its wall time plus run and
+failure counts. Writes go through a temp file + ``os.replace`` so concurrent
+audits never see a torn file; the last writer wins, which is fine for
+estimates.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+_VERSION = 1
+_ALPHA = 0.3
+_MAX_ENTRIES = 5000
+
+
+class TimingHistory:
+    def __init__(self, path: str | Path | None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+        if self.path is not None:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            if isinstance(data, dict) and data.get("version") == _VERSION and isinstance(data.get("entries"), dict):
+                self._entries = data["entries"]
+
+    def get(self, key: str | None) -> dict | None:
+        """``{"seconds", "runs", "failures"}`` for ``key``, or None for a cold checker."""
+        if not key:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    def record(self, key: str | None, seconds: float, passed: bool) -> None:
+        if not key:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"seconds": float(seconds), "runs": 0, "failures": 0}
+            else:
+                entry["seconds"] = (1 - _ALPHA) * float(entry["seconds"]) + _ALPHA * float(seconds)
+            entry["seconds"] = round(entry["seconds"], 4)
+            entry["runs"] += 1
+            entry["failures"] += 0 if passed else 1
+            entry["seen"] = int(time.time())
+            self._entries[key] = entry
+            self._dirty = True
+
+    def save(self) -> None:
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            entries = self._entries
+            if len(entries) > _MAX_ENTRIES:
+                keep = sorted(entries, key=lambda k: entries[k].get("seen", 0))[-_MAX_ENTRIES:]
+                entries = {k: entries[k] for k in keep}
+            payload = json.dumps({"version": _VERSION, "entries": entries}, ensure_ascii=False)
+            self._dirty = False
+        tmp = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".timings.", dir=str(self.path.parent))
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                fp.write(payload)
+            os.replace(tmp, self.path)
+        except OSError:
+            if tmp:
+                Path(tmp).unlink(missing_ok=True)
@@ -1,61 +1,76 @@
-"""Lean4 watchdog: kill process if no output for N seconds."""
+"""Lean4 watchdog: kill the process tree on N seconds of silence or an RSS/CPU budget."""
 import argparse
-import subprocess
 import sys
-import threading
-import time
 
+try:
+    from .capture import DEFAULT_MAX_OUTPUT_BYTES
+    from .supervisor import DEFAULT_GRACE_SECONDS, run_supervised
+except ImportError:  # pragma: no cover - executed as a script (check_reverse_lean4.ps1)
+    from capture import DEFAULT_MAX_OUTPUT_BYTES
+    from supervisor import DEFAULT_GRACE_SECONDS, run_supervised
 
-def run_watchdog(cmd: list[str], cwd: str | None, timeout_no_output: int) -> int:
-    proc = subprocess.Popen(
-        cmd,
-        cwd=cwd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1,
-    )
-    last_output = time.time()
-    lines: list[str] = []
-
-    def _reader():
-        nonlocal last_output
-        assert proc.stdout is not None
-        for line in proc.stdout:
-            lines.append(line)
-            if line.strip():
-                last_output = time.time()
-
-    t = threading.Thread(target=_reader, daemon=True)
-    t.start()
 
+def run_watchdog(
+    cmd: list[str],
+    cwd: str | None,
+    timeout_no_output: float,
+    grace: float = DEFAULT_GRACE_SECONDS,
+    log_path: str | None = None,
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+    memory_limit_mb: float = 0,
+    cpu_limit_seconds: float = 0,
+) -> int:
     try:
-        while True:
-            if proc.poll() is not None:
-                break
-            if timeout_no_output and (time.time() - last_output > timeout_no_output):
-                proc.terminate()
-                time.sleep(2)
-                proc.kill()
-                sys.stdout.write("".join(lines))
-                print(f"\n[watchdog] terminated after {timeout_no_output}s without output")
-                return 124
-            time.sleep(0.05)
-        t.join(timeout=1)
-        sys.stdout.write("".join(lines))
-        return proc.returncode or 0
+        result = run_supervised(
+            cmd,
+            cwd=cwd,
+            no_output_timeout=timeout_no_output,
+            grace=grace,
+            max_output_bytes=max_output_bytes,
+            output_log=log_path,
+            memory_limit_mb=memory_limit_mb,
+            cpu_limit_seconds=cpu_limit_seconds,
+            # The peak usage line below is part of the watchdog's report.
+            record_usage=True,
+        )
     except Exception:  # noqa: BLE001
-        try:
-            proc.kill()
-        except Exception:
-            pass
         return 125
+    if result["returncode"] is None:
+        return 125
+    sys.stdout.write(result["output"])
+    if result["output_truncated"] or log_path:
+        print(f"\n[watchdog] {result['output_bytes']} bytes of output" + (f", full log: {log_path}" if log_path else ""))
+    if result["timeout"]:
+        print(
+            f"\n[watchdog] terminated after {timeout_no_output}s without output "
+            f"({result['killed']} took {result['kill_seconds']}s)"
+        )
+        return 124
+    if result["limit_exceeded"]:
+        print(f"\n[watchdog] terminated: {result['limit_message']} ({result['killed']} took {result['kill_seconds']}s)")
+        return 137
+    usage = result["resources"]
+    print(
+        f"[watchdog] peak RSS {usage['peak_rss_mb']} MiB, cpu {usage['user_cpu_seconds']}s user "
+        f"+ {usage['sys_cpu_seconds']}s sys, wall {usage['wall_seconds']}s",
+        file=sys.stderr,
+    )
+    returncode = result["returncode"]
+    # A child killed by a signal reports -N; exit like a shell would (128 + N) so it is not mistaken for success.
+    return 128 - returncode if returncode < 0 else returncode
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="watchdog runner")
     parser.add_argument("--cwd", default=None, help="working directory")
     parser.add_argument("--timeout", type=int, default=20, help="no-output timeout seconds")
+    parser.add_argument("--grace", type=float, default=DEFAULT_GRACE_SECONDS, help="seconds between SIGTERM and SIGKILL")
+    parser.add_argument("--log-file", help="write the full output here (only head/tail is echoed)")
+    parser.add_argument(
+        "--max-output-bytes", type=int, default=DEFAULT_MAX_OUTPUT_BYTES, help="bytes of output kept in memory (0 = all)"
+    )
+    parser.add_argument("--memory-limit-mb", type=float, default=0, help="kill when the tree's RSS exceeds this (0 = off)")
+    parser.add_argument("--cpu-limit-seconds", type=float, default=0, help="kill after this much user+sys CPU (0 = off)")
     parser.add_argument("--", dest="cmd", nargs=argparse.REMAINDER)
     args = parser.parse_args()
     cmd = args.cmd
@@ -63,7 +78,16 @@ def main() -> int:
         cmd = cmd[1:]
     if not cmd:
         raise SystemExit("missing command after --")
-    return run_watchdog(cmd, args.cwd, args.timeout)
+    return run_watchdog(
+        cmd,
+        args.cwd,
+        args.timeout,
+        grace=args.grace,
+        log_path=args.log_file,
+        max_output_bytes=args.max_output_bytes,
+        memory_limit_mb=args.memory_limit_mb,
+        cpu_limit_seconds=args.cpu_limit_seconds,
+    )
 
 
 if __name__ == "__main__":
@@ -1,9 +1,137 @@
-"""Ephemeral workspace for Lean project execution."""
+"""Ephemeral workspace for Lean project execution.
+
+Two isolation modes are supported:
+
+- ``copy``: copy of the source tree without build artifacts (the original
+  behaviour; Lake has to rebuild or re-fetch everything).
+- ``link``: keeps build artifacts. The whole tree, including dependency
+  package directories (``.lake/packages``, ``lake-packages``) and the
+  project's own build outputs, is cloned file by file, so no oleans are lost
+  and Mathlib is not rebuilt.
+
+Both modes follow symlinks and clone every file with a copy-on-write reflink
+where the filesystem supports it (Linux FICLONE: btrfs, XFS, bcachefs ...),
+falling back to a real copy. Nothing in the workspace is a symlink or hard
+link into the source project, so a run that makes Lake rewrite oleans,
+rebuild a dependency for another toolchain or ``lake update`` only changes
+its own copy. On filesystems without reflinks ``link`` pays for a full copy
+of the package tree; ``workspace_pool`` amortises that across runs.
+"""
 import argparse
+import errno
+import fnmatch
 import os
 import shutil
 import tempfile
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
+
+MODES = ("copy", "link")
+
+_IGNORED_NAMES = {"__pycache__"}
+_IGNORED_SUFFIXES = (".class",)
+# copy mode: the source tree minus build outputs and dependency checkouts (Lake rebuilds / re-fetches them).
+_COPY_IGNORED = ("build", "lake-packages", "__pycache__", "*.olean", "*.class", ".git*")
+_FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+_reflink_supported = True
+
+
+def _ignored(name: str) -> bool:
+    return name in _IGNORED_NAMES or name.startswith(".git") or name.endswith(_IGNORED_SUFFIXES)
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Copy-on-write clone (Linux FICLONE: btrfs, XFS, bcachefs ...)."""
+    global _reflink_supported
+    if not _reflink_supported or os.name != "posix":
+        return False
+    try:
+        import fcntl
+    except ImportError:
+        _reflink_supported = False
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except OSError as exc:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        if exc.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV, errno.ENOSYS):
+            _reflink_supported = False
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _new_stats(mode: str) -> dict:
+    return {"mode": mode, "copied": 0, "cloned": 0}
+
+
+def copy_file(src: str, dst: str, stats: dict) -> str:
+    if _reflink(src, dst):
+        stats["cloned"] += 1
+    else:
+        shutil.copy2(src, dst)
+        stats["copied"] += 1
+    return dst
+
+
+def clone_file(src: str, dst: str, rel: str, stats: dict) -> str:
+    """Clone one project file (``rel`` is its path inside the project).
+
+    Build outputs and dependency packages are cloned like any other file
+    rather than linked, since Lake rewrites ``.olean`` / ``.trace`` files in
+    place and would otherwise write through to the source project.
+    """
+    return copy_file(src, dst, stats)
+
+
+def _copy_ignored(name: str) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in _COPY_IGNORED)
+
+
+def iter_project(source_dir: str, mode: str = "link"):
+    """Yield ``(kind, relpath)`` for the ``mode`` view of a project.
+
+    ``kind`` is ``"dir"`` for directories recreated in the clone and
+    ``"file"`` for cloned files; parents are always yielded before their
+    children. Symlinks are followed. Copy mode skips build outputs, like
+    ``shutil.copytree`` with the ``_COPY_IGNORED`` patterns.
+    """
+    src_root = os.path.abspath(source_dir)
+    ignored = _copy_ignored if mode == "copy" else _ignored
+    for dirpath, dirnames, filenames in os.walk(src_root, followlinks=True):
+        rel_dir = os.path.relpath(dirpath, src_root)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        keep = []
+        for name in sorted(dirnames):
+            if ignored(name):
+                continue
+            yield "dir", os.path.join(rel_dir, name)
+            keep.append(name)
+        dirnames[:] = keep
+        for name in sorted(filenames):
+            if not ignored(name):
+                yield "file", os.path.join(rel_dir, name)
+
+
+def clone_project(source_dir: str, project_dir: str, mode: str = "link") -> dict:
+    """Materialise ``source_dir`` at ``project_dir`` and return clone stats."""
+    if mode not in MODES:
+        raise ValueError(f"unknown workspace mode: {mode!r}")
+    stats = _new_stats(mode)
+    src_root = os.path.abspath(source_dir)
+    os.makedirs(project_dir)
+    for kind, rel in iter_project(src_root, mode):
+        src = os.path.join(src_root, rel)
+        dst = os.path.join(project_dir, rel)
+        if kind == "dir":
+            os.makedirs(dst, exist_ok=True)
+        else:
+            clone_file(src, dst, rel, stats)
+    return stats
 
 
 @dataclass
@@ -11,22 +139,22 @@ class EphemeralWorkspace:
     source_dir: str
     temp_dir: str | None = None
     project_dir: str | None = None
+    mode: str = "copy"
+    temp_root: str | None = None
+    stats: dict = field(default_factory=dict)
 
     def __enter__(self) -> str:
-        self.temp_dir = tempfile.mkdtemp(prefix="mathprove_")
+        started = time.perf_counter()
+        if self.temp_root:
+            os.makedirs(self.temp_root, exist_ok=True)
+        self.temp_dir = tempfile.mkdtemp(prefix="mathprove_", dir=self.temp_root)
         self.project_dir = os.path.join(self.temp_dir, "proj")
-        shutil.copytree(
-            self.source_dir,
-            self.project_dir,
-            ignore=shutil.ignore_patterns(
-                "build",
-                "lake-packages",
-                "__pycache__",
-                "*.olean",
-                "*.class",
-                ".git*",
-            ),
-        )
+        try:
+            self.stats = clone_project(self.source_dir, self.project_dir, self.mode)
+        except Exception:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            raise
+        self.stats["seconds"] = round(time.perf_counter() - started, 4)
         return self.project_dir
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -37,8 +165,10 @@ class EphemeralWorkspace:
 def main() -> None:
     parser = argparse.ArgumentParser(description="Create ephemeral workspace")
     parser.add_argument("source_dir", help="Lean project directory")
+    parser.add_argument("--mode", choices=MODES, default="copy", help="isolation mode")
+    parser.add_argument("--temp-root", help="parent directory for the workspace (same filesystem enables reflinks)")
     args = parser.parse_args()
-    with EphemeralWorkspace(args.source_dir) as workdir:
+    with EphemeralWorkspace(args.source_dir, mode=args.mode, temp_root=args.temp_root) as workdir:
         print(workdir)
 
 
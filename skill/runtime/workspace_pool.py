@@ -0,0 +1,295 @@
+"""Warm pool of reusable ephemeral Lean project clones.
+
+The pool keeps ``size`` pre-provisioned clones of a Lean project under
+``root/slot_<i>/proj``. An audit leases one slot, works in it, and on release
+the slot is reset by deleting only the files the audit added and restoring the
+ones it changed (compared by size and mtime against the source project), so
+the expensive parts of the clone survive between audits.
+
+Leases are OS file locks (``flock`` / ``msvcrt.locking``) on
+``root/locks/slot_<i>.lock``: they are exclusive across processes and are
+released by the kernel if the holder crashes. A ``lease.json`` marker left in a
+slot by a crashed holder makes the next lease report ``recovered`` (the slot is
+always re-synced before use anyway).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import time
+from pathlib import Path
+
+try:
+    from .workspace import MODES, clone_file, clone_project, iter_project
+except ImportError:  # pragma: no cover - executed as a script
+    from workspace import MODES, clone_file, clone_project, iter_project
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock(path: Path) -> int | None:
+    """Take a non-blocking exclusive lock on ``path``; return the fd or None."""
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:  # pragma: no cover - Windows
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _unlock(fd: int) -> None:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:  # pragma: no cover - Windows
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+def _same_file(a: str, b: str) -> bool:
+    try:
+        sa, sb = os.stat(a), os.stat(b)
+    except OSError:
+        return False
+    return sa.st_size == sb.st_size and sa.st_mtime_ns == sb.st_mtime_ns
+
+
+def _remove(path: str) -> None:
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.unlink(path)
+    else:
+        shutil.rmtree(path)
+
+
+def sync_project(source_dir: str, project_dir: str, mode: str = "link") -> dict:
+    """Bring a ``mode`` clone back in line with ``source_dir``.
+
+    Only entries that differ are touched: files the run added are deleted,
+    files it changed (or that changed in the source) are re-cloned, and missing
+    ones are restored.
+    """
+    src_root = os.path.abspath(source_dir)
+    expected = {rel: kind for kind, rel in iter_project(src_root, mode)}
+    stats = {"removed": 0, "restored": 0, "copied": 0, "cloned": 0}
+
+    for dirpath, dirnames, filenames in os.walk(project_dir):
+        rel_dir = os.path.relpath(dirpath, project_dir)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        keep = []
+        for name in dirnames:
+            rel = os.path.join(rel_dir, name)
+            path = os.path.join(dirpath, name)
+            if expected.get(rel) == "dir" and not os.path.islink(path):
+                keep.append(name)
+                continue
+            _remove(path)
+            stats["removed"] += 1
+        dirnames[:] = keep
+        for name in filenames:
+            rel = os.path.join(rel_dir, name)
+            path = os.path.join(dirpath, name)
+            if expected.get(rel) == "file" and not os.path.islink(path) and _same_file(path, os.path.join(src_root, rel)):
+                continue
+            os.unlink(path)
+            stats["removed"] += 1
+
+    for rel, kind in expected.items():
+        dst = os.path.join(project_dir, rel)
+        if os.path.lexists(dst):
+            continue
+        src = os.path.join(src_root, rel)
+        if kind == "dir":
+            os.makedirs(dst, exist_ok=True)
+        else:
+            clone_file(src, dst, rel, stats)
+        stats["restored"] += 1
+    return stats
+
+
+class WorkspaceLease:
+    """Context manager for one leased slot; mirrors ``EphemeralWorkspace``."""
+
+    def __init__(self, pool: "WorkspacePool", timeout: float | None = None):
+        self.pool = pool
+        self.timeout = pool.lease_timeout if timeout is None else timeout
+        self.slot: int | None = None
+        self.project_dir: str | None = None
+        self.stats: dict = {}
+        self._fd: int | None = None
+
+    def __enter__(self) -> str:
+        started = time.perf_counter()
+        deadline = time.monotonic() + max(0.0, float(self.timeout))
+        while True:
+            for slot in range(self.pool.size):
+                fd = _lock(self.pool.lock_path(slot))
+                if fd is None:
+                    continue
+                self.slot, self._fd = slot, fd
+                try:
+                    self.stats = self.pool._prepare(slot)
+                except BaseException:
+                    self._release(reset=False)
+                    raise
+                self.project_dir = str(self.pool.project_dir(slot))
+                self.stats["slot"] = slot
+                self.stats["seconds"] = round(time.perf_counter() - started, 4)
+                return self.project_dir
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"no free workspace slot in {self.pool.root} after {self.timeout}s")
+            time.sleep(self.pool.poll_interval)
+
+    def _release(self, reset: bool) -> None:
+        if self._fd is None:
+            return
+        try:
+            if reset and self.slot is not None:
+                self.pool._reset(self.slot)
+        finally:
+            _unlock(self._fd)
+            self._fd = None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._release(reset=True)
+
+
+class WorkspacePool:
+    """``size`` reusable clones of ``source_dir`` under ``root``."""
+
+    def __init__(
+        self,
+        source_dir: str,
+        root: str | Path,
+        size: int = 2,
+        mode: str = "link",
+        lease_timeout: float = 600.0,
+        poll_interval: float = 0.1,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"unknown workspace mode: {mode!r}")
+        self.source_dir = os.path.abspath(source_dir)
+        self.root = Path(root)
+        self.size = max(1, int(size))
+        self.mode = mode
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        (self.root / "locks").mkdir(parents=True, exist_ok=True)
+
+    def slot_dir(self, slot: int) -> Path:
+        return self.root / f"slot_{slot}"
+
+    def project_dir(self, slot: int) -> Path:
+        return self.slot_dir(slot) / "proj"
+
+    def lock_path(self, slot: int) -> Path:
+        return self.root / "locks" / f"slot_{slot}.lock"
+
+    def lease(self, timeout: float | None = None) -> WorkspaceLease:
+        return WorkspaceLease(self, timeout)
+
+    def _marker(self, slot: int) -> Path:
+        return self.slot_dir(slot) / "lease.json"
+
+    def _prepare(self, slot: int) -> dict:
+        """Called with the slot lock held: provision or re-sync, then mark leased."""
+        slot_dir = self.slot_dir(slot)
+        proj = self.project_dir(slot)
+        marker = self._marker(slot)
+        recovered = marker.exists()
+        shutil.rmtree(slot_dir / "proj.tmp", ignore_errors=True)
+        if proj.is_dir():
+            stats = sync_project(self.source_dir, str(proj), self.mode)
+            stats["provisioned"] = False
+        else:
+            shutil.rmtree(proj, ignore_errors=True)
+            slot_dir.mkdir(parents=True, exist_ok=True)
+            # Clone next to the final path and rename, so a crash mid-clone never
+            # leaves a half-populated slot behind.
+            stats = clone_project(self.source_dir, str(slot_dir / "proj.tmp"), self.mode)
+            os.replace(slot_dir / "proj.tmp", proj)
+            stats["provisioned"] = True
+        stats["recovered"] = recovered
+        marker.write_text(
+            json.dumps({"pid": os.getpid(), "host": socket.gethostname(), "since": time.time()}),
+            encoding="utf-8",
+        )
+        return stats
+
+    def _reset(self, slot: int) -> None:
+        proj = self.project_dir(slot)
+        if proj.is_dir():
+            sync_project(self.source_dir, str(proj), self.mode)
+        try:
+            self._marker(slot).unlink()
+        except OSError:
+            pass
+
+    def warm(self) -> list[dict]:
+        """Provision every currently free slot ahead of time."""
+        out = []
+        for slot in range(self.size):
+            fd = _lock(self.lock_path(slot))
+            if fd is None:
+                out.append({"slot": slot, "ready": self.project_dir(slot).is_dir(), "leased": True})
+                continue
+            try:
+                stats = self._prepare(slot)
+                self._marker(slot).unlink()
+            finally:
+                _unlock(fd)
+            out.append({"slot": slot, "ready": True, "leased": False, "provisioned": stats["provisioned"]})
+        return out
+
+    def status(self) -> list[dict]:
+        out = []
+        for slot in range(self.size):
+            fd = _lock(self.lock_path(slot))
+            leased = fd is None
+            if fd is not None:
+                _unlock(fd)
+            holder = None
+            if leased:
+                try:
+                    holder = json.loads(self._marker(slot).read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    holder = None
+            out.append({"slot": slot, "ready": self.project_dir(slot).is_dir(), "leased": leased, "holder": holder})
+        return out
+
+    def destroy(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage a warm pool of ephemeral Lean workspaces")
+    parser.add_argument("source_dir", help="Lean project directory")
+    parser.add_argument("--root", required=True, help="pool directory")
+    parser.add_argument("--size", type=int, default=2, help="number of slots")
+    parser.add_argument("--mode", choices=MODES, default="link", help="clone mode")
+    parser.add_argument("action", nargs="?", default="status", choices=["status", "warm", "destroy"])
+    args = parser.parse_args()
+    pool = WorkspacePool(args.source_dir, args.root, size=args.size, mode=args.mode)
+    if args.action == "destroy":
+        pool.destroy()
+        print(json.dumps({"root": str(pool.root), "destroyed": True}))
+        return
+    result = pool.warm() if args.action == "warm" else pool.status()
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Reverse Lean4 gate：lint + 编译（跨平台 Python 实现，取代 check_reverse_lean4.ps1）。
+
+流程：
+- 进程内调用 `lint_reverse_lean4.lint`（不再额外启动一个 Python）。
+- 严格模式（--require-mathlib）在 Lake 工程内执行 `lake env lean <file>`，否则直接 `lean <file>`。
+- 编译进程由共享 supervisor（runtime/supervisor.py）监督：输出增量读取，内存中只保留有界的头/尾片段，
+  完整输出可写入 --output-log。
+- 同时执行总超时与无输出超时，超时后终止整个进程组。
+- 模块布局（--src-dir）：Preamble + 每个 step 一个模块，整体 lint 后用 `lake build` 并行构建。
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import sys
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    from .lint_reverse_lean4 import STEP_DECL_RE, STEP_MAP_RE, lint
+except ImportError:  # pragma: no cover
+    from lint_reverse_lean4 import STEP_DECL_RE, STEP_MAP_RE, lint
+
+try:
+    from ..runtime.capture import DEFAULT_MAX_OUTPUT_BYTES
+    from ..runtime.supervisor import run_supervised
+except Exception:  # pragma: no cover
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from runtime.capture import DEFAULT_MAX_OUTPUT_BYTES
+    from runtime.supervisor import run_supervised
+
+_KILL_GRACE_SECONDS = 2.0
+
+
+def stream_process(
+    cmd: list[str],
+    cwd: str | None,
+    timeout: float,
+    no_output_timeout: float = 0,
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+    output_log: str | None = None,
+) -> dict:
+    """运行命令并增量读取合并后的 stdout/stderr（共享 supervisor + 有界捕获）。
+
+    返回 {returncode, output, output_bytes, output_truncated, output_log, seconds, timeout}，
+    其中 timeout 为 None、"total" 或 "no_output"；output_log 保存完整输出。无法启动时抛出 OSError。
+    """
+    run = run_supervised(
+        cmd,
+        cwd=cwd,
+        timeout=timeout if timeout and timeout > 0 else 0,
+        no_output_timeout=no_output_timeout if no_output_timeout and no_output_timeout > 0 else 0,
+        grace=_KILL_GRACE_SECONDS,
+        max_output_bytes=max_output_bytes,
+        output_log=output_log,
+    )
+    if run["returncode"] is None:
+        raise OSError(run["output"])
+    keys = ("returncode", "output", "output_bytes", "output_truncated", "output_log", "seconds", "timeout")
+    return {k: run[k] for k in keys}
+
+
+def _find_command(name: str, explicit: str | None = None) -> str | None:
+    if explicit and explicit.strip():
+        explicit = explicit.strip()
+        if os.sep in explicit or (os.altsep and os.altsep in explicit) or pathlib.Path(explicit).exists():
+            return str(pathlib.Path(explicit).resolve())
+        name = explicit
+    found = shutil.which(name)
+    if found:
+        return found
+    # 新装的 elan 可能还没进 PATH。
+    elan = pathlib.Path.home() / ".elan" / "bin" / (name + (".exe" if os.name == "nt" else ""))
+    return str(elan) if elan.exists() else None
+
+
+def run_gate(
+    path: str,
+    project_dir: str | None = None,
+    require_mathlib: bool = False,
+    require_step_map: bool = False,
+    skip_lint: bool = False,
+    timeout: float = 120,
+    no_output_timeout: float = 0,
+    lake_path: str | None = None,
+    lean_path: str | None = None,
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+    output_log: str | None = None,
+) -> tuple[bool, dict]:
+    """执行 reverse gate。返回 (ok, detail)。"""
+    lean_file = pathlib.Path(path).resolve()
+    if not lean_file.exists():
+        return False, {"error": f"Lean 文件不存在: {lean_file}"}
+
+    if not skip_lint:
+        issues = lint(
+            lean_text=lean_file.read_text(encoding="utf-8-sig"),
+            md_text=None,
+            min_steps=1,
+            require_step_map=require_step_map,
+            require_mathlib=require_mathlib,
+            require_domain_defs=False,
+            lean_path=lean_file,
+        )
+        if issues:
+            return False, {
+                "error": "reverse gate lint 失败",
+                "stage": "lint",
+                "issues": [{"code": it.code, "message": it.message} for it in issues],
+            }
+
+    if require_mathlib:
+        project = pathlib.Path(project_dir).resolve() if project_dir else lean_file.parent
+        if not ((project / "lakefile.lean").exists() or (project / "lakefile.toml").exists()):
+            return False, {"error": f"严格模式需要 Lake+Mathlib 工程目录: {project}（缺少 lakefile.lean/toml）", "stage": "setup"}
+        lake = _find_command("lake", lake_path)
+        if not lake:
+            return False, {"error": "严格模式需要 lake：请安装 Lean4 工具链（推荐 elan）并确保 lake 在 PATH 中", "stage": "setup"}
+        cmd, cwd, mode = [lake, "env", "lean", str(lean_file)], str(project), "lake_env_lean"
+    else:
+        lean = _find_command("lean", lean_path)
+        if not lean:
+            return False, {"error": "未找到 lean：请安装 Lean4（推荐 elan）并确保 lean 在 PATH 中", "stage": "setup"}
+        cmd, cwd, mode = [lean, str(lean_file)], str(lean_file.parent), "lean"
+
+    try:
+        run = stream_process(cmd, cwd, timeout, no_output_timeout, max_output_bytes, output_log)
+    except OSError as exc:
+        return False, {"error": f"无法启动: {cmd[0]}", "stage": "compile", "detail": str(exc)}
+
+    detail = {"mode": mode, "path": str(lean_file), "cmd": cmd, **run}
+    if mode == "lake_env_lean":
+        detail["project"] = cwd
+    if run["timeout"] == "total":
+        return False, dict(detail, status="failed", stage="compile", error=f"Lean4 gate 超时（{timeout}s）")
+    if run["timeout"] == "no_output":
+        return False, dict(detail, status="failed", stage="compile", error=f"Lean4 gate 连续 {no_output_timeout}s 无输出，已终止")
+    if run["returncode"] != 0:
+        return False, dict(detail, status="failed", stage="compile", error=f"Lean4 gate 编译失败（exit={run['returncode']}）")
+    return True, dict(detail, status="passed")
+
+
+_GATE_MARKER = "MATHPROVE_GATE_TARGET"
+_MODULE_STEP_RE = re.compile(r"^S(\d+)$")
+
+
+def _lake_target(lakefile: pathlib.Path, lib: str, src_dir: str) -> str:
+    if lakefile.suffix == ".toml":
+        return f'\n# {_GATE_MARKER}\n[[lean_lib]]\nname = "{lib}"\nsrcDir = "{src_dir}"\n'
+    return f'\n-- {_GATE_MARKER}\nlean_lib {lib} where\n  srcDir := "{src_dir}"\n'
+
+
+def _gate_state(project: pathlib.Path, suffix: str) -> pathlib.Path:
+    # 锁与 lakefile 备份放在系统临时目录，按工程路径区分，不在用户工程中留下文件。
+    key = hashlib.sha1(str(project).encode("utf-8")).hexdigest()[:16]
+    return pathlib.Path(tempfile.gettempdir()) / f"mathprove_gate_{key}{suffix}"
+
+
+@contextlib.contextmanager
+def _project_lock(project: pathlib.Path):
+    """同一工程上的模块 gate 串行执行（跨进程文件锁），避免并发审计互相改写 lakefile。"""
+    fd = os.open(str(_gate_state(project, ".lock")), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:  # pragma: no cover - Windows
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        yield
+    finally:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:  # pragma: no cover - Windows
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+
+def _atomic_write(path: pathlib.Path, text: str) -> None:
+    """先写同目录临时文件再 os.replace：任何时刻 lakefile 要么是旧内容要么是新内容。"""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        if path.exists():
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        pathlib.Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _restore_lakefile(lakefile: pathlib.Path, backup: pathlib.Path) -> None:
+    """把 lakefile 恢复为备份内容（也用于上一次 gate 被 SIGKILL 后的恢复），然后删除备份。"""
+    if backup.exists():
+        _atomic_write(lakefile, backup.read_text(encoding="utf-8"))
+        backup.unlink()
+
+
+def _lint_modules(modules: list[pathlib.Path], require_mathlib: bool, require_step_map: bool) -> list[dict]:
+    """对模块集合整体执行 lint，并检查每个 step 模块与 step map / 根模块 import 一一对应。"""
+    texts = [m.read_text(encoding="utf-8-sig") for m in modules]
+    issues = [
+        {"code": it.code, "message": it.message}
+        for it in lint(
+            lean_text="\n".join(texts),
+            md_text=None,
+            min_steps=1,
+            require_step_map=require_step_map,
+            require_mathlib=require_mathlib,
+            require_domain_defs=False,
+            lean_path=modules[0],
+        )
+    ]
+    root_text = texts[0]
+    root_map = {int(m.group(1)) for m in STEP_MAP_RE.finditer(root_text)}
+    for module, text in zip(modules[1:], texts[1:]):
+        m = _MODULE_STEP_RE.match(module.stem)
+        if not m:
+            continue
+        n = int(m.group(1))
+        decls = {int(d.group(1)) for d in STEP_DECL_RE.finditer(text)}
+        if decls != {n}:
+            issues.append({"code": "MODULE_STEP_MISMATCH", "message": f"{module.name} must declare exactly theorem/lemma S{n} (found {sorted(decls)})."})
+        if require_step_map and n not in root_map:
+            issues.append({"code": "STEP_MAP_MISSING_FOR_MODULE", "message": f"Root step-map has no '-- S{n}:' line for {module.name}."})
+        if not re.search(rf"(?m)^\s*import\s+{re.escape(module.parent.name)}\.S{n}\s*$", root_text):
+            issues.append({"code": "MODULE_NOT_IMPORTED", "message": f"Root module does not import {module.parent.name}.S{n}; it would not be built."})
+    return issues
+
+
+def run_module_gate(
+    project_dir: str,
+    src_dir: str,
+    modules: list[str],
+    lib: str = "MathProve",
+    require_mathlib: bool = True,
+    require_step_map: bool = True,
+    skip_lint: bool = False,
+    timeout: float = 120,
+    no_output_timeout: float = 0,
+    lake_path: str | None = None,
+    keep_lake_target: bool = False,
+    cleanup_src: bool = False,
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+    output_log: str | None = None,
+) -> tuple[bool, dict]:
+    """模块布局的 reverse gate：lint 全部模块后 `lake build <lib>`。
+
+    modules 第一个为根模块（含完整 step map），其余为 Preamble 与 S<n> 模块。
+    lakefile 中缺少目标时临时追加 `lean_lib <lib>`（srcDir 指向 src_dir）。
+    keep_lake_target=False（用户的真实工程）时：整个过程持有该工程的文件锁，lakefile 以原子写入修改并恢复，
+    原内容先备份到临时目录，进程被杀后下一次 gate 会先据此恢复。keep_lake_target=True 用于临时工程副本。
+    cleanup_src=True 时构建结束后删除 src_dir（由调用方生成的源码目录）。返回 (ok, detail)。
+    """
+    project = pathlib.Path(project_dir).resolve()
+    paths = [pathlib.Path(m).resolve() for m in modules]
+    missing = [str(m) for m in paths if not m.exists()]
+    if not paths or missing:
+        return False, {"error": f"reverse gate 模块不存在: {missing}", "stage": "setup"}
+
+    if not skip_lint:
+        issues = _lint_modules(paths, require_mathlib, require_step_map)
+        if issues:
+            return False, {"error": "reverse gate lint 失败", "stage": "lint", "issues": issues}
+
+    lakefile = next((project / name for name in ("lakefile.lean", "lakefile.toml") if (project / name).exists()), None)
+    if lakefile is None:
+        return False, {"error": f"模块布局需要 Lake 工程目录: {project}（缺少 lakefile.lean/toml）", "stage": "setup"}
+    lake = _find_command("lake", lake_path)
+    if not lake:
+        return False, {"error": "模块布局需要 lake：请安装 Lean4 工具链（推荐 elan）并确保 lake 在 PATH 中", "stage": "setup"}
+
+    cmd = [lake, "build", lib]
+    backup = _gate_state(project, ".lakefile")
+    with _project_lock(project):
+        if not keep_lake_target:
+            # 上一次 gate 在恢复前被杀：先还原用户的 lakefile。
+            _restore_lakefile(lakefile, backup)
+        original = lakefile.read_text(encoding="utf-8")
+        added_target = _GATE_MARKER not in original
+        if added_target:
+            if not keep_lake_target:
+                _atomic_write(backup, original)
+            rel_src = pathlib.Path(os.path.relpath(pathlib.Path(src_dir).resolve(), project)).as_posix()
+            _atomic_write(lakefile, original.rstrip("\n") + "\n" + _lake_target(lakefile, lib, rel_src))
+        try:
+            run = stream_process(cmd, str(project), timeout, no_output_timeout, max_output_bytes, output_log)
+        except OSError as exc:
+            return False, {"error": f"无法启动: {cmd[0]}", "stage": "compile", "detail": str(exc)}
+        finally:
+            if not keep_lake_target:
+                _restore_lakefile(lakefile, backup)
+            if cleanup_src:
+                shutil.rmtree(src_dir, ignore_errors=True)
+
+    detail = {"mode": "lake_build", "project": str(project), "modules": [str(m) for m in paths], "cmd": cmd, **run}
+    if run["timeout"] == "total":
+        return False, dict(detail, status="failed", stage="compile", error=f"Lean4 gate 超时（{timeout}s）")
+    if run["timeout"] == "no_output":
+        return False, dict(detail, status="failed", stage="compile", error=f"Lean4 gate 连续 {no_output_timeout}s 无输出，已终止")
+    if run["returncode"] != 0:
+        return False, dict(detail, status="failed", stage="compile", error=f"Lean4 gate 构建失败（exit={run['returncode']}）")
+    return True, dict(detail, status="passed")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reverse Lean4 gate（lint + 编译）")
+    parser.add_argument("--path", help="reverse gate .lean 文件（单文件布局）")
+    parser.add_argument("--src-dir", help="模块布局的源码目录（含 MathProve.lean 与 MathProve/*.lean），与 --path 二选一")
+    parser.add_argument("--project-dir", help="Lake+Mathlib 工程目录（严格模式）")
+    parser.add_argument("--require-mathlib", action="store_true", help="严格模式：要求 Lake 工程并使用 lake env lean")
+    parser.add_argument("--require-step-map", action="store_true", help="要求 '-- RIGOR_STEP_MAP' 映射")
+    parser.add_argument("--skip-lint", action="store_true", help="跳过 lint（不推荐）")
+    parser.add_argument("--timeout", type=float, default=120, help="总超时秒数")
+    parser.add_argument("--no-output-timeout", type=float, default=0, help="无输出超时秒数（0=不限制）")
+    parser.add_argument("--lake-path", help="lake 路径")
+    parser.add_argument("--lean-path", help="lean 路径")
+    parser.add_argument("--max-output-bytes", type=int, default=DEFAULT_MAX_OUTPUT_BYTES, help="保留的编译输出上限（字节，头尾各一半）")
+    parser.add_argument("--output-log", help="完整编译输出的日志文件")
+    args = parser.parse_args()
+    if bool(args.path) == bool(args.src_dir):
+        parser.error("需要且只能提供 --path 或 --src-dir 之一")
+
+    if args.src_dir:
+        src = pathlib.Path(args.src_dir)
+        modules = [src / "MathProve.lean", src / "MathProve" / "Preamble.lean"]
+        modules += sorted((src / "MathProve").glob("S*.lean"), key=lambda m: int(m.stem[1:]) if m.stem[1:].isdigit() else 0)
+        ok, detail = run_module_gate(
+            args.project_dir or str(src.parent),
+            str(src),
+            [str(m) for m in modules],
+            require_mathlib=args.require_mathlib,
+            require_step_map=args.require_step_map,
+            skip_lint=args.skip_lint,
+            timeout=args.timeout,
+            no_output_timeout=args.no_output_timeout,
+            lake_path=args.lake_path,
+            max_output_bytes=args.max_output_bytes,
+            output_log=args.output_log,
+        )
+        print(json.dumps(detail, ensure_ascii=False, indent=2))
+        return 0 if ok else 1
+
+    ok, detail = run_gate(
+        args.path,
+        project_dir=args.project_dir,
+        require_mathlib=args.require_mathlib,
+        require_step_map=args.require_step_map,
+        skip_lint=args.skip_lint,
+        timeout=args.timeout,
+        no_output_timeout=args.no_output_timeout,
+        lake_path=args.lake_path,
+        lean_path=args.lean_path,
+        max_output_bytes=args.max_output_bytes,
+        output_log=args.output_log,
+    )
+    print(json.dumps(detail, ensure_ascii=False, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,12 +7,16 @@
 """
 
 import argparse
+import concurrent.futures
+import functools
 import json
 import os
 import pathlib
 import re
 import subprocess
 import sys
+import threading
+import time
 from typing import Any
 
 try:
@@ -26,22 +30,57 @@ except ImportError:  # pragma: no cover
     from runtime_paths import assets_dir, skill_root
 
 try:
-    from ..runtime.workspace_manager import ensure_run_dir, run_path
+    from ..runtime.config_loader import load_config
+    from ..runtime.resources import plan_workers, route_limits
+    from ..runtime.result_cache import ResultCache, file_digest, fingerprint
+    from ..runtime.budget import DeadlineBudget
+    from ..runtime.failure import DEFAULT_BACKOFF_SECONDS, TRANSIENT, backoff_delay, classify_failure, should_retry
+    from ..runtime.progress import ProgressStream
+    from ..runtime.scheduler import run_dag
+    from ..runtime.supervisor import CancelScope, run_on_loop, supervise
+    from ..runtime.timing_history import TimingHistory
+    from ..runtime.workspace_manager import ensure_run_dir, resolve_workspace_dir, run_path
 except Exception:  # pragma: no cover
     import sys
     from pathlib import Path
 
     sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
-    from runtime.workspace_manager import ensure_run_dir, run_path
+    from runtime.config_loader import load_config
+    from runtime.resources import plan_workers, route_limits
+    from runtime.result_cache import ResultCache, file_digest, fingerprint
+    from runtime.budget import DeadlineBudget
+    from runtime.failure import DEFAULT_BACKOFF_SECONDS, TRANSIENT, backoff_delay, classify_failure, should_retry
+    from runtime.progress import ProgressStream
+    from runtime.scheduler import run_dag
+    from runtime.supervisor import CancelScope, run_on_loop, supervise
+    from runtime.timing_history import TimingHistory
+    from runtime.workspace_manager import ensure_run_dir, resolve_workspace_dir, run_path
 _BASE_DIR = skill_root()
 if str(_BASE_DIR) not in sys.path:
     sys.path.append(str(_BASE_DIR))
 try:  # optional SkillMP runtime
     from runtime.workspace import EphemeralWorkspace
+    from runtime.workspace_pool import WorkspacePool
 except Exception:  # noqa: BLE001
     EphemeralWorkspace = None
+    WorkspacePool = None
+
+try:
+    from . import check_reverse_lean4, lean_repl_client, verify_sympy
+except ImportError:  # pragma: no cover
+    import check_reverse_lean4
+    import lean_repl_client
+    import verify_sympy
+
+_SCRIPTS_DIR = pathlib.Path(__file__).resolve().parent
+_DEFAULT_SYMPY_RUNNER = _SCRIPTS_DIR / "verify_sympy.py"
+_DEFAULT_LEAN_RUNNER = _SCRIPTS_DIR / "lean_repl_client.py"
 
 
+_MANIFEST_VERSION = 1
+# Source dir (inside the Lake project) for --lean-gate-layout modules.
+_GATE_SRC_DIR = ".mathprove_gate"
+
 _STEP_ID_RE = re.compile(r"^S(\d+)$")
 _STEP_DECL_RE = re.compile(r"(?m)^\s*(?:theorem|lemma)\s+(S\d+)(?!\d)(?![A-Za-z0-9_'])")
 _FORBIDDEN_LEAN_DECL_RE = re.compile(r"(?m)^\s*(axiom|constant|opaque)\b")
@@ -97,37 +136,93 @@ def _read_json(path: str) -> dict:
     return json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
 
 
-def _run_python(script_path: str, args: list[str], timeout: int = 20, python_path: str | None = None):
+def _run_coro(coro, scope: CancelScope | None):
+    """在共享 supervisor 事件循环上执行；传入 scope 时可被 --fail-fast 统一取消（取消即终止子进程）。"""
+    return scope.run(coro) if scope is not None else run_on_loop(coro)
+
+
+def _run_python(
+    script_path: str, args: list[str], timeout: int = 20, python_path: str | None = None, scope: CancelScope | None = None
+):
     cmd = [python_path or sys.executable or "python", script_path] + args
-    proc = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        timeout=timeout,
-        check=False,
-    )
-    return proc.returncode, proc.stdout, proc.stderr
+    # runner 的 stdout 是完整 JSON，不截断。
+    proc = _run_coro(supervise(cmd, timeout=timeout, merge_stderr=False, max_output_bytes=0), scope)
+    if proc["returncode"] is None:
+        return 127, "", proc["output"]
+    err = proc["stderr"]
+    if proc["timeout"]:
+        err = f"{err}\nrunner 超时（>{timeout}s），已终止".lstrip()
+    return proc["returncode"], proc["output"], err
+
+
+def _is_default_runner(runner: str, default: pathlib.Path) -> bool:
+    try:
+        return pathlib.Path(runner).resolve() == default
+    except OSError:
+        return False
+
 
+def _limit_args(limits: dict | None) -> list[str]:
+    args = []
+    for key, value in (limits or {}).items():
+        if value:
+            args += ["--" + key.replace("_", "-"), str(value)]
+    return args
 
-def _run_sympy(checker: dict, sympy_runner: str, timeout: int, python_path: str | None = None):
+
+def _run_sympy(
+    checker: dict,
+    sympy_runner: str,
+    timeout: int,
+    python_path: str | None = None,
+    executor: str = "subprocess",
+    pool_size: int | None = None,
+    in_process: bool = False,
+    limits: dict | None = None,
+    scope: CancelScope | None = None,
+):
     code = checker.get("code")
     code_file = checker.get("code_file")
     if not code and not code_file:
         return False, {"error": "SymPy 检查缺少 code 或 code_file"}
 
-    args = ["--timeout", str(timeout)]
+    if executor == "pool" or in_process:
+        # Call run_code directly: saves the verify_sympy.py interpreter hop, and
+        # warm pool workers only live in this process anyway.
+        if code:
+            source = str(code)
+        else:
+            try:
+                source = pathlib.Path(str(code_file)).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError) as exc:
+                # Same outcome as the subprocess runner: the step fails, the audit goes on.
+                return False, {"error": f"SymPy code_file 无法读取: {exc}", "code_file": str(code_file)}
+        coro = verify_sympy.run_code_async(
+            source,
+            template_path=str(assets_dir() / "sympy_template.py"),
+            timeout=timeout,
+            python_path=python_path,
+            pool=verify_sympy.get_pool(python_path, size=pool_size) if executor == "pool" else None,
+            limits=limits,
+        )
+        result = _run_coro(coro, scope)
+        result["attempts"] = 1
+        return result.get("status") == "success", result
+
+    args = ["--timeout", str(timeout)] + _limit_args(limits)
     if code:
         args += ["--code", str(code)]
     else:
         args += ["--code-file", str(code_file)]
 
-    code_rc, out, err = _run_python(sympy_runner, args, timeout=timeout + 5, python_path=python_path)
+    code_rc, out, err = _run_python(sympy_runner, args, timeout=timeout + 5, python_path=python_path, scope=scope)
     if code_rc != 0:
-        return False, {"error": "SymPy 执行失败", "stderr": err, "stdout": out}
+        return False, {"error": "SymPy 执行失败", "returncode": code_rc, "stderr": err, "stdout": out}
     try:
-        return True, json.loads(out)
+        result = json.loads(out)
     except json.JSONDecodeError:
         return False, {"error": "SymPy 输出解析失败", "stdout": out}
+    return result.get("status") == "success", result
 
 
 def _run_lean(
@@ -137,6 +232,15 @@ def _run_lean(
     python_path: str | None = None,
     default_mode: str | None = None,
     default_cwd: str | None = None,
+    watchdog_timeout: int = 0,
+    in_process: bool = False,
+    session_header: str | None = None,
+    workers: int = 1,
+    session_preamble: str = "",
+    session_pickle_dir: str | None = None,
+    output_log: str | None = None,
+    limits: dict | None = None,
+    scope: CancelScope | None = None,
 ):
     cmds = checker.get("cmds")
     if not cmds and checker.get("cmd"):
@@ -148,44 +252,70 @@ def _run_lean(
     if not cmds:
         return False, {"error": "Lean4 检查缺少 cmds/cmd/code"}
 
-    payload = json.dumps({"cmds": cmds}, ensure_ascii=False)
-    args = ["--payload", payload, "--timeout", str(timeout)]
-
     mode = checker.get("mode") or default_mode
-    if mode:
-        args += ["--mode", str(mode)]
+    cwd = checker.get("cwd") or default_cwd
+    watchdog_timeout = int(checker.get("watchdog_timeout") or watchdog_timeout or 0)
+
+    if in_process:
+        coro = lean_repl_client.run_payload_async(
+            cmds,
+            mode=str(mode or "repl"),
+            repl_cmd=checker.get("repl_cmd") or lean_repl_client.DEFAULT_REPL_CMD,
+            file_cmd=checker.get("file_cmd") or lean_repl_client.DEFAULT_FILE_CMD,
+            lean_path=checker.get("lean_path"),
+            lake_path=checker.get("lake_path"),
+            cwd=cwd,
+            timeout=timeout,
+            watchdog_timeout=watchdog_timeout,
+            session_header=checker.get("session_header") or session_header or lean_repl_client.DEFAULT_SESSION_HEADER,
+            workers=workers,
+            session_preamble=session_preamble,
+            session_pickle_dir=session_pickle_dir,
+            output_log=output_log,
+            limits=limits,
+        )
+        result = _run_coro(coro, scope)
+        result["attempts"] = 1
+    else:
+        payload = json.dumps({"cmds": cmds}, ensure_ascii=False)
+        args = ["--payload", payload, "--timeout", str(timeout)]
+        if mode:
+            args += ["--mode", str(mode)]
 
-    file_cmd = checker.get("file_cmd")
-    if file_cmd:
-        args += ["--file-cmd", str(file_cmd)]
+        file_cmd = checker.get("file_cmd")
+        if file_cmd:
+            args += ["--file-cmd", str(file_cmd)]
 
-    repl_cmd = checker.get("repl_cmd")
-    if repl_cmd:
-        args += ["--repl-cmd", str(repl_cmd)]
+        repl_cmd = checker.get("repl_cmd")
+        if repl_cmd:
+            args += ["--repl-cmd", str(repl_cmd)]
 
-    lean_path = checker.get("lean_path")
-    if lean_path:
-        args += ["--lean-path", str(lean_path)]
+        lean_path = checker.get("lean_path")
+        if lean_path:
+            args += ["--lean-path", str(lean_path)]
 
-    lake_path = checker.get("lake_path")
-    if lake_path:
-        args += ["--lake-path", str(lake_path)]
+        lake_path = checker.get("lake_path")
+        if lake_path:
+            args += ["--lake-path", str(lake_path)]
 
-    cwd = checker.get("cwd") or default_cwd
-    if cwd:
-        args += ["--cwd", str(cwd)]
+        if cwd:
+            args += ["--cwd", str(cwd)]
 
-    watchdog_timeout = checker.get("watchdog_timeout") or getattr(args, "lean_watchdog_timeout", 0) or 0
-    if int(watchdog_timeout) > 0:
-        args += ["--watchdog-timeout", str(int(watchdog_timeout))]
+        if watchdog_timeout > 0:
+            args += ["--watchdog-timeout", str(watchdog_timeout)]
 
-    code_rc, out, err = _run_python(lean_runner, args, timeout=timeout + 5, python_path=python_path)
-    if code_rc != 0:
-        return False, {"error": "Lean4 执行失败", "stderr": err, "stdout": out}
-    try:
-        result = json.loads(out)
-    except json.JSONDecodeError:
-        return False, {"error": "Lean4 输出解析失败", "stdout": out}
+        if output_log:
+            args += ["--output-log", str(output_log)]
+
+        args += _limit_args(limits)
+
+        code_rc, out, err = _run_python(lean_runner, args, timeout=timeout + 5, python_path=python_path, scope=scope)
+        if code_rc != 0:
+            return False, {"error": "Lean4 执行失败", "returncode": code_rc, "stderr": err, "stdout": out}
+        try:
+            result = json.loads(out)
+        except json.JSONDecodeError:
+            return False, {"error": "Lean4 输出解析失败", "stdout": out}
     if result.get("status") != "success":
         return False, result
 
@@ -200,99 +330,685 @@ def _run_lean(
     return True, result
 
 
-def _audit_steps(steps: list[dict], sympy_runner: str, lean_runner: str, timeout: int, args) -> tuple[bool, list[dict]]:
-    report: list[dict] = []
-    all_passed = True
+def _output_log(args, name: str) -> str | None:
+    """完整的检查输出写入 run 目录的 logs/ 下；结果中只保留有界的头/尾。"""
+    run_dir = getattr(args, "_run_dir", None)
+    if run_dir is None:
+        return None
+    return str(run_path(run_dir, "logs/" + re.sub(r"[^\w.-]", "_", name)))
 
-    for step in steps:
-        checker = step.get("checker") or {}
-        ctype = checker.get("type") or step.get("route") or step.get("engine") or "unknown"
-        result: dict[str, Any] = {"id": step.get("id"), "status": "failed"}
-
-        if ctype == "sympy":
-            python_path = checker.get("python") or args.sympy_python or args.python
-            step_timeout = int(checker.get("timeout") or timeout)
-            retries = int(checker.get("retries", 0) or 0)
-            attempts = 0
-            ok = False
-            data: Any = None
-
-            while attempts <= retries:
-                attempts += 1
-                ok, data = _run_sympy(checker, sympy_runner, step_timeout, python_path=python_path)
-                log_event(
-                    {
-                        "event": "final_audit_sympy",
-                        "id": step.get("id"),
-                        "attempt": attempts,
-                        "status": "passed" if ok else "failed",
-                    },
-                    log_path=args.log,
-                )
-                if ok:
-                    break
-
-            result["status"] = "passed" if ok else "failed"
-            result["detail"] = data
-            result["attempts"] = attempts
-
-        elif ctype == "lean4":
-            python_path = checker.get("python") or args.lean_python or args.python
-            step_timeout = int(checker.get("timeout") or args.lean_timeout or timeout)
-            retries = int(checker.get("retries", 0) or 0)
-            attempts = 0
-            ok = False
-            data = None
-
-            static_ok, static_detail = _lean_static_precheck(step, checker)
-            if not static_ok:
-                ok = False
-                data = {"static_lint": static_detail}
-                log_event(
-                    {
-                        "event": "final_audit_lean4_static_lint",
-                        "id": step.get("id"),
-                        "status": "failed",
-                        "detail": static_detail,
-                    },
-                    log_path=args.log,
-                )
+
+def _checker_type(step: dict) -> str:
+    checker = step.get("checker") or {}
+    return checker.get("type") or step.get("route") or step.get("engine") or "unknown"
+
+
+@functools.lru_cache(maxsize=None)
+def _interpreter_version(python_path: str) -> str:
+    probe = "import sys\ntry:\n    import sympy\n    v = sympy.__version__\nexcept Exception:\n    v = ''\nprint(sys.version.split()[0], v)"
+    try:
+        proc = subprocess.run([python_path, "-c", probe], capture_output=True, text=True, timeout=60, check=False)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return proc.stdout.strip() if proc.returncode == 0 else ""
+
+
+@functools.lru_cache(maxsize=None)
+def _lean_toolchain(cwd: str, lean_path: str) -> str:
+    toolchain = pathlib.Path(cwd or ".") / "lean-toolchain"
+    if toolchain.is_file():
+        return toolchain.read_text(encoding="utf-8").strip()
+    try:
+        proc = subprocess.run([lean_path or "lean", "--version"], capture_output=True, text=True, timeout=60, check=False)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return proc.stdout.strip() if proc.returncode == 0 else ""
+
+
+def _cache_key(step: dict, sympy_runner: str, lean_runner: str, args) -> str | None:
+    """内容寻址缓存键：checker 内容 + 模板/runner + 解释器或工具链版本 + lake-manifest.json。"""
+    checker = step.get("checker") or {}
+    ctype = _checker_type(step)
+    if ctype == "sympy":
+        code = checker.get("code")
+        if not code and checker.get("code_file"):
+            try:
+                code = pathlib.Path(str(checker.get("code_file"))).read_text(encoding="utf-8")
+            except OSError:
+                return None
+        if not code:
+            return None
+        python_path = checker.get("python") or args.sympy_python or args.python or sys.executable or "python"
+        return fingerprint(
+            "sympy",
+            str(code),
+            file_digest(assets_dir() / "sympy_template.py"),
+            file_digest(sympy_runner),
+            _interpreter_version(str(python_path)),
+        )
+    if ctype == "lean4":
+        cwd = str(checker.get("cwd") or args.lean_cwd or "")
+        return fingerprint(
+            "lean4",
+            str(step.get("id") or ""),
+            {k: checker.get(k) for k in ("cmds", "cmd", "code", "mode", "repl_cmd", "file_cmd", "session_header")},
+            args.lean_mode,
+            args.lean_session_header,
+            getattr(args, "_session_preamble", ""),
+            file_digest(lean_runner),
+            _lean_toolchain(cwd, str(checker.get("lean_path") or "")),
+            file_digest(pathlib.Path(cwd) / "lake-manifest.json") if cwd else "",
+        )
+    if ctype == "hybrid":
+        sympy_part, lean_part = _hybrid_parts(checker)
+        if sympy_part is None or lean_part is None:
+            return None
+        base = {k: v for k, v in step.items() if k != "checker"}
+        sympy_key = _cache_key(dict(base, checker=dict(sympy_part, type="sympy")), sympy_runner, lean_runner, args)
+        lean_key = _cache_key(dict(base, checker=dict(lean_part, type="lean4")), sympy_runner, lean_runner, args)
+        if not sympy_key or not lean_key:
+            return None
+        return fingerprint("hybrid", sympy_key, lean_key, checker.get("policy") or getattr(args, "hybrid_policy", None))
+    return None
+
+
+_FAIL_FAST_LOCK = threading.Lock()
+
+
+def _budget_discard(args, sid: str) -> None:
+    budget = getattr(args, "_budget", None)
+    if budget is not None:
+        budget.discard(sid)
+
+
+def _audit_step(step: dict, sympy_runner: str, lean_runner: str, timeout: int, args) -> dict:
+    sid = str(step.get("id") or "")
+    previous = (getattr(args, "_previous_steps", None) or {}).get(sid) or {}
+    step_hash = (getattr(args, "_step_hashes", None) or {}).get(sid)
+    if step_hash and previous.get("hash") == step_hash and (previous.get("result") or {}).get("status") == "passed":
+        log_event({"event": "final_audit_incremental_reuse", "id": step.get("id")}, log_path=args.log)
+        _budget_discard(args, sid)
+        return dict(previous["result"], incremental="reused")
+
+    cache = getattr(args, "_cache", None)
+    key = _cache_key(step, sympy_runner, lean_runner, args) if cache else None
+    if key:
+        cached = cache.get(key)
+        if cached is not None:
+            log_event({"event": "final_audit_cache_hit", "id": step.get("id"), "key": key}, log_path=args.log)
+            _budget_discard(args, sid)
+            return {"id": step.get("id"), "status": "passed", "detail": cached, "attempts": 0, "cache": "hit"}
+
+    started = time.monotonic()
+    try:
+        result = _verify_step(step, sympy_runner, lean_runner, timeout, args)
+    except concurrent.futures.CancelledError:
+        # --fail-fast 取消了在途的检查（子进程 / worker 已被终止）。
+        log_event({"event": "final_audit_cancelled", "id": step.get("id")}, log_path=args.log)
+        return _skipped_step(step, [str(args._fail_fast_by)], "cancelled")
+    elapsed = time.monotonic() - started
+    if result["status"] == "failed" and getattr(args, "fail_fast", False):
+        with _FAIL_FAST_LOCK:
+            first = args._fail_fast_by is None
+            if first:
+                args._fail_fast_by = sid
+        if first:
+            log_event({"event": "final_audit_fail_fast", "id": step.get("id")}, log_path=args.log)
+            args._scope.cancel()
+    if result["status"] in {"passed", "failed"}:
+        # 被预算截断的 step 耗时只是下界，不计入历史。
+        history = getattr(args, "_timings", None)
+        if history is not None:
+            history.record((getattr(args, "_checker_hashes", None) or {}).get(sid), elapsed, result["status"] == "passed")
+        log_event(
+            {"event": "final_audit_step_timing", "id": step.get("id"), "seconds": round(elapsed, 4), "status": result["status"]},
+            log_path=args.log,
+        )
+    if key:
+        result["cache"] = "miss"
+        if result["status"] == "passed":
+            cache.put(key, result.get("detail"))
+    return result
+
+
+def _attempt_timeout(explicit, default: int, step_deadline: float | None) -> int:
+    """本次尝试的超时：无 --deadline 时为固定值；否则为该 step 分到的剩余时间（checker 显式 timeout 仍为上限）。"""
+    if step_deadline is None:
+        return int(explicit or default)
+    left = int(step_deadline - time.monotonic())
+    return min(left, int(explicit)) if explicit else left
+
+
+def _budget_cut(result: dict, checker: dict) -> bool:
+    """step 因分到的时间用尽而未通过（未能开始，或超时且超时值来自预算而非 checker）。"""
+    if result["status"] == "passed":
+        return False
+    detail = result.get("detail")
+    if detail is None:
+        return True
+    return isinstance(detail, dict) and detail.get("error_type") == "Timeout" and not checker.get("timeout")
+
+
+def _note_failure(ok: bool, detail: Any) -> str | None:
+    """失败分类（deterministic / transient / environment），同时写入 detail；通过时返回 None。"""
+    if ok:
+        return None
+    failure = classify_failure(detail)
+    if isinstance(detail, dict):
+        detail["failure_class"] = failure
+    return failure
+
+
+def _retry_backoff(args, scope: CancelScope | None, attempt: int, step_deadline: float | None) -> None:
+    """瞬时失败重试前按指数退避等待（不超过 step 的剩余时间）；等待期间被取消则抛出 CancelledError。"""
+    delay = backoff_delay(attempt, getattr(args, "retry_backoff", DEFAULT_BACKOFF_SECONDS))
+    if step_deadline is not None:
+        delay = min(delay, step_deadline - time.monotonic() - 1)
+    if delay <= 0:
+        return
+    if scope is None:
+        time.sleep(delay)
+    elif scope.wait(delay):
+        raise concurrent.futures.CancelledError()
+
+
+def _check_sympy(step: dict, checker: dict, sympy_runner: str, timeout: int, args, step_deadline, scope) -> tuple:
+    """执行 SymPy checker（含重试），返回 (ok, detail, attempts)。"""
+    python_path = checker.get("python") or args.sympy_python or args.python
+    retries = int(checker.get("retries", 0) or 0)
+    attempts = 0
+    ok = False
+    data: Any = None
+    # The pool and in-process paths call verify_sympy directly: a custom --sympy-runner must stay a subprocess.
+    default_runner = _is_default_runner(sympy_runner, _DEFAULT_SYMPY_RUNNER)
+
+    while attempts <= retries:
+        step_timeout = _attempt_timeout(checker.get("timeout"), timeout, step_deadline)
+        if step_timeout < 1:
+            break
+        attempts += 1
+        ok, data = _run_sympy(
+            checker,
+            sympy_runner,
+            step_timeout,
+            python_path=python_path,
+            executor=args.sympy_executor if default_runner else "subprocess",
+            pool_size=args.sympy_pool_size,
+            in_process=args.exec_mode == "inprocess" and default_runner,
+            limits=getattr(args, "_sympy_limits", None),
+            scope=scope,
+        )
+        failure = _note_failure(ok, data)
+        log_event(
+            {
+                "event": "final_audit_sympy",
+                "id": step.get("id"),
+                "attempt": attempts,
+                "status": "passed" if ok else "failed",
+                "failure_class": failure,
+            },
+            log_path=args.log,
+        )
+        if ok or not should_retry(failure):
+            break
+        if attempts <= retries:
+            _retry_backoff(args, scope, attempts, step_deadline)
+    return ok, data, attempts
+
+
+def _check_lean(step: dict, checker: dict, lean_runner: str, timeout: int, args, step_deadline, scope) -> tuple:
+    """执行 Lean4 checker（静态预检 + 重试），返回 (ok, detail, attempts)。"""
+    python_path = checker.get("python") or args.lean_python or args.python
+    retries = int(checker.get("retries", 0) or 0)
+    attempts = 0
+    ok = False
+    data = None
+
+    static_ok, static_detail = _lean_static_precheck(step, checker)
+    if not static_ok:
+        log_event(
+            {
+                "event": "final_audit_lean4_static_lint",
+                "id": step.get("id"),
+                "status": "failed",
+                "detail": static_detail,
+            },
+            log_path=args.log,
+        )
+        return False, {"static_lint": static_detail}, 0
+
+    lean_mode = checker.get("mode") or args.lean_mode
+    # A session only pays off if it outlives the step, i.e. lives in this process.
+    in_process = _is_default_runner(lean_runner, _DEFAULT_LEAN_RUNNER) and (
+        args.exec_mode == "inprocess" or lean_mode == "session"
+    )
+    while attempts <= retries:
+        step_timeout = _attempt_timeout(checker.get("timeout"), args.lean_timeout or timeout, step_deadline)
+        if step_timeout < 1:
+            break
+        attempts += 1
+        ok, data = _run_lean(
+            checker,
+            lean_runner,
+            step_timeout,
+            python_path=python_path,
+            default_mode=args.lean_mode,
+            default_cwd=args.lean_cwd,
+            watchdog_timeout=args.lean_watchdog_timeout,
+            in_process=in_process,
+            session_header=args.lean_session_header,
+            workers=args.lean_workers,
+            session_preamble=getattr(args, "_session_preamble", ""),
+            session_pickle_dir=getattr(args, "_lean_pickle_dir", None),
+            output_log=_output_log(args, f"lean_{step.get('id') or 'step'}.log"),
+            limits=getattr(args, "_lean_limits", None),
+            scope=scope,
+        )
+        failure = _note_failure(ok, data)
+        log_event(
+            {
+                "event": "final_audit_lean4",
+                "id": step.get("id"),
+                "attempt": attempts,
+                "status": "passed" if ok else "failed",
+                "failure_class": failure,
+            },
+            log_path=args.log,
+        )
+        if ok or not should_retry(failure):
+            break
+        if attempts <= retries:
+            _retry_backoff(args, scope, attempts, step_deadline)
+    return ok, data, attempts
+
+
+HYBRID_POLICIES = ("both", "lean")
+
+
+def _hybrid_parts(checker: dict) -> tuple[dict | None, dict | None]:
+    """hybrid checker 的 SymPy / Lean4 子 checker（缺失时为 None）。"""
+    sympy_part = checker.get("sympy")
+    lean_part = checker.get("lean4") or checker.get("lean")
+    return (
+        sympy_part if isinstance(sympy_part, dict) else None,
+        lean_part if isinstance(lean_part, dict) else None,
+    )
+
+
+def _lean_checker(step: dict) -> dict | None:
+    """step 中需要 Lean4 校验（含 reverse gate）的 checker：lean4 步骤本身，或 hybrid 步骤的 Lean4 部分。"""
+    checker = step.get("checker") or {}
+    ctype = _checker_type(step)
+    if ctype == "lean4":
+        return checker
+    if ctype == "hybrid":
+        return _hybrid_parts(checker)[1]
+    return None
+
+
+def _sympy_refutes(detail: Any) -> bool:
+    """SymPy 片段本身跑完并以 AssertionError 失败 = 找到反例（区别于超时、资源超限、runner 故障等）。"""
+    if not isinstance(detail, dict) or detail.get("error_type") != "RuntimeError":
+        return False
+    return "AssertionError" in str(detail.get("stderr") or "")
+
+
+def _hybrid_verdict(policy: str, sympy_state: dict, lean_state: dict) -> tuple[str | None, str | None]:
+    """根据已完成的引擎结果判定 (status, decided_by)；尚不能判定时返回 (None, None)。"""
+    if sympy_state.get("status") == "failed" and _sympy_refutes(sympy_state.get("detail")):
+        return "failed", "sympy"
+    lean_status = lean_state.get("status")
+    if policy == "lean":
+        if lean_status in {"passed", "failed"}:
+            return lean_status, "lean4"
+        return None, None
+    if sympy_state.get("status") == "failed":
+        return "failed", "sympy"
+    if lean_status == "failed":
+        return "failed", "lean4"
+    if sympy_state.get("status") == "passed" and lean_status == "passed":
+        return "passed", "both"
+    return None, None
+
+
+def _hybrid_budget_cut(result: dict, checker: dict) -> bool:
+    """hybrid step 未通过且每个失败的引擎都只是因预算用尽（未能开始或被预算超时截断）。"""
+    if result["status"] == "passed" or not isinstance(result.get("detail"), dict):
+        return False
+    parts = dict(zip(("sympy", "lean4"), _hybrid_parts(checker)))
+    failed = [name for name in parts if (result["detail"].get(name) or {}).get("status") == "failed"]
+    return bool(failed) and all(
+        _budget_cut({"status": "failed", "detail": result["detail"][name].get("detail")}, parts[name] or {})
+        for name in failed
+    )
+
+
+def _verify_hybrid(step: dict, sympy_runner: str, lean_runner: str, timeout: int, args, step_deadline) -> dict:
+    """hybrid step：SymPy 与 Lean4 并发执行，满足 policy 后立即取消另一个引擎。
+
+    policy=both（默认）：两者都通过才算通过，任一失败即失败；
+    policy=lean：以 Lean4 结果为准，SymPy 只作为反例探测。
+    无论哪种 policy，SymPy 找到反例（断言失败）都会立即终止仍在运行的 Lean4 检查。
+    """
+    checker = step.get("checker") or {}
+    policy = str(checker.get("policy") or getattr(args, "hybrid_policy", None) or "both")
+    if policy not in HYBRID_POLICIES:
+        return {"status": "failed", "detail": {"error": f"不支持的 hybrid policy: {policy}"}, "attempts": 0}
+    sympy_part, lean_part = _hybrid_parts(checker)
+    if sympy_part is None or lean_part is None:
+        return {"status": "failed", "detail": {"error": "hybrid checker 需要同时提供 sympy 与 lean4 子 checker"}, "attempts": 0}
+
+    parent = getattr(args, "_scope", None)
+    scopes = {
+        "sympy": parent.child() if parent is not None else CancelScope(),
+        "lean4": parent.child() if parent is not None else CancelScope(),
+    }
+    checks = {
+        "sympy": lambda: _check_sympy(step, sympy_part, sympy_runner, timeout, args, step_deadline, scopes["sympy"]),
+        "lean4": lambda: _check_lean(step, lean_part, lean_runner, timeout, args, step_deadline, scopes["lean4"]),
+    }
+    states: dict[str, dict] = {"sympy": {"status": "running"}, "lean4": {"status": "running"}}
+    status, decided_by = None, None
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="hybrid")
+    try:
+        futures = {pool.submit(fn): name for name, fn in checks.items()}
+        pending = set(futures)
+        while pending and status is None:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    ok, data, attempts = future.result()
+                except concurrent.futures.CancelledError:
+                    # 外层 --fail-fast 取消了整个审计。
+                    states[name] = {"status": "cancelled", "attempts": 0}
+                    continue
+                states[name] = {"status": "passed" if ok else "failed", "detail": data, "attempts": attempts}
+            status, decided_by = _hybrid_verdict(policy, states["sympy"], states["lean4"])
+        for future in pending:
+            scopes[futures[future]].cancel()
+        for future in pending:
+            name = futures[future]
+            try:
+                ok, data, attempts = future.result()
+            except concurrent.futures.CancelledError:
+                states[name] = {"status": "cancelled", "attempts": 0}
             else:
-                while attempts <= retries:
-                    attempts += 1
-                    ok, data = _run_lean(
-                        checker,
-                        lean_runner,
-                        step_timeout,
-                        python_path=python_path,
-                        default_mode=args.lean_mode,
-                        default_cwd=args.lean_cwd,
-                    )
-                    log_event(
-                        {
-                            "event": "final_audit_lean4",
-                            "id": step.get("id"),
-                            "attempt": attempts,
-                            "status": "passed" if ok else "failed",
-                        },
-                        log_path=args.log,
-                    )
-                    if ok:
-                        break
+                # 取消前已经跑完：如实记录结果，但不改变判定。
+                states[name] = {"status": "passed" if ok else "failed", "detail": data, "attempts": attempts}
+    finally:
+        pool.shutdown(wait=True)
+        for scope in scopes.values():
+            scope.close()
+
+    if parent is not None and parent.cancelled and status is None:
+        raise concurrent.futures.CancelledError()
+    if status is None:
+        # 两个引擎都结束仍未满足 policy（例如 policy=lean 而 Lean 被取消）。
+        status = "failed"
+    log_event(
+        {
+            "event": "final_audit_hybrid",
+            "id": step.get("id"),
+            "policy": policy,
+            "status": status,
+            "decided_by": decided_by,
+            "cancelled": [name for name, state in states.items() if state["status"] == "cancelled"],
+        },
+        log_path=args.log,
+    )
+    result = {
+        "status": status,
+        "detail": {"policy": policy, "decided_by": decided_by, **states},
+        "attempts": sum(int(state.get("attempts") or 0) for state in states.values()),
+    }
+    if status == "failed":
+        failed = [states[name] for name in (decided_by, "sympy", "lean4") if name in states]
+        failed = [state for state in failed if state["status"] == "failed"]
+        result["failure_class"] = classify_failure(failed[0].get("detail")) if failed else TRANSIENT
+    return result
+
+
+def _verify_step(step: dict, sympy_runner: str, lean_runner: str, timeout: int, args) -> dict:
+    checker = step.get("checker") or {}
+    ctype = _checker_type(step)
+    result: dict[str, Any] = {"id": step.get("id"), "status": "failed"}
+    budget = getattr(args, "_budget", None)
+    step_deadline = None
+    if budget is not None:
+        grant = budget.allocate(str(step.get("id") or ""))
+        step_deadline = time.monotonic() + grant
+        result["budget_seconds"] = round(grant, 3)
+    scope = getattr(args, "_scope", None)
+
+    if ctype == "sympy":
+        ok, data, attempts = _check_sympy(step, checker, sympy_runner, timeout, args, step_deadline, scope)
+        result["status"] = "passed" if ok else "failed"
+        result["detail"] = data
+        result["attempts"] = attempts
+
+    elif ctype == "lean4":
+        ok, data, attempts = _check_lean(step, checker, lean_runner, timeout, args, step_deadline, scope)
+        result["status"] = "passed" if ok else "failed"
+        result["detail"] = data
+        result["attempts"] = attempts
+
+    elif ctype == "hybrid":
+        result.update(_verify_hybrid(step, sympy_runner, lean_runner, timeout, args, step_deadline))
 
-            result["status"] = "passed" if ok else "failed"
-            result["detail"] = data
-            result["attempts"] = attempts
+    else:
+        result["detail"] = {"error": f"不支持的 checker 类型: {ctype}"}
+
+    cut = ctype in {"sympy", "lean4"} and _budget_cut(result, checker)
+    if ctype == "hybrid":
+        cut = _hybrid_budget_cut(result, checker)
+    if budget is not None and cut:
+        result["status"] = "budget_exhausted"
+        result.pop("failure_class", None)
+        if result.get("detail") is None:
+            result["detail"] = {"error": _SKIP_REASONS["budget_exhausted"], "reason": "budget_exhausted"}
+    if result["status"] == "failed" and "failure_class" not in result:
+        result["failure_class"] = classify_failure(result.get("detail"))
+    if isinstance(result.get("detail"), dict) and result["detail"].get("resources"):
+        # 峰值 RSS / CPU / 墙钟时间，用于评估 worker 池规模。
+        result["resources"] = result["detail"]["resources"]
+    return result
+
+
+def _step_deps(step: dict) -> list[str]:
+    deps = step.get("depends_on") or []
+    if isinstance(deps, str):
+        deps = [deps]
+    return [str(d).strip() for d in deps if str(d).strip()]
+
+
+_SKIP_REASONS = {
+    "unknown_dependency": "depends_on 引用了不存在的步骤",
+    "dependency_failed": "依赖步骤未通过",
+    "dependency_cycle": "depends_on 存在循环依赖",
+    "budget_exhausted": "--deadline 预算已用尽，未执行",
+    "fail_fast": "--fail-fast：已有 step 失败，未执行",
+    "cancelled": "--fail-fast：已有 step 失败，执行中被取消",
+}
+_SKIP_STATUS = {"budget_exhausted": "budget_exhausted", "fail_fast": "not_run", "cancelled": "not_run"}
+
+
+def _skipped_step(step: dict, blockers: list[str], reason: str) -> dict:
+    return {
+        "id": step.get("id"),
+        "status": _SKIP_STATUS.get(reason, "skipped"),
+        "detail": {"error": _SKIP_REASONS.get(reason, reason), "reason": reason, "blocked_by": blockers},
+        "attempts": 0,
+    }
+
+
+def _progress_fields(result: dict) -> dict:
+    """--stream 的 step_finish 事件字段（完整 detail 只写入最终报告）。"""
+    fields = {"id": result.get("id"), "status": result.get("status"), "attempts": result.get("attempts", 0)}
+    for name in ("cache", "incremental", "budget_seconds", "failure_class"):
+        if name in result:
+            fields[name] = result[name]
+    detail = result.get("detail")
+    if isinstance(detail, dict):
+        for name in ("reason", "blocked_by", "error_type"):
+            if detail.get(name):
+                fields[name] = detail[name]
+    return fields
+
+
+def _streamed_step(step: dict, sympy_runner: str, lean_runner: str, timeout: int, args) -> dict:
+    progress = args._progress
+    progress.emit("step_start", id=step.get("id"), checker=_checker_type(step))
+    started = time.monotonic()
+    result = _audit_step(step, sympy_runner, lean_runner, timeout, args)
+    progress.emit("step_finish", **_progress_fields(result), seconds=round(time.monotonic() - started, 4))
+    return result
+
+
+def _streamed_skip(args, step: dict, blockers: list[str], reason: str) -> dict:
+    result = _skipped_step(step, blockers, reason)
+    args._progress.emit("step_finish", **_progress_fields(result), seconds=0.0)
+    return result
+
+
+def _checker_hashes(steps: list[dict], sympy_runner: str, lean_runner: str, args) -> dict[str, str]:
+    """每个 step 自身 checker 的哈希（缓存键；无法计算时退化为 checker 内容指纹），也是耗时历史的键。"""
+    own: dict[str, str] = {}
+    for step in steps:
+        sid = str(step.get("id") or "")
+        key = _cache_key(step, sympy_runner, lean_runner, args)
+        own[sid] = key or fingerprint("step", sid, step.get("checker") or {})
+    return own
 
-        else:
-            result["detail"] = {"error": f"不支持的 checker 类型: {ctype}"}
-            all_passed = False
 
-        if result["status"] != "passed":
-            all_passed = False
-        report.append(result)
+def _step_hashes(steps: list[dict], sympy_runner: str, lean_runner: str, args) -> dict[str, str]:
+    """每个 step 的输入哈希：自身 checker 内容 + 全部上游依赖的哈希（依赖变化会向下游传播）。"""
+    by_id = {str(s.get("id") or ""): s for s in steps}
+    own = getattr(args, "_checker_hashes", None) or _checker_hashes(steps, sympy_runner, lean_runner, args)
+
+    out: dict[str, str] = {}
+
+    def resolve(sid: str, visiting: set[str]) -> str:
+        if sid in out:
+            return out[sid]
+        if sid not in own or sid in visiting:
+            return ""
+        visiting.add(sid)
+        upstream = [(dep, resolve(dep, visiting)) for dep in _step_deps(by_id[sid])]
+        visiting.discard(sid)
+        out[sid] = fingerprint(own[sid], upstream)
+        return out[sid]
 
-    return all_passed, report
+    for sid in own:
+        resolve(sid, set())
+    return out
+
+
+def _load_manifest(path: pathlib.Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) and data.get("version") == _MANIFEST_VERSION else {}
+
+
+def _write_manifest(path: pathlib.Path, step_hashes: dict[str, str], report: list[dict], gate: dict) -> None:
+    manifest = {
+        "version": _MANIFEST_VERSION,
+        "steps": {
+            str(r.get("id")): {"hash": step_hashes.get(str(r.get("id")), ""), "result": r}
+            for r in report
+        },
+        "reverse_gate": gate,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+_DIFFICULTY_SECONDS = {"easy": 5.0, "medium": 15.0, "hard": 60.0}
+_ROUTE_FACTOR = {"sympy": 1.0, "lean4": 3.0, "hybrid": 3.0}
+_DIFFICULTY_FAILURE = {"easy": 0.05, "medium": 0.15, "hard": 0.35}
+# 历史失败率的平滑强度：相当于额外计入这么多次“按难度先验”的运行。
+_FAILURE_PRIOR_RUNS = 2
+SCHEDULES = ("file", "shortest", "failure-first")
+
+
+def _step_cost(step: dict, args) -> float:
+    """预估 step 耗时（秒）：优先取该 checker 哈希的耗时历史，其次上次审计记录的墙钟时间，冷启动时按难度与路线估计。"""
+    sid = str(step.get("id") or "")
+    history = getattr(args, "_timings", None)
+    entry = history.get((getattr(args, "_checker_hashes", None) or {}).get(sid)) if history else None
+    if entry:
+        return max(float(entry["seconds"]), 0.1)
+    previous = ((getattr(args, "_previous_steps", None) or {}).get(sid) or {}).get("result") or {}
+    seconds = (previous.get("resources") or {}).get("wall_seconds")
+    if seconds:
+        return max(float(seconds), 0.1)
+    difficulty = str(step.get("difficulty") or "").lower()
+    base = _DIFFICULTY_SECONDS.get(difficulty, _DIFFICULTY_SECONDS["medium"])
+    return base * _ROUTE_FACTOR.get(_checker_type(step), 1.0)
+
+
+def _failure_odds(step: dict, args) -> float:
+    """预估 step 失败概率：历史失败次数按难度先验平滑；冷启动时即为先验。"""
+    sid = str(step.get("id") or "")
+    prior = _DIFFICULTY_FAILURE.get(str(step.get("difficulty") or "").lower(), _DIFFICULTY_FAILURE["medium"])
+    history = getattr(args, "_timings", None)
+    entry = history.get((getattr(args, "_checker_hashes", None) or {}).get(sid)) if history else None
+    if not entry:
+        return prior
+    return (entry["failures"] + prior * _FAILURE_PRIOR_RUNS) / (entry["runs"] + _FAILURE_PRIOR_RUNS)
+
+
+def _schedule_priority(args):
+    """--schedule 对应的 run_dag 优先级（越小越先启动）；file 保持文件顺序。"""
+    if args.schedule == "shortest":
+        return lambda step: _step_cost(step, args)
+    if args.schedule == "failure-first":
+        return lambda step: (-_failure_odds(step, args), _step_cost(step, args))
+    return None
+
+
+def _schedule_engine(step: dict) -> str:
+    """并发上限按引擎计：hybrid step 占用一个 Lean4 名额（Lean 是稀缺资源）。"""
+    return "lean4" if _checker_type(step) == "hybrid" else _checker_type(step)
+
+
+def _stop_reason(args) -> str | None:
+    """run_dag 的停止条件：--fail-fast 已触发，或 --deadline 预算用尽。"""
+    if getattr(args, "_fail_fast_by", None) is not None:
+        return "fail_fast"
+    budget = getattr(args, "_budget", None)
+    if budget is not None and budget.expired():
+        return "budget_exhausted"
+    return None
+
+
+def _audit_steps(steps: list[dict], sympy_runner: str, lean_runner: str, timeout: int, args) -> tuple[bool, list[dict]]:
+    # Steps run as soon as their depends_on steps have passed, under a global
+    # --jobs limit plus per-engine caps; results come back in step order.
+    lean_jobs = int(args.lean_jobs or args.lean_workers or 1)
+    sympy_jobs = int(args.sympy_jobs or 1)
+    jobs = int(args.jobs or (lean_jobs + sympy_jobs))
+    args._budget = None
+    if getattr(args, "_deadline_at", None) is not None:
+        costs = {str(s.get("id") or ""): _step_cost(s, args) for s in steps}
+        args._budget = DeadlineBudget(args._deadline_at - time.monotonic(), costs, lanes=jobs)
+    streamed = getattr(args, "_progress", None) is not None and args._progress.enabled
+    run_step = _streamed_step if streamed else _audit_step
+    report = run_dag(
+        steps,
+        lambda step: run_step(step, sympy_runner, lean_runner, timeout, args),
+        key=lambda step: str(step.get("id") or ""),
+        deps=_step_deps,
+        engine=_schedule_engine,
+        skip=functools.partial(_streamed_skip, args) if streamed else _skipped_step,
+        jobs=jobs,
+        limits={"sympy": sympy_jobs, "lean4": lean_jobs},
+        stop=lambda: _stop_reason(args),
+        priority=_schedule_priority(args),
+    )
+    return all(r["status"] == "passed" for r in report), report
 
 
 def _load_template(path: pathlib.Path) -> str:
@@ -387,6 +1103,78 @@ def _extract_step_num(step_id: str) -> int | None:
     return int(m.group(1))
 
 
+def _reverse_gate_step_block(step: dict) -> tuple[bool, str, set[str], list[str]]:
+    """生成单个 step 在 reverse gate 中的代码块。返回 (ok, message, imports, lines)。"""
+    checker = step.get("checker") or {}
+    ctype = checker.get("type") or step.get("route") or "unknown"
+    if ctype == "hybrid":
+        # hybrid step 的 Lean4 部分同样进入 reverse gate。
+        checker, ctype = _hybrid_parts(checker)[1] or {}, "lean4"
+    sid = str(step.get("id") or "S?").strip()
+    goal = str(step.get("goal") or "").strip()
+
+    inserts: list[str] = ["", f"-- STEP {sid}: {goal}"]
+    if ctype != "lean4":
+        inserts.append("-- (non-Lean step; verified elsewhere)")
+        return True, "", set(), inserts
+
+    # Lean code lines: prefer cmds; fall back to code/cmd.
+    cmds = checker.get("cmds")
+    if not cmds and checker.get("cmd"):
+        cmds = [checker.get("cmd")]
+    if not cmds and checker.get("code"):
+        snippet = str(checker.get("code"))
+        cmds = [ln for ln in snippet.splitlines() if ln.strip()]
+    if not cmds:
+        return False, f"Lean step {sid} 缺少 checker.cmds/cmd/code，无法生成 reverse gate", set(), []
+
+    # Precheck: require theorem/lemma name matches the step id.
+    raw_lines = [str(x) for x in cmds]
+    joined = "\n".join(raw_lines)
+    decls = {m.group(1) for m in _STEP_DECL_RE.finditer(joined)}
+    if sid not in decls:
+        return False, f"Lean step {sid} 的代码必须包含 'theorem/lemma {sid}' 声明（用于 lint 与可追溯映射）", set(), []
+
+    # Hoist `import ...` lines to the file header (Lean requires imports at the top).
+    imports: set[str] = set()
+    code_lines: list[str] = []
+    for ln in raw_lines:
+        if re.match(r"^\s*import\s+", ln):
+            imports.add(ln.strip())
+            continue
+        code_lines.append(ln)
+
+    # Attach talk-friendly metadata as comments.
+    symbols = step.get("symbols") or []
+    if isinstance(symbols, list) and symbols:
+        inserts.append("-- Symbols:")
+        for s in symbols:
+            if isinstance(s, dict):
+                name = str(s.get("name") or "").strip()
+                meaning = str(s.get("meaning") or "").strip()
+                if name or meaning:
+                    inserts.append(f"--   - {name}: {meaning}")
+            elif isinstance(s, str) and s.strip():
+                inserts.append(f"--   - {s.strip()}")
+
+    assumptions = step.get("assumptions") or []
+    if isinstance(assumptions, list) and assumptions:
+        inserts.append("-- Assumptions:")
+        for a in assumptions:
+            if isinstance(a, str) and a.strip():
+                inserts.append(f"--   - {a.strip()}")
+
+    explanation = str(step.get("explanation") or "").strip()
+    if explanation:
+        inserts.append("-- Explanation:")
+        for ln in explanation.splitlines():
+            inserts.append(f"--   {ln}".rstrip())
+
+    inserts.append("")  # separate comments from code
+    inserts.extend(code_lines)
+    return True, "", imports, inserts
+
+
 def _generate_reverse_gate_file(steps: list[dict], out_path: pathlib.Path, template_path: pathlib.Path) -> tuple[bool, str]:
     """Generate a single Lean file for reverse gating. Return (ok, message)."""
     tpl = _load_template(template_path)
@@ -424,71 +1212,11 @@ def _generate_reverse_gate_file(steps: list[dict], out_path: pathlib.Path, templ
     extra_imports: set[str] = set()
     inserts: list[str] = []
     for step in steps:
-        checker = step.get("checker") or {}
-        ctype = checker.get("type") or step.get("route") or "unknown"
-        sid = str(step.get("id") or "S?").strip()
-        goal = str(step.get("goal") or "").strip()
-
-        inserts.append("")
-        inserts.append(f"-- STEP {sid}: {goal}")
-
-        if ctype != "lean4":
-            inserts.append("-- (non-Lean step; verified elsewhere)")
-            continue
-
-        # Lean code lines: prefer cmds; fall back to code/cmd.
-        cmds = checker.get("cmds")
-        if not cmds and checker.get("cmd"):
-            cmds = [checker.get("cmd")]
-        if not cmds and checker.get("code"):
-            snippet = str(checker.get("code"))
-            cmds = [ln for ln in snippet.splitlines() if ln.strip()]
-        if not cmds:
-            return False, f"Lean step {sid} 缺少 checker.cmds/cmd/code，无法生成 reverse gate"
-
-        # Precheck: require theorem/lemma name matches the step id.
-        raw_lines = [str(x) for x in cmds]
-        joined = "\n".join(raw_lines)
-        decls = {m.group(1) for m in _STEP_DECL_RE.finditer(joined)}
-        if sid not in decls:
-            return False, f"Lean step {sid} 的代码必须包含 'theorem/lemma {sid}' 声明（用于 lint 与可追溯映射）"
-
-        # Hoist `import ...` lines to the file header (Lean requires imports at the top).
-        code_lines: list[str] = []
-        for ln in raw_lines:
-            if re.match(r"^\s*import\s+", ln):
-                extra_imports.add(ln.strip())
-                continue
-            code_lines.append(ln)
-
-        # Attach talk-friendly metadata as comments.
-        symbols = step.get("symbols") or []
-        if isinstance(symbols, list) and symbols:
-            inserts.append("-- Symbols:")
-            for s in symbols:
-                if isinstance(s, dict):
-                    name = str(s.get("name") or "").strip()
-                    meaning = str(s.get("meaning") or "").strip()
-                    if name or meaning:
-                        inserts.append(f"--   - {name}: {meaning}")
-                elif isinstance(s, str) and s.strip():
-                    inserts.append(f"--   - {s.strip()}")
-
-        assumptions = step.get("assumptions") or []
-        if isinstance(assumptions, list) and assumptions:
-            inserts.append("-- Assumptions:")
-            for a in assumptions:
-                if isinstance(a, str) and a.strip():
-                    inserts.append(f"--   - {a.strip()}")
-
-        explanation = str(step.get("explanation") or "").strip()
-        if explanation:
-            inserts.append("-- Explanation:")
-            for ln in explanation.splitlines():
-                inserts.append(f"--   {ln}".rstrip())
-
-        inserts.append("")  # separate comments from code
-        inserts.extend(code_lines)
+        ok, msg, imports, block = _reverse_gate_step_block(step)
+        if not ok:
+            return False, msg
+        extra_imports |= imports
+        inserts.extend(block)
 
     # Insert hoisted imports right after the template's import block.
     if extra_imports:
@@ -511,11 +1239,155 @@ def _generate_reverse_gate_file(steps: list[dict], out_path: pathlib.Path, templ
     return True, f"reverse gate 文件已生成: {out_path}"
 
 
-def _run_reverse_gate(args, gate_path: pathlib.Path) -> tuple[bool, dict]:
-    ps1 = pathlib.Path(__file__).resolve().parent / "check_reverse_lean4.ps1"
-    if not ps1.exists():
-        return False, {"error": f"缺少脚本: {ps1}"}
+def _write_if_changed(path: pathlib.Path, text: str) -> None:
+    # Unchanged modules keep their mtime, so lake reuses their oleans without rehashing.
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+# Template commands whose effect ends with the file: each step module has to repeat them.
+_SCOPED_CMD_RE = re.compile(r"^(?:open|variable|universe|local|set_option|attribute\s*\[local)\b")
+_STEP_REF_RE = re.compile(r"(?<![A-Za-z0-9_'])S(\d+)(?![A-Za-z0-9_'])")
+
+
+def _scoped_commands(lines: list[str]) -> list[str]:
+    """`open` / `variable` / `universe` / `local notation` / `set_option` ... lines (with their continuation lines)."""
+    out: list[str] = []
+    keep = False
+    for ln in lines:
+        if _SCOPED_CMD_RE.match(ln):
+            out.append(ln)
+            keep = True
+        elif keep and ln.strip() and ln[:1].isspace():
+            out.append(ln)
+        else:
+            keep = False
+    return out
+
+
+def _gate_module_deps(steps: list[dict], block_by_id: dict[str, list[str]]) -> dict[str, list[str]]:
+    """step id -> earlier Lean steps whose modules it must import.
 
+    Those are the Lean steps reached through `depends_on` (non-Lean steps are
+    looked through) plus earlier Lean steps the code refers to by name, since
+    the single-file layout lets a step use any earlier lemma.
+    """
+    order = {str(s.get("id") or "").strip(): i for i, s in enumerate(steps)}
+    by_id = {str(s.get("id") or "").strip(): s for s in steps}
+
+    def lean_deps(sid: str, seen: set[str]) -> set[str]:
+        found: set[str] = set()
+        for dep in _step_deps(by_id[sid]):
+            if dep in seen or dep not in by_id:
+                continue
+            seen.add(dep)
+            found |= {dep} if dep in block_by_id else lean_deps(dep, seen)
+        return found
+
+    deps: dict[str, list[str]] = {}
+    for sid, block in block_by_id.items():
+        code = _strip_lean_comments("\n".join(block))
+        wanted = lean_deps(sid, {sid}) | {f"S{m.group(1)}" for m in _STEP_REF_RE.finditer(code)}
+        # Only earlier steps: keeps the import graph acyclic whatever the steps declare.
+        deps[sid] = sorted(
+            (d for d in wanted if d in block_by_id and order[d] < order[sid]), key=lambda d: order[d]
+        )
+    return deps
+
+
+def _generate_reverse_gate_modules(
+    steps: list[dict], src_dir: pathlib.Path, template_path: pathlib.Path
+) -> tuple[bool, str, list[pathlib.Path]]:
+    """按模块布局生成 reverse gate。返回 (ok, message, modules)。
+
+    - `MathProve/Preamble.lean`：模板的 import 与 `namespace MathProve` 中的公共内容；
+    - `MathProve/S<n>.lean`：每个 Lean step 一个模块（import Preamble 以及依赖 / 引用到的前序 step 模块，
+      并重复模板中只作用于本文件的 open / variable / set_option 等命令，自带 step map 行）；
+    - `MathProve.lean`：根模块，包含完整 RIGOR_STEP_MAP 并 import 全部 step 模块。
+    modules 以根模块开头，供 lint 与 `lake build` 使用。
+    """
+    tpl = _load_template(template_path)
+    if not tpl:
+        return False, f"缺少 reverse gate 模板: {template_path}", []
+    template_lines = tpl.splitlines()
+    try:
+        i_ns = next(i for i, ln in enumerate(template_lines) if re.match(r"^\s*namespace\s+MathProve\b", ln))
+        i_end = next(i for i, ln in enumerate(template_lines) if re.match(r"^\s*end\s+MathProve\b", ln))
+    except StopIteration:
+        return False, "reverse gate 模板缺少 'namespace MathProve' / 'end MathProve'", []
+    header = template_lines[:i_ns]
+    imports = [ln.strip() for ln in header if ln.strip().startswith("import ")]
+    header_scoped = _scoped_commands(header)
+    body = template_lines[i_ns + 1 : i_end]
+    body_scoped = _scoped_commands(body)
+
+    generated = "-- Generated by final_audit.py --lean-gate-layout modules; do not edit."
+    preamble = [generated, *imports, "", *header_scoped, "", "namespace MathProve", *body, "end MathProve"]
+    step_map: list[str] = []
+    blocks: dict[str, tuple[int, str, set[str], list[str]]] = {}
+    for step in steps:
+        sid = str(step.get("id") or "").strip()
+        n = _extract_step_num(sid)
+        if n is None:
+            return False, f"reverse gate 要求 step id 形如 S1/S2/...，当前: {sid!r}", []
+        goal = str(step.get("goal") or "").strip()
+        step_map.append(f"-- S{n}: {goal}")
+        ok, msg, step_imports, block = _reverse_gate_step_block(step)
+        if not ok:
+            return False, msg, []
+        if _lean_checker(step) is not None:
+            blocks[sid] = (n, goal, step_imports, block)
+
+    deps = _gate_module_deps(steps, {sid: entry[3] for sid, entry in blocks.items()})
+    step_modules: list[tuple[str, list[str]]] = []
+    for sid, (n, goal, step_imports, block) in blocks.items():
+        lines = [
+            "import MathProve.Preamble",
+            *(f"import MathProve.S{blocks[d][0]}" for d in deps[sid]),
+            *sorted(imp for imp in step_imports if imp not in imports),
+            "",
+            generated,
+            *header_scoped,
+            "",
+            "-- RIGOR_STEP_MAP",
+            f"-- S{n}: {goal}",
+            "",
+            "namespace MathProve",
+            *body_scoped,
+            *block,
+            "",
+            "end MathProve",
+        ]
+        step_modules.append((f"S{n}", lines))
+
+    root = [generated, "-- RIGOR_STEP_MAP", *step_map, "", *(f"import MathProve.{name}" for name, _ in step_modules)]
+
+    pkg_dir = src_dir / "MathProve"
+    modules = [src_dir / "MathProve.lean", pkg_dir / "Preamble.lean"]
+    _write_if_changed(modules[0], "\n".join(root).rstrip() + "\n")
+    _write_if_changed(modules[1], "\n".join(preamble).rstrip() + "\n")
+    for name, lines in step_modules:
+        modules.append(pkg_dir / f"{name}.lean")
+        _write_if_changed(modules[-1], "\n".join(lines).rstrip() + "\n")
+    # Drop modules of steps that no longer exist so they are not built or linted.
+    for stale in pkg_dir.glob("S*.lean"):
+        if stale not in modules:
+            stale.unlink()
+    return True, f"reverse gate 模块已生成: {src_dir}（{len(step_modules)} 个 step 模块）", modules
+
+
+def _gate_timeout(args) -> int:
+    timeout = max(int(args.lean_gate_timeout or 0), int(args.lean_timeout or 0), int(args.timeout) + 10)
+    budget = getattr(args, "_budget", None)
+    if budget is not None:
+        # --deadline 覆盖整个审计，reverse gate 只能使用剩余的时间。
+        timeout = max(1, min(timeout, int(budget.remaining())))
+    return timeout
+
+
+def _run_reverse_gate(args, gate_path: pathlib.Path) -> tuple[bool, dict]:
     if not args.lean_cwd:
         return False, {"error": "启用 --lean-gate 需要同时提供 --lean-cwd（Lake/Mathlib 工程目录）"}
 
@@ -529,34 +1401,45 @@ def _run_reverse_gate(args, gate_path: pathlib.Path) -> tuple[bool, dict]:
         except Exception as exc:  # noqa: BLE001
             return False, {"error": "reverse gate 复制到临时工程失败", "detail": str(exc)}
 
-    cmd = [
-        "powershell",
-        "-File",
-        str(ps1),
-        "-Path",
+    lean_cfg = (load_config().get("routes") or {}).get("lean") or {}
+    ok, detail = check_reverse_lean4.run_gate(
         str(gate_path),
-        "-ProjectDir",
-        str(project_dir),
-        "-TimeoutSec",
-        str(max(int(args.lean_gate_timeout or 0), int(args.lean_timeout or 0), int(args.timeout) + 10)),
-        "-Python",
-        str(args.python or sys.executable or "python"),
-        "-RequireStepMap",
-    ]
-    if int(getattr(args, "lean_watchdog_timeout", 0) or 0) > 0:
-        cmd += ["-NoOutputTimeoutSec", str(int(args.lean_watchdog_timeout))]
-    if not args.lean_gate_no_mathlib:
-        cmd.append("-RequireMathlib")
-    if args.lean_gate_skip_lint:
-        cmd.append("-SkipLint")
-
-    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
-    if proc.returncode != 0:
-        return False, {"error": "reverse gate 失败", "stderr": proc.stderr, "stdout": proc.stdout}
-    try:
-        return True, json.loads(proc.stdout) if proc.stdout.strip() else {"status": "passed"}
-    except json.JSONDecodeError:
-        return True, {"status": "passed", "stdout": proc.stdout}
+        lake_path=lean_cfg.get("lake_cmd"),
+        lean_path=lean_cfg.get("lean_cmd"),
+        project_dir=str(project_dir),
+        require_mathlib=not args.lean_gate_no_mathlib,
+        require_step_map=True,
+        skip_lint=bool(args.lean_gate_skip_lint),
+        timeout=_gate_timeout(args),
+        no_output_timeout=int(getattr(args, "lean_watchdog_timeout", 0) or 0),
+        output_log=_output_log(args, "reverse_gate.log"),
+    )
+    if not ok:
+        return False, dict(detail, error=f"reverse gate 失败: {detail.get('error')}")
+    return True, detail
+
+
+def _run_reverse_gate_modules(args, src_dir: pathlib.Path, modules: list[pathlib.Path]) -> tuple[bool, dict]:
+    lean_cfg = (load_config().get("routes") or {}).get("lean") or {}
+    ok, detail = check_reverse_lean4.run_module_gate(
+        str(args.lean_cwd),
+        str(src_dir),
+        [str(m) for m in modules],
+        lake_path=lean_cfg.get("lake_cmd"),
+        require_mathlib=not args.lean_gate_no_mathlib,
+        require_step_map=True,
+        skip_lint=bool(args.lean_gate_skip_lint),
+        timeout=_gate_timeout(args),
+        no_output_timeout=int(getattr(args, "lean_watchdog_timeout", 0) or 0),
+        # A throwaway project may keep the generated lake target; the user's own project is restored
+        # and the generated .mathprove_gate/ removed.
+        keep_lake_target=bool(getattr(args, "_ephemeral_project", None)),
+        cleanup_src=not getattr(args, "_ephemeral_project", None),
+        output_log=_output_log(args, "reverse_gate.log"),
+    )
+    if not ok:
+        return False, dict(detail, error=f"reverse gate 失败: {detail.get('error')}")
+    return True, detail
 
 
 def main() -> None:
@@ -565,26 +1448,151 @@ def main() -> None:
     parser.add_argument("--solution", default="Solution.md", help="正式稿路径")
     parser.add_argument(
         "--sympy-runner",
-        default=str(pathlib.Path(__file__).resolve().parent / "verify_sympy.py"),
+        default=str(_DEFAULT_SYMPY_RUNNER),
         help="SymPy 执行脚本",
     )
     parser.add_argument(
         "--lean-runner",
-        default=str(pathlib.Path(__file__).resolve().parent / "lean_repl_client.py"),
+        default=str(_DEFAULT_LEAN_RUNNER),
         help="Lean4 执行脚本",
     )
     parser.add_argument("--timeout", type=int, default=15, help="默认单步超时（SymPy；Lean4 可用 --lean-timeout 覆盖）")
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=0,
+        help="整个审计的总时限（秒，0=不限）：剩余时间按难度/历史耗时分配给尚未开始的 step（取代固定单步超时，"
+        "checker 显式 timeout 仍为上限）；用尽后不再调度，未执行的 step 标记为 budget_exhausted",
+    )
     parser.add_argument("--lean-timeout", type=int, default=60, help="Lean4 单步默认超时（可被 step.checker.timeout 覆盖）")
     parser.add_argument("--python", help="默认 Python 路径（SymPy/Lean4/辅助脚本）")
     parser.add_argument("--sympy-python", help="SymPy 运行的 Python 路径（执行脚本解释器）")
     parser.add_argument("--lean-python", help="Lean4 客户端运行的 Python 路径（执行脚本解释器）")
-    parser.add_argument("--lean-mode", choices=["repl", "file", "auto"], help="Lean4 默认执行模式")
+    parser.add_argument(
+        "--exec-mode",
+        default="subprocess",
+        choices=["subprocess", "inprocess"],
+        help="检查执行方式：subprocess（经 runner 脚本子进程，隔离性更好）或 inprocess（直接调用 run_code/run_payload，省去一次解释器启动；自定义 runner 仍走子进程）",
+    )
+    parser.add_argument(
+        "--sympy-executor",
+        default="subprocess",
+        choices=["subprocess", "pool"],
+        help="SymPy 执行方式：subprocess（经 verify_sympy.py 子进程）或 pool（进程内常驻预热 worker 池；自定义 --sympy-runner 仍走子进程）",
+    )
+    parser.add_argument("--sympy-pool-size", type=int, default=0, help="SymPy worker 池大小（0=自动）")
+    parser.add_argument(
+        "--lean-mode",
+        choices=["repl", "file", "auto", "session", "interactive"],
+        help="Lean4 默认执行模式（session：进程内常驻 REPL，Mathlib 只加载一次；interactive：逐条发送命令，首个 error 即停）",
+    )
+    parser.add_argument(
+        "--lean-session-header",
+        default="import Mathlib",
+        help="session 模式的公共 header（启动时执行一次，step 命令在其 env 上执行）",
+    )
+    parser.add_argument(
+        "--lean-session-preamble",
+        default=str(assets_dir() / "lean_preamble.lean"),
+        help="session 模式的 preamble（set_option 等；启动时执行一次，空字符串表示不使用）",
+    )
+    parser.add_argument(
+        "--lean-session-namespace",
+        default="MathProve",
+        help="session 模式下 preamble 之后打开的命名空间（与 reverse gate 一致；空字符串表示不打开）",
+    )
+    parser.add_argument(
+        "--lean-workers",
+        type=int,
+        default=0,
+        help="Lean4 worker 数（session 模式下的常驻 REPL 数，也是 --lean-jobs 的默认值；0=读取 routes.lean.repl_workers）",
+    )
+    parser.add_argument(
+        "--lean-worker-memory-mb",
+        type=int,
+        help="单个 Lean4 worker 预估内存（MB；缺省读取 routes.lean.repl_worker_memory_mb），用于限制并发数",
+    )
+    parser.add_argument(
+        "--lean-memory-budget-mb",
+        type=int,
+        help="Lean4 worker 总内存预算（MB；0=物理内存的 80%%；缺省读取 routes.lean.repl_memory_budget_mb）",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="同时执行的 step 总数上限（0=sympy-jobs + lean-jobs）；step 可用 depends_on 声明依赖",
+    )
+    parser.add_argument("--sympy-jobs", type=int, default=1, help="同时执行的 SymPy step 上限")
+    parser.add_argument("--lean-jobs", type=int, default=0, help="同时执行的 Lean4 step 上限（0=lean-workers；同样受 Lean4 内存预算限制）")
     parser.add_argument("--lean-cwd", help="Lean4 默认工作目录（推荐：Lake+Mathlib 工程）")
     parser.add_argument("--lean-ephemeral", action="store_true", help="Lean4 执行使用临时工作区（反污染）")
+    parser.add_argument(
+        "--lean-ephemeral-mode",
+        default="copy",
+        choices=["link", "copy"],
+        help="临时工作区方式：copy（默认，复制工程但不含构建产物）或 link（连同依赖包目录与构建产物整体克隆，保留 oleans）；两者均以 reflink 写时复制克隆、不支持时真正复制，不与源工程共享任何文件",
+    )
+    parser.add_argument(
+        "--lean-ephemeral-pool",
+        type=int,
+        default=0,
+        help="临时工作区预热池大小 K（>0 时复用 K 个常驻工程副本，跨进程租用，归还时只清理本次新增/修改的文件；0=每次新建）",
+    )
     parser.add_argument("--lean-watchdog-timeout", type=int, default=0, help="Lean4 文件模式无输出超时秒数")
     parser.add_argument("--run-dir", help="运行目录（工作区内）")
     parser.add_argument("--workspace-dir", help="工作区根目录（缺省则使用配置/默认值）")
     parser.add_argument("--log", help="日志路径（JSONL）")
+    parser.add_argument("--no-cache", action="store_true", help="禁用校验结果缓存，所有 step 严格重新执行")
+    parser.add_argument(
+        "--schedule",
+        choices=SCHEDULES,
+        help="就绪 step 的启动顺序：file（文件顺序，默认）/ shortest（预计耗时最短优先）/ failure-first（最可能失败优先，"
+        "--fail-fast 时的默认值）；预计耗时与失败率来自按 checker 哈希记录的历史，冷启动时按难度与路线估计",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="首个 step 确定失败（含重试）后停止调度、终止在途的 SymPy/Lean 检查并跳过 reverse gate；"
+        "仍输出部分报告，未执行的 step 标记为 not_run",
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=DEFAULT_BACKOFF_SECONDS,
+        help="checker.retries 的退避基数（秒，按 1x/2x/4x… 递增）；只有瞬时失败（超时、资源超限、worker/REPL 崩溃）才重试，"
+        "确定性失败（语法错误、断言失败、Lean 类型错误）与环境问题（缺少工具链/依赖）不重试",
+    )
+    parser.add_argument(
+        "--hybrid-policy",
+        choices=HYBRID_POLICIES,
+        help="hybrid step（SymPy 与 Lean4 并发执行）的通过条件：both（两者都通过）/ lean（以 Lean4 为准，SymPy 仅探测反例）；"
+        "满足后立即取消另一个引擎，SymPy 断言失败（反例）时立即终止 Lean4。缺省读取 routes.hybrid.policy，可被 checker.policy 覆盖",
+    )
+    parser.add_argument(
+        "--stream",
+        nargs="?",
+        const="-",
+        metavar="PATH",
+        help="以 JSONL 实时输出进度事件（audit_start / step_start / step_finish / gate_start / gate_finish / summary）："
+        "不带参数写到 stdout（此时不再打印完整 JSON，最后一行 summary 给出汇总与 audit.json 路径），"
+        "或写到指定文件 / FIFO（打开 FIFO 会等待读端连接）",
+    )
+    parser.add_argument(
+        "--timing-history",
+        help="step 耗时历史文件（默认 <workspace>/cache/timings.json；cache.timings=false 时只在本次运行内使用）",
+    )
+    parser.add_argument(
+        "--no-incremental",
+        action="store_true",
+        help="忽略 run 目录下 audit/audit.json 的上次结果（默认复用输入哈希未变且已通过的 step；--no-cache 同样禁用复用）",
+    )
+    parser.add_argument("--cache-dir", help="校验结果缓存目录（默认 <workspace>/cache/results，跨 run 共享）")
+    parser.add_argument("--cache-max-mb", type=int, help="缓存大小上限（MB，超出按 LRU 淘汰；缺省读取 cache.max_mb）")
+    parser.add_argument(
+        "--lean-pickle-dir",
+        help="session 模式 REPL 起始 env 的 pickle 目录（默认 <workspace>/cache/lean_env；cache.lean_env=false 或 --no-cache 时禁用）",
+    )
 
     # Reverse gate (Lean4 strict gate).
     parser.add_argument("--lean-gate", action="store_true", help="启用 reverse Lean4 gate（lint + 编译）")
@@ -594,15 +1602,79 @@ def main() -> None:
         default=str(assets_dir() / "lean" / "reverse_template_mathlib.lean"),
         help="reverse gate Lean 模板路径",
     )
+    parser.add_argument(
+        "--lean-gate-layout",
+        default="single",
+        choices=["single", "modules"],
+        help="reverse gate 布局：single（单个 reverse_gate.lean，lake env lean 编译）或 modules（Preamble + 每个 step 一个模块，生成 lake 目标后 lake build 并行构建并复用未变化 step 的 olean）",
+    )
     parser.add_argument("--lean-gate-timeout", type=int, default=0, help="reverse gate 超时秒数（默认使用 timeout+10）")
     parser.add_argument("--lean-gate-skip-lint", action="store_true", help="reverse gate 跳过 lint（不推荐）")
     parser.add_argument("--lean-gate-no-mathlib", action="store_true", help="reverse gate 不使用 Lake+Mathlib（不推荐）")
 
     args = parser.parse_args()
+    args._deadline_at = time.monotonic() + args.deadline if args.deadline and args.deadline > 0 else None
+    args._scope = CancelScope()
+    args._fail_fast_by = None
+    if args.schedule is None:
+        args.schedule = "failure-first" if args.fail_fast else "file"
+
+    cfg = load_config()
+    lean_cfg = (cfg.get("routes") or {}).get("lean") or {}
+    args._lean_limits = route_limits(lean_cfg)
+    args._sympy_limits = route_limits((cfg.get("routes") or {}).get("sympy"))
+    if args.hybrid_policy is None:
+        args.hybrid_policy = str(((cfg.get("routes") or {}).get("hybrid") or {}).get("policy") or "both")
+    if args.lean_worker_memory_mb is None:
+        args.lean_worker_memory_mb = int(lean_cfg.get("repl_worker_memory_mb") or 0)
+    if args.lean_memory_budget_mb is None:
+        args.lean_memory_budget_mb = int(lean_cfg.get("repl_memory_budget_mb") or 0)
+    args.lean_workers = plan_workers(
+        args.lean_workers or int(lean_cfg.get("repl_workers") or 1),
+        memory_per_worker_mb=args.lean_worker_memory_mb,
+        memory_budget_mb=args.lean_memory_budget_mb,
+    )
+    if args.lean_jobs:
+        # An explicit --lean-jobs is held to the same memory cap as the worker plan.
+        lean_jobs = plan_workers(
+            args.lean_jobs,
+            memory_per_worker_mb=args.lean_worker_memory_mb,
+            memory_budget_mb=args.lean_memory_budget_mb,
+        )
+        if lean_jobs < args.lean_jobs:
+            print(
+                f"[final_audit] --lean-jobs {args.lean_jobs} 超出 Lean4 内存预算，已降为 {lean_jobs}",
+                file=sys.stderr,
+            )
+            args.lean_jobs = lean_jobs
+    preamble_path = args.lean_session_preamble
+    if preamble_path and not pathlib.Path(preamble_path).is_file():
+        preamble_path = None
+    args._session_preamble = ""
+    if preamble_path or args.lean_session_namespace:
+        args._session_preamble = lean_repl_client.load_session_preamble(
+            preamble_path, namespace=args.lean_session_namespace
+        )
 
     run_dir = ensure_run_dir(args.run_dir, args.workspace_dir)
+    args._run_dir = run_dir
     if not args.log:
         args.log = str(run_path(run_dir, "logs/tool_calls.log"))
+    args._progress = ProgressStream(args.stream)
+
+    cache_cfg = cfg.get("cache") or {}
+    args._cache = None
+    if not args.no_cache and cache_cfg.get("enabled", True):
+        cache_dir = args.cache_dir or (resolve_workspace_dir(args.workspace_dir) / "cache" / "results")
+        max_mb = args.cache_max_mb if args.cache_max_mb is not None else int(cache_cfg.get("max_mb") or 256)
+        args._cache = ResultCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
+    timings_path = None
+    if cache_cfg.get("timings", True):
+        timings_path = args.timing_history or str(resolve_workspace_dir(args.workspace_dir) / "cache" / "timings.json")
+    args._timings = TimingHistory(timings_path)
+    args._lean_pickle_dir = None
+    if not args.no_cache and cache_cfg.get("lean_env", True):
+        args._lean_pickle_dir = args.lean_pickle_dir or str(resolve_workspace_dir(args.workspace_dir) / "cache" / "lean_env")
 
     steps_path = pathlib.Path(args.steps)
     if not steps_path.is_absolute():
@@ -625,25 +1697,88 @@ def main() -> None:
     try:
         use_ephemeral = bool(args.lean_ephemeral) or os.environ.get("MATHPROVE_EPHEMERAL") == "1"
         if use_ephemeral and args.lean_cwd and EphemeralWorkspace:
-            ctx = EphemeralWorkspace(args.lean_cwd)
+            # Hard links need the same filesystem as the project; the workspace dir usually is, /tmp often is not.
+            ephemeral_root = resolve_workspace_dir(args.workspace_dir) / "ephemeral"
+            if args.lean_ephemeral_pool > 0 and WorkspacePool:
+                source_key = fingerprint(os.path.realpath(args.lean_cwd), args.lean_ephemeral_mode)[:16]
+                ctx = WorkspacePool(
+                    args.lean_cwd,
+                    ephemeral_root / f"pool_{source_key}",
+                    size=args.lean_ephemeral_pool,
+                    mode=args.lean_ephemeral_mode,
+                ).lease()
+            else:
+                ctx = EphemeralWorkspace(args.lean_cwd, mode=args.lean_ephemeral_mode, temp_root=str(ephemeral_root))
             args._ephemeral_project = ctx.__enter__()
             args.lean_cwd = args._ephemeral_project
+            log_event({"event": "final_audit_ephemeral", **ctx.stats}, log_path=args.log)
 
+        # Incremental re-audit: steps whose input hash (including upstream
+        # dependencies) matches the last passing result in audit/audit.json are reused.
+        manifest_path = run_path(run_dir, "audit/audit.json")
+        previous = {} if (args.no_incremental or args.no_cache) else _load_manifest(manifest_path)
+        args._previous_steps = previous.get("steps") or {}
+        args._checker_hashes = _checker_hashes(steps, args.sympy_runner, args.lean_runner, args)
+        args._step_hashes = _step_hashes(steps, args.sympy_runner, args.lean_runner, args)
+
+        args._progress.emit("audit_start", steps=len(steps), run_dir=str(run_dir))
         all_passed, report = _audit_steps(steps, args.sympy_runner, args.lean_runner, args.timeout, args)
+        args._timings.save()
+        if args._cache is not None:
+            # One full LRU pass per audit (put only scans when its running total goes over the limit).
+            args._cache.evict()
 
         gate_result: dict[str, Any] = {"enabled": bool(args.lean_gate), "status": "skipped"}
-        if args.lean_gate:
+        gate_hash = fingerprint(
+            sorted(args._step_hashes.get(str(s.get("id") or ""), "") for s in steps if _lean_checker(s) is not None),
+            file_digest(args.lean_gate_template),
+            bool(args.lean_gate_no_mathlib),
+            bool(args.lean_gate_skip_lint),
+            args.lean_gate_layout,
+        )
+        previous_gate = previous.get("reverse_gate") or {}
+        if args.lean_gate and previous_gate.get("hash") == gate_hash and previous_gate.get("status") == "passed":
+            gate_result = dict(previous_gate, incremental="reused")
+            gate_result.pop("hash", None)
+        elif args.lean_gate and args._fail_fast_by is not None:
+            gate_result["detail"] = {"info": f"--fail-fast：{args._fail_fast_by} 失败，跳过 reverse gate"}
+        elif args.lean_gate and args._budget is not None and args._budget.expired():
+            gate_result["status"] = "budget_exhausted"
+            gate_result["detail"] = {"info": _SKIP_REASONS["budget_exhausted"]}
+            all_passed = False
+        elif args.lean_gate:
             # If any Lean steps exist, generate gate file and run it.
-            has_lean = any(((s.get("checker") or {}).get("type") == "lean4") for s in steps)
+            has_lean = any(_lean_checker(s) is not None for s in steps)
             if has_lean:
                 sol_path = pathlib.Path(args.solution)
-                gate_path = pathlib.Path(args.lean_gate_out) if args.lean_gate_out else (sol_path.parent / "reverse_gate.lean")
                 tpl_path = pathlib.Path(args.lean_gate_template)
-                ok, msg = _generate_reverse_gate_file(steps, gate_path, tpl_path)
+                modules: list[pathlib.Path] = []
+                if args.lean_gate_layout == "modules":
+                    # Modules live inside the Lake project (the ephemeral copy, if any) so lake can build them.
+                    gate_path = pathlib.Path(args.lean_cwd or ".") / _GATE_SRC_DIR
+                    if args.lean_cwd:
+                        ok, msg, modules = _generate_reverse_gate_modules(steps, gate_path, tpl_path)
+                    else:
+                        ok, msg = False, "--lean-gate-layout modules 需要同时提供 --lean-cwd（Lake/Mathlib 工程目录）"
+                else:
+                    gate_path = pathlib.Path(args.lean_gate_out) if args.lean_gate_out else (sol_path.parent / "reverse_gate.lean")
+                    ok, msg = _generate_reverse_gate_file(steps, gate_path, tpl_path)
                 gate_result["generate"] = {"ok": ok, "message": msg, "path": str(gate_path)}
+                if modules:
+                    gate_result["generate"]["modules"] = [str(m) for m in modules]
                 if ok:
-                    ok2, detail = _run_reverse_gate(args, gate_path)
+                    args._progress.emit("gate_start", path=str(gate_path))
+                    gate_started = time.monotonic()
+                    if modules:
+                        ok2, detail = _run_reverse_gate_modules(args, gate_path, modules)
+                    else:
+                        ok2, detail = _run_reverse_gate(args, gate_path)
                     gate_result["status"] = "passed" if ok2 else "failed"
+                    args._progress.emit(
+                        "gate_finish",
+                        status=gate_result["status"],
+                        seconds=round(time.monotonic() - gate_started, 4),
+                    )
                     gate_result["detail"] = detail
                     log_event(
                         {"event": "final_audit_reverse_gate", "status": gate_result["status"], "path": str(gate_path)},
@@ -658,12 +1793,25 @@ def main() -> None:
                 gate_result["status"] = "skipped"
                 gate_result["detail"] = {"info": "steps 中未发现 lean4 checker，跳过 reverse gate"}
 
-        failed_steps = [r.get("id") for r in report if r.get("status") != "passed"]
+        exhausted_steps = [r.get("id") for r in report if r.get("status") == "budget_exhausted"]
+        not_run_steps = [r.get("id") for r in report if r.get("status") == "not_run"]
+        failed_steps = [
+            r.get("id") for r in report if r.get("status") not in {"passed", "budget_exhausted", "not_run"}
+        ]
         audit_status = "passed" if all_passed else "failed"
         audit_report_parts = []
-        audit_report_parts.append(f"steps: {len(report) - len(failed_steps)}/{len(report)} passed")
+        passed_count = len(report) - len(failed_steps) - len(exhausted_steps) - len(not_run_steps)
+        audit_report_parts.append(f"steps: {passed_count}/{len(report)} passed")
         if failed_steps:
-            audit_report_parts.append(f"failed: {', '.join(str(x) for x in failed_steps)}")
+            classes = {r.get("id"): r.get("failure_class") for r in report}
+            audit_report_parts.append(
+                "failed: "
+                + ", ".join(f"{x} ({classes[x]})" if classes.get(x) else str(x) for x in failed_steps)
+            )
+        if exhausted_steps:
+            audit_report_parts.append(f"budget_exhausted: {', '.join(str(x) for x in exhausted_steps)}")
+        if not_run_steps:
+            audit_report_parts.append(f"not_run: {', '.join(str(x) for x in not_run_steps)}")
         if args.lean_gate:
             audit_report_parts.append(f"reverse_gate: {gate_result.get('status')}")
         audit_report = "; ".join(audit_report_parts)
@@ -673,7 +1821,22 @@ def main() -> None:
             "report": report,
             "reverse_gate": gate_result,
         }
-        print(json.dumps(output, ensure_ascii=False, indent=2))
+        if args._fail_fast_by is not None:
+            output["fail_fast"] = {"failed_step": args._fail_fast_by, "not_run": not_run_steps}
+        if args._budget is not None:
+            output["deadline"] = dict(args._budget.summary(), seconds=args.deadline, budget_exhausted=exhausted_steps)
+        if not args._progress.to_stdout:
+            print(json.dumps(output, ensure_ascii=False, indent=2))
+        _write_manifest(manifest_path, args._step_hashes, report, dict(gate_result, hash=gate_hash))
+        summary = {key: value for key, value in output.items() if key not in {"report", "reverse_gate"}}
+        args._progress.emit(
+            "summary",
+            **summary,
+            report=audit_report,
+            failed=failed_steps,
+            reverse_gate=gate_result.get("status"),
+            manifest=str(manifest_path),
+        )
 
         if audit_status == "passed":
             pathlib.Path(args.solution).write_text(
@@ -681,6 +1844,7 @@ def main() -> None:
                 encoding="utf-8",
             )
     finally:
+        args._progress.close()
         if ctx:
             ctx.__exit__(None, None, None)
 
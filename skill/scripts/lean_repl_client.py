@@ -1,7 +1,15 @@
 """调用 Lean4 REPL 执行 JSON 命令并返回结构化结果。"""
 import argparse
+import asyncio
+import atexit
+import collections
+import functools
+import hashlib
 import json
+import os
 import pathlib
+import queue
+import re
 import shlex
 import subprocess
 import sys
@@ -14,6 +22,28 @@ try:
 except ImportError:  # pragma: no cover
     from logger import log_event
 
+try:
+    from ..runtime.capture import DEFAULT_MAX_OUTPUT_BYTES
+    from ..runtime.failure import DEFAULT_BACKOFF_SECONDS, backoff_delay, classify_failure, should_retry
+    from ..runtime.resources import ResourceMonitor
+    from ..runtime.supervisor import AbortGroup, run_on_loop, supervise
+except Exception:  # pragma: no cover
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+    from runtime.capture import DEFAULT_MAX_OUTPUT_BYTES
+    from runtime.failure import DEFAULT_BACKOFF_SECONDS, backoff_delay, classify_failure, should_retry
+    from runtime.resources import ResourceMonitor
+    from runtime.supervisor import AbortGroup, run_on_loop, supervise
+
+DEFAULT_REPL_CMD = "lake exe repl"
+DEFAULT_FILE_CMD = "lake env lean"
+DEFAULT_SESSION_HEADER = "import Mathlib"
+
+_IMPORT_RE = re.compile(r"^\s*import\s+(\S.*?)\s*$")
+# step 源码中第一个待检查声明；其之前的内容（set_option/open/辅助定义等）视为该 step 的 header。
+_DECL_RE = re.compile(
+    r"^\s*(?:@\[.*\]\s*)?(?:(?:private|protected|noncomputable)\s+)*(?:theorem|lemma|example)\b"
+)
+
 
 def _parse_payload(args):
     if args.payload:
@@ -67,148 +97,1011 @@ def _extract_cmds(cmds):
     return extracted
 
 
-def _run_file_mode(cmds, file_cmd, cwd=None, timeout=30, watchdog_timeout=0):
+async def _run_file_mode_async(
+    cmds,
+    file_cmd,
+    cwd=None,
+    timeout=30,
+    watchdog_timeout=0,
+    output_log=None,
+    max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+    limits=None,
+):
     lines = _extract_cmds(cmds)
     content = "\n\n".join(lines).strip() + "\n"
     with tempfile.NamedTemporaryFile("w", suffix=".lean", delete=False, encoding="utf-8") as fp:
         fp.write(content)
         temp_path = fp.name
-    stdout_chunks: list[str] = []
     try:
-        proc = subprocess.Popen(
+        # 事件驱动监督：同时等待进程退出、输出与超时，无轮询；超时按进程组终止并记录耗时。
+        # 输出只在内存中保留有界的头/尾，完整输出写入 output_log。
+        proc = await supervise(
             _to_cmd_list(file_cmd) + [temp_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
             cwd=cwd,
-            bufsize=1,
+            timeout=timeout or 0,
+            no_output_timeout=watchdog_timeout or 0,
+            max_output_bytes=max_output_bytes,
+            output_log=output_log,
+            **(limits or {}),
         )
-        start = time.time()
-        last_output = time.time()
-
-        def _reader():
-            nonlocal last_output
-            assert proc.stdout is not None
-            for line in proc.stdout:
-                stdout_chunks.append(line)
-                if line.strip():
-                    last_output = time.time()
-
-        t = threading.Thread(target=_reader, daemon=True)
-        t.start()
-
-        while True:
-            if proc.poll() is not None:
-                break
-            if timeout and (time.time() - start > timeout):
-                proc.terminate()
-                time.sleep(1)
-                proc.kill()
-                return {
-                    "status": "error",
-                    "error_type": "Timeout",
-                    "message": f"Lean4 文件模式超时（>{timeout}s）",
-                    "stdout": "".join(stdout_chunks),
-                    "stderr": "",
-                }
-            if watchdog_timeout and (time.time() - last_output > watchdog_timeout):
-                proc.terminate()
-                time.sleep(1)
-                proc.kill()
-                return {
-                    "status": "error",
-                    "error_type": "Timeout",
-                    "message": f"Lean4 文件模式无输出超时（>{watchdog_timeout}s）",
-                    "stdout": "".join(stdout_chunks),
-                    "stderr": "",
-                }
-            time.sleep(0.05)
-
-        t.join(timeout=1)
-        rc = proc.returncode or 0
     finally:
         try:
             pathlib.Path(temp_path).unlink(missing_ok=True)
         except Exception:  # noqa: BLE001
             pass
-    stdout_text = "".join(stdout_chunks)
-    if rc != 0:
+    stdout_text = proc["output"]
+    capture = {k: proc[k] for k in ("output_bytes", "output_truncated", "output_log", "resources")}
+    if proc["returncode"] is None:
+        return {
+            "status": "error",
+            "error_type": "NotFound",
+            "message": f"无法执行文件模式命令: {file_cmd}",
+            "stdout": stdout_text,
+            "stderr": "",
+        }
+    if proc["timeout"]:
+        if proc["timeout"] == "total":
+            message = f"Lean4 文件模式超时（>{timeout}s）"
+        else:
+            message = f"Lean4 文件模式无输出超时（>{watchdog_timeout}s）"
+        return {
+            "status": "error",
+            "error_type": "Timeout",
+            "message": message,
+            "stdout": stdout_text,
+            "stderr": "",
+            "kill_seconds": proc["kill_seconds"],
+            "killed": proc["killed"],
+            **capture,
+        }
+    if proc["limit_exceeded"]:
+        return _limit_result("Lean4 文件模式", proc, stdout_text, capture)
+    if proc["returncode"] != 0:
         return {
             "status": "error",
             "error_type": "RuntimeError",
             "message": "Lean4 文件模式执行失败",
+            "returncode": proc["returncode"],
             "stdout": stdout_text,
             "stderr": "",
+            **capture,
         }
     return {
         "status": "success",
         "outputs": [],
         "stdout": stdout_text,
         "stderr": "",
+        **capture,
     }
 
 
-def run_repl(cmds, repl_cmd, timeout=15, cwd=None):
-    try:
-        proc = subprocess.run(
-            _to_cmd_list(repl_cmd),
-            input=_build_input(cmds),
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            check=False,
+def _limit_result(kind, proc, stdout_text, extra):
+    return {
+        "status": "error",
+        "error_type": "ResourceLimit",
+        "message": f"{kind}超出资源预算: {proc['limit_message']}",
+        "stdout": stdout_text,
+        "stderr": proc.get("stderr", ""),
+        "kill_seconds": proc["kill_seconds"],
+        "killed": proc["killed"],
+        **extra,
+    }
+
+
+def _run_file_mode(
+    cmds,
+    file_cmd,
+    cwd=None,
+    timeout=30,
+    watchdog_timeout=0,
+    output_log=None,
+    max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+    limits=None,
+):
+    return run_on_loop(
+        _run_file_mode_async(
+            cmds,
+            file_cmd,
             cwd=cwd,
+            timeout=timeout,
+            watchdog_timeout=watchdog_timeout,
+            output_log=output_log,
+            max_output_bytes=max_output_bytes,
+            limits=limits,
         )
-    except subprocess.TimeoutExpired:
+    )
+
+
+async def run_repl_async(cmds, repl_cmd, timeout=15, cwd=None, limits=None):
+    """一次性写入全部命令并等待 REPL 退出（批量 repl 模式），由共享 supervisor 监督。
+
+    limits（memory_limit_mb / cpu_limit_seconds）超出时终止进程树；结果附带 resources。
+    """
+    proc = await supervise(
+        _to_cmd_list(repl_cmd),
+        cwd=cwd,
+        timeout=timeout or 0,
+        input=_build_input(cmds),
+        merge_stderr=False,
+        # 批量模式需要完整 stdout 才能解析 JSON 响应，不截断。
+        max_output_bytes=0,
+        **(limits or {}),
+    )
+    stdout_text = proc["output"]
+    usage = {"resources": proc["resources"]}
+    if proc["returncode"] is None:
         return {
             "status": "error",
-            "error_type": "Timeout",
-            "message": f"Lean4 REPL 超时（>{timeout}s）",
+            "error_type": "NotFound",
+            "message": f"无法执行 REPL 命令: {repl_cmd}",
             "stdout": "",
             "stderr": "",
         }
-    except FileNotFoundError:
+    if proc["timeout"]:
         return {
             "status": "error",
-            "error_type": "NotFound",
-            "message": f"无法执行 REPL 命令: {repl_cmd}",
-            "stdout": "",
-            "stderr": "",
+            "error_type": "Timeout",
+            "message": f"Lean4 REPL 超时（>{timeout}s）",
+            "stdout": stdout_text,
+            "stderr": proc["stderr"],
+            "kill_seconds": proc["kill_seconds"],
+            "killed": proc["killed"],
+            **usage,
         }
+    if proc["limit_exceeded"]:
+        return _limit_result("Lean4 REPL ", proc, stdout_text, usage)
 
-    outputs = _extract_json_lines(proc.stdout or "")
-    if proc.returncode != 0:
+    outputs = _extract_json_lines(stdout_text)
+    if proc["returncode"] != 0:
         return {
             "status": "error",
             "error_type": "RuntimeError",
             "message": "Lean4 REPL 执行失败",
-            "stdout": proc.stdout or "",
-            "stderr": proc.stderr or "",
+            "returncode": proc["returncode"],
+            "stdout": stdout_text,
+            "stderr": proc["stderr"],
             "outputs": outputs,
+            **usage,
         }
 
     return {
         "status": "success",
         "outputs": outputs,
-        "stdout": proc.stdout or "",
-        "stderr": proc.stderr or "",
+        "stdout": stdout_text,
+        "stderr": proc["stderr"],
+        **usage,
     }
 
 
+def run_repl(cmds, repl_cmd, timeout=15, cwd=None, limits=None):
+    return run_on_loop(run_repl_async(cmds, repl_cmd=repl_cmd, timeout=timeout, cwd=cwd, limits=limits))
+
+
+def _response_failure(response):
+    """返回 REPL 响应中的失败原因（error 级消息 / sorry / 协议错误），无失败时返回 None。"""
+    if not isinstance(response, dict):
+        return None
+    if "message" in response and "env" not in response:
+        return {"error_type": "ReplError", "message": str(response.get("message"))}
+    for msg in response.get("messages") or []:
+        if isinstance(msg, dict) and msg.get("severity") == "error":
+            return {"error_type": "LeanError", "message": str(msg.get("data") or "Lean4 报告 error")}
+    if response.get("sorries"):
+        return {"error_type": "LeanSorry", "message": "Lean4 输出包含 sorry"}
+    return None
+
+
+def _header_imports(header):
+    return {m.group(1) for m in (_IMPORT_RE.match(ln) for ln in header.splitlines()) if m}
+
+
+def _split_imports(text):
+    """拆分 Lean 源码为 (import 模块集合, 其余源码)。"""
+    imports = set()
+    rest = []
+    for ln in (text or "").splitlines():
+        m = _IMPORT_RE.match(ln)
+        if m:
+            imports.add(m.group(1))
+        else:
+            rest.append(ln)
+    return imports, "\n".join(rest).strip()
+
+
+def load_session_preamble(path, namespace=""):
+    """读取 preamble 文件（如 assets/lean_preamble.lean），可选追加 `namespace <name>`。"""
+    text = pathlib.Path(path).read_text(encoding="utf-8") if path else ""
+    if namespace:
+        text = text.rstrip() + f"\n\nnamespace {namespace}\n"
+    return text
+
+
+def _split_step_header(source):
+    """把 step 源码拆为 (header, body)：header 为第一个 theorem/lemma/example 之前的内容。"""
+    lines = source.splitlines()
+    for idx, ln in enumerate(lines):
+        if _DECL_RE.match(ln):
+            return "\n".join(lines[:idx]).strip(), "\n".join(lines[idx:]).strip()
+    return "", source
+
+
+def _content_hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _env_pickle_path(pickle_dir, cwd, header, preamble):
+    """header/preamble env 的 pickle 文件路径，按 toolchain + lake-manifest + 内容哈希区分。"""
+    root = pathlib.Path(cwd or ".")
+    parts = []
+    for name in ("lean-toolchain", "lake-manifest.json"):
+        try:
+            parts.append((root / name).read_text(encoding="utf-8"))
+        except OSError:
+            parts.append("")
+    key = _content_hash(*parts, header, preamble)
+    return pathlib.Path(pickle_dir) / f"env_{key[:32]}.olean"
+
+
+def _session_commands(cmds, header_imports):
+    """把 step 的 cmds 转成 REPL JSON 命令。
+
+    字符串视为 Lean 源码：import 行被剥离，其余合并为一条 `{"cmd": ...}`。
+    若 import 超出会话 header 已导入的范围，则返回 cold=True（该 step 需从空环境起跑）。
+    dict 命令原样透传。
+    """
+    imports = set()
+    source_lines = []
+    commands = []
+    for item in cmds:
+        if isinstance(item, str):
+            for ln in item.splitlines():
+                m = _IMPORT_RE.match(ln)
+                if m:
+                    imports.add(m.group(1))
+                else:
+                    source_lines.append(ln)
+        elif isinstance(item, dict):
+            commands.append(dict(item))
+        else:
+            raise ValueError("session 模式仅支持 string 或 JSON 对象命令")
+    cold = not imports <= header_imports
+    source = "\n".join(source_lines).strip()
+    if cold:
+        source = "\n".join(f"import {imp}" for imp in sorted(imports)) + "\n\n" + source
+    if source:
+        commands.insert(0, {"cmd": source})
+    return commands, cold
+
+
+class LeanReplSession:
+    """常驻 Lean4 REPL 进程。
+
+    启动时只执行一次 header（默认 `import Mathlib`）并记录其 env id；之后每个 step 的命令
+    都以该 env 为起点执行，单步延迟从“加载 Mathlib + 检查”降为“仅检查”。
+
+    env 按层串联：header（import）→ preamble（set_option / `namespace MathProve` 等，启动时执行一次）
+    → step header（step 源码中第一个 theorem 之前的辅助定义等）→ 待检查的声明。
+    step header 按内容哈希记忆其 env id，多个 step 共用同一段辅助定义时只 elaborate 一次；
+    记忆表随进程生命周期存在，重启后清空（env id 只在同一 REPL 进程内有效）。
+
+    指定 pickle_dir 时，header + preamble 之后的起始 env 通过 REPL 的 `pickleTo` 写入磁盘
+    （按 lean-toolchain、lake-manifest.json 与 header/preamble 内容哈希命名），
+    新进程用 `unpickleEnvFrom` 恢复，不必重新 import。
+    """
+
+    def __init__(
+        self,
+        repl_cmd=DEFAULT_REPL_CMD,
+        cwd=None,
+        header=DEFAULT_SESSION_HEADER,
+        startup_timeout=600,
+        max_runs=500,
+        preamble="",
+        pickle_dir=None,
+        limits=None,
+    ):
+        self.repl_cmd = repl_cmd
+        self.limits = dict(limits or {})
+        self.cwd = cwd
+        header = header or ""
+        preamble_imports, self.preamble = _split_imports(preamble)
+        extra = sorted(preamble_imports - _header_imports(header))
+        if extra:
+            header = "\n".join([header.rstrip(), *(f"import {imp}" for imp in extra)]).strip()
+        self.header = header
+        self.header_imports = _header_imports(header)
+        self.startup_timeout = startup_timeout
+        self.max_runs = max_runs
+        self.base_env = None
+        self.preamble_env = None
+        self.pickle_dir = pickle_dir
+        self.restored = False
+        self._envs = {}
+        self.runs = 0
+        self.proc = None
+        self._responses = queue.Queue()
+        self._stderr_tail = collections.deque(maxlen=200)
+        self._lock = threading.Lock()
+
+    # -- process plumbing -------------------------------------------------
+    def _read_stdout(self, proc, responses):
+        buf = []
+        try:
+            for line in proc.stdout:
+                if not buf and not line.lstrip().startswith("{"):
+                    continue
+                if line.strip():
+                    buf.append(line)
+                # REPL 输出为多行 JSON + 空行分隔；能完整解析即视为一条响应。
+                try:
+                    responses.put(json.loads("".join(buf)))
+                    buf = []
+                except json.JSONDecodeError:
+                    if not line.strip() and buf:
+                        buf = []
+        except Exception:  # noqa: BLE001
+            pass
+        finally:
+            responses.put(None)
+
+    def _read_stderr(self, proc):
+        try:
+            for line in proc.stderr:
+                self._stderr_tail.append(line)
+        except Exception:  # noqa: BLE001
+            pass
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _send(self, command, timeout):
+        assert self.proc is not None and self.proc.stdin is not None
+        self.proc.stdin.write(json.dumps(command, ensure_ascii=False) + "\n\n")
+        self.proc.stdin.flush()
+        try:
+            response = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError from None
+        if response is None:
+            raise EOFError("Lean4 REPL 进程已退出")
+        return response
+
+    def start(self):
+        """启动 REPL 并执行 header/preamble（配置了 pickle_dir 时优先从 pickle 恢复），返回 None 或错误结果。"""
+        self.close()
+        self._responses = queue.Queue()
+        self._stderr_tail.clear()
+        try:
+            self.proc = subprocess.Popen(
+                _to_cmd_list(self.repl_cmd),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                cwd=self.cwd,
+                bufsize=1,
+            )
+        except FileNotFoundError:
+            return self._error("NotFound", f"无法执行 REPL 命令: {self.repl_cmd}")
+        threading.Thread(target=self._read_stdout, args=(self.proc, self._responses), daemon=True).start()
+        threading.Thread(target=self._read_stderr, args=(self.proc,), daemon=True).start()
+        self.runs = 0
+        self._envs = {}
+        self.base_env = self.preamble_env = None
+        self.restored = False
+        deadline = time.time() + self.startup_timeout
+        pickle_path = None
+        if self.pickle_dir and (self.header.strip() or self.preamble.strip()):
+            pickle_path = _env_pickle_path(self.pickle_dir, self.cwd, self.header, self.preamble)
+            restored = self._unpickle(pickle_path, deadline)
+            if restored is None:
+                return self._restart_without_pickle()
+            if restored:
+                return None
+        for name, text in (("header", self.header), ("preamble", self.preamble)):
+            if not text.strip():
+                continue
+            command = {"cmd": text}
+            if self.base_env is not None:
+                command["env"] = self.base_env
+            try:
+                response = self._send(command, max(0.0, deadline - time.time()))
+            except TimeoutError:
+                self.close()
+                return self._error("Timeout", f"Lean4 REPL {name} 超时（>{self.startup_timeout}s）")
+            except (EOFError, OSError) as exc:
+                self.close()
+                return self._error("RuntimeError", f"Lean4 REPL 启动失败: {exc}")
+            failure = _response_failure(response)
+            if failure or "env" not in response:
+                self.close()
+                failure = failure or {"error_type": "ReplError", "message": f"{name} 响应缺少 env"}
+                return self._error(failure["error_type"], f"Lean4 REPL {name} 执行失败: {failure['message']}", [response])
+            self.base_env = response["env"]
+            if name == "preamble":
+                self.preamble_env = response["env"]
+        if pickle_path is not None and self._pickle(pickle_path, deadline) is None:
+            return self._restart_without_pickle()
+        return None
+
+    def _restart_without_pickle(self):
+        # pickle 命令超时后 REPL 的应答顺序不可信：关闭 pickle 并重启。
+        self.pickle_dir = None
+        return self.start()
+
+    def _unpickle(self, path, deadline):
+        """从 pickle 文件恢复起始 env。
+
+        成功返回 True；文件缺失或损坏返回 False（损坏时删除），随后走常规 header 路径；
+        超时或进程异常返回 None（调用方需重启）。
+        """
+        if not path.is_file():
+            return False
+        try:
+            response = self._send({"unpickleEnvFrom": str(path)}, max(0.0, deadline - time.time()))
+        except (TimeoutError, EOFError, OSError):
+            return None
+        if _response_failure(response) or "env" not in response:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return False
+        self.base_env = response["env"]
+        if self.preamble.strip():
+            self.preamble_env = response["env"]
+        self.restored = True
+        return True
+
+    def _pickle(self, path, deadline):
+        """把起始 env 写入 pickle 文件（先写临时文件再 rename，并发 worker 互不干扰）。
+
+        写入失败不影响会话，返回 False；超时或进程异常返回 None（调用方需重启）。
+        """
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return False
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.olean")
+        try:
+            response = self._send({"pickleTo": str(tmp), "env": self.base_env}, max(0.0, deadline - time.time()))
+        except (TimeoutError, EOFError, OSError):
+            return None
+        try:
+            if _response_failure(response) is None and tmp.is_file():
+                os.replace(tmp, path)
+                return True
+        except OSError:
+            pass
+        finally:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+        return False
+
+    def _error(self, error_type, message, outputs=None):
+        result = {
+            "status": "error",
+            "error_type": error_type,
+            "message": message,
+            "stdout": "",
+            "stderr": "".join(self._stderr_tail),
+        }
+        if outputs is not None:
+            result["outputs"] = outputs
+        return result
+
+    def close(self):
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        self.base_env = self.preamble_env = None
+        self._envs = {}
+        try:
+            if proc.stdin:
+                proc.stdin.close()
+        except Exception:  # noqa: BLE001
+            pass
+        try:
+            proc.wait(timeout=2)
+        except Exception:  # noqa: BLE001
+            proc.kill()
+            try:
+                proc.wait(timeout=5)
+            except Exception:  # noqa: BLE001
+                pass
+
+    def abort(self):
+        """从其他线程中止正在执行的命令：杀掉 REPL 进程，run() 随即返回错误，下次调用时重启。"""
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.kill()
+            except Exception:  # noqa: BLE001
+                pass
+
+    # -- public API -------------------------------------------------------
+    def ensure_started(self):
+        """若进程未运行则启动并执行 header（供预热使用），返回 None 或错误结果。"""
+        with self._lock:
+            if self.alive():
+                return None
+            return self.start()
+
+    def run(self, cmds, timeout=15):
+        """在 header env 上执行一个 step 的 cmds，返回与 run_repl 相同结构的结果。
+
+        执行期间采样 REPL 进程树的 RSS/CPU（附在 resources 中）；超出 limits 即杀掉进程，
+        返回 ResourceLimit 错误，下次调用时重启。
+        """
+        with self._lock:
+            if self.max_runs and self.runs >= self.max_runs:
+                self.close()
+            restarted = False
+            if not self.alive():
+                err = self.start()
+                if err:
+                    return err
+                restarted = True
+            self.runs += 1
+            monitor = ResourceMonitor(self.proc.pid, on_exceed=lambda kind: self.abort(), **self.limits)
+            with monitor:
+                result = self._run_step(cmds, timeout, restarted)
+            tracker = monitor.tracker
+            if tracker.exceeded:
+                self.close()
+                info = result.get("session")
+                result = self._error(
+                    "ResourceLimit", f"Lean4 REPL 会话超出资源预算: {tracker.describe()}", result.get("outputs")
+                )
+                if info:
+                    result["session"] = info
+            result["resources"] = tracker.summary()
+            return result
+
+    def _run_step(self, cmds, timeout, restarted):
+        try:
+            commands, cold = _session_commands(cmds, self.header_imports)
+        except ValueError as exc:
+            return self._error("ValueError", str(exc))
+
+        env = None if cold else self.base_env
+        outputs = []
+        failure = None
+        deadline = time.time() + timeout if timeout else None
+        info = {
+            "header_env": self.base_env,
+            "preamble_env": self.preamble_env,
+            "restored": self.restored,
+            "cold": cold,
+            "restarted": restarted,
+        }
+        if not cold and any(isinstance(item, str) for item in cmds) and commands:
+            step_header, body = _split_step_header(commands[0]["cmd"])
+            if step_header:
+                key = _content_hash(self.base_env, step_header)
+                info["step_header"] = key[:16]
+                info["step_header_reused"] = key in self._envs
+                if key not in self._envs:
+                    command = {"cmd": step_header}
+                    if env is not None:
+                        command["env"] = env
+                    remaining = None if deadline is None else max(0.0, deadline - time.time())
+                    try:
+                        response = self._send(command, remaining)
+                    except TimeoutError:
+                        self.close()
+                        return self._error("Timeout", f"Lean4 REPL 超时（>{timeout}s）", outputs)
+                    except (EOFError, OSError) as exc:
+                        self.close()
+                        return self._error("RuntimeError", f"Lean4 REPL 执行失败: {exc}", outputs)
+                    header_failure = _response_failure(response)
+                    if header_failure or "env" not in response:
+                        header_failure = header_failure or {"error_type": "ReplError", "message": "step header 响应缺少 env"}
+                        result = self._error(header_failure["error_type"], header_failure["message"], [response])
+                        result["session"] = info
+                        return result
+                    # 只记忆成功的 header；失败的下次仍会重新 elaborate 并报告错误。
+                    self._envs[key] = response["env"]
+                env = self._envs[key]
+                info["step_env"] = env
+                if body:
+                    commands[0] = {"cmd": body}
+                else:
+                    commands.pop(0)
+        for command in commands:
+            if "cmd" in command and "env" not in command and env is not None:
+                command["env"] = env
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                response = self._send(command, remaining)
+            except TimeoutError:
+                # REPL 状态未知：杀掉进程，下次调用时重启。
+                self.close()
+                return self._error("Timeout", f"Lean4 REPL 超时（>{timeout}s）", outputs)
+            except (EOFError, OSError) as exc:
+                self.close()
+                return self._error("RuntimeError", f"Lean4 REPL 执行失败: {exc}", outputs)
+            outputs.append(response)
+            if "env" in response:
+                env = response["env"]
+            failure = failure or _response_failure(response)
+
+        result = {
+            "status": "success",
+            "outputs": outputs,
+            "stdout": "",
+            "stderr": "",
+            "session": info,
+        }
+        if failure:
+            result.update({"status": "error", **failure})
+        return result
+
+
+def run_repl_interactive(cmds, repl_cmd, timeout=15, cwd=None, on_session=None, limits=None):
+    """逐条发送命令并在响应到达时解析；遇到首个 error / sorry 即停止，不再发送后续命令。
+
+    命令语义与 run_repl 相同（dict 原样发送；字符串若是 JSON 对象则按 JSON 发送，否则视为 `{"cmd": ...}`）。
+    失败时返回已收到的部分 outputs 与 `failed_index`（失败命令的下标）。
+    """
+    commands = []
+    for item in cmds:
+        if isinstance(item, dict):
+            commands.append(item)
+            continue
+        try:
+            parsed = json.loads(item)
+        except (TypeError, ValueError):
+            parsed = None
+        commands.append(parsed if isinstance(parsed, dict) else {"cmd": str(item)})
+
+    session = LeanReplSession(repl_cmd=repl_cmd, cwd=cwd, header="", limits=limits)
+    if on_session is not None:
+        on_session(session)
+    err = session.start()
+    if err:
+        return err
+    monitor = ResourceMonitor(session.proc.pid, on_exceed=lambda kind: session.abort(), **session.limits)
+    with monitor:
+        result = _send_until_failure(session, commands, timeout)
+    if monitor.tracker.exceeded:
+        result.update(
+            error_type="ResourceLimit",
+            status="error",
+            message=f"Lean4 REPL 超出资源预算: {monitor.tracker.describe()}",
+        )
+    result["resources"] = monitor.tracker.summary()
+    return result
+
+
+def _send_until_failure(session, commands, timeout):
+    outputs = []
+    deadline = time.time() + timeout if timeout else None
+    try:
+        for index, command in enumerate(commands):
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                response = session._send(command, remaining)
+            except TimeoutError:
+                result = session._error("Timeout", f"Lean4 REPL 超时（>{timeout}s）", outputs)
+                result.update({"failed_index": index, "skipped": len(commands) - index - 1})
+                return result
+            except (EOFError, OSError) as exc:
+                result = session._error("RuntimeError", f"Lean4 REPL 执行失败: {exc}", outputs)
+                result.update({"failed_index": index, "skipped": len(commands) - index - 1})
+                return result
+            outputs.append(response)
+            failure = _response_failure(response)
+            if failure:
+                result = session._error(failure["error_type"], failure["message"], outputs)
+                result.update({"failed_index": index, "skipped": len(commands) - index - 1})
+                return result
+    finally:
+        session.close()
+    return {"status": "success", "outputs": outputs, "stdout": "", "stderr": ""}
+
+
+class LeanReplPool:
+    """N 个常驻 REPL 会话，每个都持有已导入 header 的基础 env；并发调用分发到空闲会话。"""
+
+    def __init__(
+        self,
+        repl_cmd=DEFAULT_REPL_CMD,
+        cwd=None,
+        header=DEFAULT_SESSION_HEADER,
+        size=1,
+        prewarm=True,
+        preamble="",
+        pickle_dir=None,
+        limits=None,
+    ):
+        self.size = max(1, int(size or 1))
+        self.sessions = [
+            LeanReplSession(
+                repl_cmd=repl_cmd, cwd=cwd, header=header, preamble=preamble, pickle_dir=pickle_dir, limits=limits
+            )
+            for _ in range(self.size)
+        ]
+        self._idle = list(self.sessions)
+        self._cond = threading.Condition()
+        if prewarm:
+            # 并行加载 header（Mathlib 导入耗时长），不阻塞调用方。
+            for session in self.sessions:
+                threading.Thread(target=session.ensure_started, daemon=True).start()
+
+    def run(self, cmds, timeout=15, on_session=None):
+        """在空闲会话上执行；on_session(session) 在分配到会话后回调（供调用方中止）。
+
+        排队等待空闲会话也计入 timeout：超时仍未分到会话时返回 Timeout 失败（可重试）。
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not self._idle:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return {
+                        "status": "error",
+                        "error_type": "Timeout",
+                        "message": f"Lean4 REPL 等待空闲会话超时（>{timeout}s）",
+                        "stdout": "",
+                        "stderr": "",
+                    }
+                self._cond.wait(remaining)
+            session = self._idle.pop()
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.time())
+        try:
+            if on_session is not None:
+                on_session(session)
+            result = session.run(cmds, timeout=timeout)
+            if isinstance(result.get("session"), dict):
+                result["session"]["worker"] = self.sessions.index(session)
+            return result
+        finally:
+            with self._cond:
+                self._idle.append(session)
+                self._cond.notify()
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_repl_pool(
+    repl_cmd=DEFAULT_REPL_CMD,
+    cwd=None,
+    header=DEFAULT_SESSION_HEADER,
+    size=1,
+    preamble="",
+    pickle_dir=None,
+    limits=None,
+):
+    """返回进程内共享的 REPL 会话池（按 repl_cmd/cwd/header/preamble 复用；size/pickle_dir/limits 以首次创建为准）。"""
+    key = (repl_cmd, str(cwd or ""), header, preamble or "")
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = LeanReplPool(
+                repl_cmd=repl_cmd,
+                cwd=cwd,
+                header=header,
+                size=size,
+                preamble=preamble,
+                pickle_dir=pickle_dir,
+                limits=limits,
+            )
+            _POOLS[key] = pool
+        return pool
+
+
+def close_sessions():
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_sessions)
+
+
+def _resolve_file_cmd(file_cmd, lean_path=None, lake_path=None):
+    if file_cmd == DEFAULT_FILE_CMD:
+        if lean_path:
+            return f"\"{lean_path}\""
+        if lake_path:
+            return f"\"{lake_path}\" env lean"
+    return file_cmd
+
+
+def _resolve_repl_cmd(repl_cmd, lake_path=None):
+    if repl_cmd == DEFAULT_REPL_CMD and lake_path:
+        return f"\"{lake_path}\" exe repl"
+    return repl_cmd
+
+
+def _run_session_mode(
+    cmds,
+    mode,
+    repl_cmd,
+    cwd,
+    timeout,
+    session_header,
+    workers,
+    session_preamble,
+    session_pickle_dir,
+    on_session=None,
+    limits=None,
+):
+    if mode == "interactive":
+        return run_repl_interactive(
+            cmds, repl_cmd=repl_cmd, timeout=timeout, cwd=cwd, on_session=on_session, limits=limits
+        )
+    pool = get_repl_pool(
+        repl_cmd,
+        cwd=cwd,
+        header=session_header,
+        size=workers,
+        preamble=session_preamble,
+        pickle_dir=session_pickle_dir,
+        limits=limits,
+    )
+    return pool.run(cmds, timeout=timeout, on_session=on_session)
+
+
+async def run_payload_async(
+    cmds,
+    mode="repl",
+    repl_cmd=DEFAULT_REPL_CMD,
+    file_cmd=DEFAULT_FILE_CMD,
+    lean_path=None,
+    lake_path=None,
+    cwd=None,
+    timeout=15,
+    watchdog_timeout=0,
+    session_header=DEFAULT_SESSION_HEADER,
+    workers=1,
+    session_preamble="",
+    session_pickle_dir=None,
+    output_log=None,
+    max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+    limits=None,
+):
+    """run_payload 的协程版本：repl/file/auto 直接在 supervisor 上等待，可取消（取消即终止进程组）；
+    session/interactive 在线程中使用常驻 REPL，取消时中止该会话的进程。"""
+    file_cmd = _resolve_file_cmd(file_cmd or DEFAULT_FILE_CMD, lean_path, lake_path)
+    repl_cmd = _resolve_repl_cmd(repl_cmd or DEFAULT_REPL_CMD, lake_path)
+    if mode in ("session", "interactive"):
+        sessions = AbortGroup()
+        future = asyncio.get_running_loop().run_in_executor(
+            None,
+            functools.partial(
+                _run_session_mode,
+                cmds,
+                mode,
+                repl_cmd,
+                cwd,
+                timeout,
+                session_header,
+                workers,
+                session_preamble,
+                session_pickle_dir,
+                on_session=sessions.add,
+                limits=limits,
+            ),
+        )
+        try:
+            return await future
+        except asyncio.CancelledError:
+            sessions.abort()
+            raise
+    capture = {"output_log": output_log, "max_output_bytes": max_output_bytes, "limits": limits}
+    if mode == "file":
+        return await _run_file_mode_async(
+            cmds, file_cmd=file_cmd, cwd=cwd, timeout=timeout, watchdog_timeout=watchdog_timeout, **capture
+        )
+
+    result = await run_repl_async(cmds, repl_cmd=repl_cmd, timeout=timeout, cwd=cwd, limits=limits)
+    if mode == "auto" and result.get("status") != "success":
+        stderr = (result.get("stderr") or "").lower()
+        if "unknown executable repl" in stderr or "not found" in stderr or "no such file" in stderr:
+            result = await _run_file_mode_async(
+                cmds,
+                file_cmd=file_cmd,
+                cwd=cwd,
+                timeout=timeout,
+                watchdog_timeout=watchdog_timeout,
+                **capture,
+            )
+    return result
+
+
+def run_payload(
+    cmds,
+    mode="repl",
+    repl_cmd=DEFAULT_REPL_CMD,
+    file_cmd=DEFAULT_FILE_CMD,
+    lean_path=None,
+    lake_path=None,
+    cwd=None,
+    timeout=15,
+    watchdog_timeout=0,
+    session_header=DEFAULT_SESSION_HEADER,
+    workers=1,
+    session_preamble="",
+    session_pickle_dir=None,
+    output_log=None,
+    max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+    limits=None,
+):
+    """按 mode（repl/file/auto/session/interactive）执行一次 Lean4 检查；final_audit 进程内模式使用的同步接口。
+
+    file 模式的输出有界保留（头/尾共 max_output_bytes），完整输出写入 output_log。
+    limits（memory_limit_mb / cpu_limit_seconds，来自 routes.lean）超出时终止进程树；
+    结果附带本次检查的 resources（峰值 RSS、user/sys CPU、墙钟时间）。
+    """
+    if mode in ("session", "interactive"):
+        # 常驻会话本身基于线程，直接在调用线程中执行。
+        return _run_session_mode(
+            cmds,
+            mode,
+            _resolve_repl_cmd(repl_cmd or DEFAULT_REPL_CMD, lake_path),
+            cwd,
+            timeout,
+            session_header,
+            workers,
+            session_preamble,
+            session_pickle_dir,
+            limits=limits,
+        )
+    return run_on_loop(
+        run_payload_async(
+            cmds,
+            mode=mode,
+            repl_cmd=repl_cmd,
+            file_cmd=file_cmd,
+            lean_path=lean_path,
+            lake_path=lake_path,
+            cwd=cwd,
+            timeout=timeout,
+            watchdog_timeout=watchdog_timeout,
+            output_log=output_log,
+            max_output_bytes=max_output_bytes,
+            limits=limits,
+        )
+    )
+
+
 def main():
+    # CLI 只是异步 API 的薄封装。
+    try:
+        from . import verify_api
+    except ImportError:  # pragma: no cover
+        import verify_api
+
     parser = argparse.ArgumentParser(description="Lean4 REPL 客户端")
     parser.add_argument("--payload", help="JSON 字符串，包含 cmds 列表")
     parser.add_argument("--payload-file", help="payload JSON 文件路径")
-    default_repl_cmd = "lake exe repl"
-    default_file_cmd = "lake env lean"
     parser.add_argument(
         "--repl-cmd",
-        default=default_repl_cmd,
+        default=DEFAULT_REPL_CMD,
         help="REPL 启动命令（默认: lake exe repl）",
     )
     parser.add_argument(
         "--file-cmd",
-        default=default_file_cmd,
+        default=DEFAULT_FILE_CMD,
         help="文件模式执行命令（默认: lake env lean）",
     )
     parser.add_argument("--lean-path", help="指定 lean 可执行文件路径")
@@ -216,13 +1109,41 @@ def main():
     parser.add_argument(
         "--mode",
         default="repl",
-        choices=["repl", "file", "auto"],
-        help="执行模式（repl 或 file）",
+        choices=["repl", "file", "auto", "session", "interactive"],
+        help="执行模式（repl / file / auto / session：常驻 REPL，header 只加载一次 / interactive：逐条发送，首个 error 即停）",
+    )
+    parser.add_argument(
+        "--session-header",
+        default=DEFAULT_SESSION_HEADER,
+        help="session 模式启动时执行一次的 header（默认: import Mathlib）",
+    )
+    parser.add_argument(
+        "--session-preamble",
+        help="session 模式的 preamble 文件（如 assets/lean_preamble.lean；import 并入 header，其余启动时执行一次）",
+    )
+    parser.add_argument(
+        "--session-namespace",
+        default="",
+        help="在 preamble 之后打开的命名空间（如 MathProve），step 声明在其中检查",
+    )
+    parser.add_argument(
+        "--session-pickle-dir",
+        help="session 模式的 env pickle 目录：起始 env 写入磁盘，新进程从中恢复而不重新 import",
     )
     parser.add_argument("--timeout", type=int, default=15, help="超时秒数")
     parser.add_argument("--watchdog-timeout", type=int, default=0, help="无输出超时秒数（仅 file 模式）")
     parser.add_argument("--cwd", help="REPL 工作目录")
-    parser.add_argument("--retries", type=int, default=0, help="失败重试次数")
+    parser.add_argument("--output-log", help="file 模式完整输出的日志文件（内存中只保留有界的头/尾）")
+    parser.add_argument(
+        "--max-output-bytes",
+        type=int,
+        default=DEFAULT_MAX_OUTPUT_BYTES,
+        help="file 模式在内存/结果中保留的输出字节数（头尾各一半，0=不截断）",
+    )
+    parser.add_argument("--memory-limit-mb", type=float, default=0, help="进程树 RSS 上限（MiB，超出即终止；0=不限）")
+    parser.add_argument("--cpu-limit-seconds", type=float, default=0, help="进程树 user+sys CPU 上限（秒；0=不限）")
+    parser.add_argument("--retries", type=int, default=0, help="瞬时失败（超时、资源超限、REPL 崩溃）的重试次数")
+    parser.add_argument("--retry-backoff", type=float, default=DEFAULT_BACKOFF_SECONDS, help="重试退避基数（秒，按 1x/2x/4x… 递增）")
     parser.add_argument("--log", help="日志路径（JSONL）")
     args = parser.parse_args()
 
@@ -231,61 +1152,55 @@ def main():
     if not cmds:
         raise SystemExit("payload 缺少 cmds")
 
+    preamble = ""
+    if args.session_preamble or args.session_namespace:
+        preamble = load_session_preamble(args.session_preamble, namespace=args.session_namespace)
+
     attempts = 0
     result = None
     while attempts <= args.retries:
         attempts += 1
-        if args.mode == "file":
-            if args.file_cmd == default_file_cmd:
-                if args.lean_path:
-                    args.file_cmd = f"\"{args.lean_path}\""
-                elif args.lake_path:
-                    args.file_cmd = f"\"{args.lake_path}\" env lean"
-            result = _run_file_mode(
+        result = asyncio.run(
+            verify_api.verify_lean(
                 cmds,
+                mode=args.mode,
+                repl_cmd=args.repl_cmd,
                 file_cmd=args.file_cmd,
+                lean_path=args.lean_path,
+                lake_path=args.lake_path,
                 cwd=args.cwd,
                 timeout=args.timeout,
                 watchdog_timeout=args.watchdog_timeout,
+                session_header=args.session_header,
+                session_preamble=preamble,
+                session_pickle_dir=args.session_pickle_dir,
+                output_log=args.output_log,
+                max_output_bytes=args.max_output_bytes,
+                memory_limit_mb=args.memory_limit_mb,
+                cpu_limit_seconds=args.cpu_limit_seconds,
             )
-        elif args.mode == "auto":
-            if args.repl_cmd == default_repl_cmd and args.lake_path:
-                args.repl_cmd = f"\"{args.lake_path}\" exe repl"
-            result = run_repl(cmds, repl_cmd=args.repl_cmd, timeout=args.timeout, cwd=args.cwd)
-            if result.get("status") != "success":
-                stderr = (result.get("stderr") or "").lower()
-                if "unknown executable repl" in stderr or "not found" in stderr or "no such file" in stderr:
-                    if args.file_cmd == default_file_cmd:
-                        if args.lean_path:
-                            args.file_cmd = f"\"{args.lean_path}\""
-                        elif args.lake_path:
-                            args.file_cmd = f"\"{args.lake_path}\" env lean"
-                    result = _run_file_mode(
-                        cmds,
-                        file_cmd=args.file_cmd,
-                        cwd=args.cwd,
-                        timeout=args.timeout,
-                        watchdog_timeout=args.watchdog_timeout,
-                    )
-        else:
-            if args.repl_cmd == default_repl_cmd and args.lake_path:
-                args.repl_cmd = f"\"{args.lake_path}\" exe repl"
-            result = run_repl(cmds, repl_cmd=args.repl_cmd, timeout=args.timeout, cwd=args.cwd)
-
+        )
+        failure = classify_failure(result)
         log_event(
             {
                 "event": "lean_run",
                 "attempt": attempts,
                 "mode": args.mode,
                 "status": result.get("status"),
+                "failure_class": failure,
             },
             log_path=args.log,
         )
-        if result.get("status") == "success":
+        # 确定性失败（类型错误、sorry）与环境问题（缺少工具链）重试也不会通过。
+        if not should_retry(failure):
             break
+        if attempts <= args.retries:
+            time.sleep(backoff_delay(attempts, args.retry_backoff))
     if result is None:
         result = {"status": "error", "error_type": "Unknown", "message": "未执行"}
     result["attempts"] = attempts
+    if result.get("status") != "success":
+        result["failure_class"] = classify_failure(result)
     print(json.dumps(result, ensure_ascii=False, indent=2))
 
 
@@ -0,0 +1,140 @@
+"""Lean4 / SymPy 校验的异步 Python API。
+
+编排器可以直接 `await verify_lean(cmds, ...)` / `await verify_sympy(code, ...)`，无需 fork
+CLI 再解析 stdout；返回结构与 `lean_repl_client.py` / `verify_sympy.py` 的 JSON 输出一致。
+
+- 取消：取消等待中的任务会终止对应的子进程组（或中止所用的常驻 REPL 会话 / SymPy worker）。
+- deadline：绝对时间（`time.monotonic()` 时钟）；与 timeout 取较早者，已过期则直接返回 Timeout。
+- 并发：同一进程内的并发调用共享 session 模式的 REPL 会话池与 SymPy worker 池。
+- 资源预算：memory_limit_mb / cpu_limit_seconds（0=不限）超出即终止进程树，返回 ResourceLimit；
+  结果中的 resources 记录峰值 RSS、user/sys CPU 与墙钟时间。
+
+两个 CLI 脚本的 main() 只是这些函数的薄封装。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+try:
+    from . import lean_repl_client
+    from . import verify_sympy as sympy_cli
+except ImportError:  # pragma: no cover
+    import lean_repl_client
+    import verify_sympy as sympy_cli
+
+try:
+    from .runtime_paths import assets_dir
+except ImportError:  # pragma: no cover
+    from runtime_paths import assets_dir
+
+try:
+    from ..runtime.sympy_pool import get_pool
+except Exception:  # pragma: no cover
+    from runtime.sympy_pool import get_pool
+
+__all__ = ["verify_lean", "verify_sympy"]
+
+
+def _budget(timeout: float | None, deadline: float | None) -> float | None:
+    """合并 timeout 与 deadline，返回剩余秒数（<=0 表示已过期）；都未给出时返回 None。"""
+    remaining = None if deadline is None else deadline - time.monotonic()
+    if timeout and remaining is not None:
+        return min(float(timeout), remaining)
+    return remaining if remaining is not None else (float(timeout) if timeout else None)
+
+
+def _deadline_error(kind: str) -> dict:
+    return {
+        "status": "error",
+        "error_type": "Timeout",
+        "message": f"{kind} 已超过 deadline",
+        "stdout": "",
+        "stderr": "",
+    }
+
+
+async def _within(coro, budget: float | None, deadline: float | None, kind: str) -> dict:
+    if deadline is None:
+        return await coro
+    # deadline 是硬上限（包括 REPL 启动等 timeout 不覆盖的阶段）：超时即取消，子进程随之被终止。
+    try:
+        return await asyncio.wait_for(coro, timeout=max(0.0, budget or 0.0))
+    except asyncio.TimeoutError:
+        return _deadline_error(kind)
+
+
+async def verify_lean(
+    cmds: list,
+    *,
+    mode: str = "repl",
+    timeout: float = 15,
+    deadline: float | None = None,
+    repl_cmd: str = lean_repl_client.DEFAULT_REPL_CMD,
+    file_cmd: str = lean_repl_client.DEFAULT_FILE_CMD,
+    lean_path: str | None = None,
+    lake_path: str | None = None,
+    cwd: str | None = None,
+    watchdog_timeout: float = 0,
+    session_header: str = lean_repl_client.DEFAULT_SESSION_HEADER,
+    session_preamble: str = "",
+    session_pickle_dir: str | None = None,
+    workers: int = 1,
+    output_log: str | None = None,
+    max_output_bytes: int = lean_repl_client.DEFAULT_MAX_OUTPUT_BYTES,
+    memory_limit_mb: float = 0,
+    cpu_limit_seconds: float = 0,
+) -> dict:
+    """执行一次 Lean4 检查（mode 同 lean_repl_client：repl/file/auto/session/interactive）。"""
+    budget = _budget(timeout, deadline)
+    if budget is not None and budget <= 0:
+        return _deadline_error("Lean4 检查")
+    coro = lean_repl_client.run_payload_async(
+        cmds,
+        mode=mode,
+        repl_cmd=repl_cmd,
+        file_cmd=file_cmd,
+        lean_path=lean_path,
+        lake_path=lake_path,
+        cwd=cwd,
+        timeout=budget or 0,
+        watchdog_timeout=watchdog_timeout,
+        session_header=session_header,
+        workers=workers,
+        session_preamble=session_preamble,
+        session_pickle_dir=session_pickle_dir,
+        output_log=output_log,
+        max_output_bytes=max_output_bytes,
+        limits={"memory_limit_mb": memory_limit_mb, "cpu_limit_seconds": cpu_limit_seconds},
+    )
+    return await _within(coro, budget, deadline, "Lean4 检查")
+
+
+async def verify_sympy(
+    code: str,
+    *,
+    timeout: float = 10,
+    deadline: float | None = None,
+    template_path: str | None = str(assets_dir() / "sympy_template.py"),
+    python_path: str | None = None,
+    executor: str = "pool",
+    pool_size: int | None = None,
+    memory_limit_mb: float = 0,
+    cpu_limit_seconds: float = 0,
+) -> dict:
+    """执行一段 SymPy 代码（默认使用进程内共享的预热 worker 池）。"""
+    budget = _budget(timeout, deadline)
+    if budget is not None and budget <= 0:
+        return _deadline_error("SymPy 执行")
+    pool = get_pool(python_path, size=pool_size) if executor == "pool" else None
+    coro = sympy_cli.run_code_async(
+        code,
+        template_path=template_path,
+        timeout=budget,
+        python_path=python_path,
+        executor=executor,
+        pool=pool,
+        limits={"memory_limit_mb": memory_limit_mb, "cpu_limit_seconds": cpu_limit_seconds},
+    )
+    return await _within(coro, budget, deadline, "SymPy 执行")
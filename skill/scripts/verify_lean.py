@@ -5,9 +5,7 @@ from __future__ import annotations
 import argparse
 import json
 import pathlib
-import subprocess
 import sys
-import time
 
 try:
     from .logger import log_event
@@ -20,14 +18,20 @@ except ImportError:  # pragma: no cover
     from runtime_paths import assets_dir
 
 try:
+    from ..runtime.capture import DEFAULT_MAX_OUTPUT_BYTES
     from ..runtime.config_loader import load_config
+    from ..runtime.resources import route_limits
+    from ..runtime.supervisor import run_supervised
     from ..runtime.workspace_manager import ensure_run_dir, run_path
 except Exception:  # pragma: no cover
     import sys
     from pathlib import Path
 
     sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from runtime.capture import DEFAULT_MAX_OUTPUT_BYTES
     from runtime.config_loader import load_config
+    from runtime.resources import route_limits
+    from runtime.supervisor import run_supervised
     from runtime.workspace_manager import ensure_run_dir, run_path
 
 
@@ -80,6 +84,14 @@ def main() -> int:
     parser.add_argument("--lake-cmd", help="Lake 可执行命令")
     parser.add_argument("--use-lake", action="store_true", help="使用 lake env lean 执行")
     parser.add_argument("--log", help="日志路径（JSONL）")
+    parser.add_argument(
+        "--max-output-bytes",
+        type=int,
+        default=DEFAULT_MAX_OUTPUT_BYTES,
+        help="结果中保留的输出字节数（头尾各一半，完整输出见 --out 日志；0=不截断）",
+    )
+    parser.add_argument("--memory-limit-mb", type=float, help="进程树 RSS 上限（MiB；缺省读取 routes.lean.memory_limit_mb，0=不限）")
+    parser.add_argument("--cpu-limit-seconds", type=float, help="进程树 CPU 上限（秒；缺省读取 routes.lean.cpu_limit_seconds）")
     args = parser.parse_args()
 
     run_dir = ensure_run_dir(args.run_dir, args.workspace_dir)
@@ -106,16 +118,11 @@ def main() -> int:
 
     cfg = load_config()
     cmd = _resolve_cmd(cfg, args) + [str(lean_file)]
-    start = time.time()
-    proc = subprocess.run(
-        cmd,
-        cwd=args.lean_cwd,
-        capture_output=True,
-        text=True,
-        timeout=args.timeout,
-        check=False,
-    )
-    elapsed = time.time() - start
+    limits = route_limits((cfg.get("routes") or {}).get("lean"))
+    if args.memory_limit_mb is not None:
+        limits["memory_limit_mb"] = args.memory_limit_mb
+    if args.cpu_limit_seconds is not None:
+        limits["cpu_limit_seconds"] = args.cpu_limit_seconds
 
     out_path = None
     if args.out:
@@ -123,25 +130,42 @@ def main() -> int:
     else:
         stamp = args.step_id or "step"
         out_path = run_path(run_dir, f"logs/lean_{stamp}.log")
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text((proc.stdout or "") + (proc.stderr or ""), encoding="utf-8")
+    # 完整输出直接流式写入日志，内存与结果中只保留有界的头/尾。
+    proc = run_supervised(
+        cmd,
+        cwd=args.lean_cwd,
+        timeout=args.timeout,
+        max_output_bytes=args.max_output_bytes,
+        output_log=str(out_path),
+        **limits,
+    )
 
-    status = "success" if proc.returncode == 0 else "error"
+    ok = proc["returncode"] == 0 and not proc["timeout"]
+    status = "success" if ok else "error"
     result = {
         "status": status,
-        "returncode": proc.returncode,
-        "stdout": proc.stdout or "",
-        "stderr": proc.stderr or "",
-        "execution_time": round(elapsed, 4),
+        "returncode": proc["returncode"],
+        "stdout": proc["output"],
+        "stderr": "",
+        "execution_time": proc["seconds"],
+        "output_bytes": proc["output_bytes"],
+        "output_truncated": proc["output_truncated"],
+        "resources": proc["resources"],
         "log": str(out_path),
         "file": str(lean_file),
     }
+    if proc["timeout"]:
+        result.update({"error_type": "Timeout", "message": f"Lean4 执行超时（>{args.timeout}s）"})
+    elif proc["limit_exceeded"]:
+        result.update({"error_type": "ResourceLimit", "message": f"Lean4 超出资源预算: {proc['limit_message']}"})
+    elif proc["returncode"] is None:
+        result.update({"error_type": "NotFound", "message": f"无法执行: {cmd[0]}"})
     log_event(
-        {"event": "lean_run", "status": status, "returncode": proc.returncode, "file": str(lean_file)},
+        {"event": "lean_run", "status": status, "returncode": proc["returncode"], "file": str(lean_file)},
         log_path=args.log,
     )
     print(json.dumps(result, ensure_ascii=False, indent=2))
-    return 0 if proc.returncode == 0 else 2
+    return 0 if ok else 2
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 """执行 SymPy 验证并返回结构化结果。"""
 import argparse
+import asyncio
+import functools
 import json
 import pathlib
 import subprocess
@@ -25,6 +27,18 @@ except Exception:  # pragma: no cover
     sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
     from runtime.workspace_manager import ensure_run_dir, run_path
 
+try:
+    from ..runtime.failure import DEFAULT_BACKOFF_SECONDS, backoff_delay, classify_failure, should_retry
+    from ..runtime.sympy_pool import get_pool
+    from ..runtime.supervisor import AbortGroup, run_on_loop, supervise
+except Exception:  # pragma: no cover
+    from runtime.failure import DEFAULT_BACKOFF_SECONDS, backoff_delay, classify_failure, should_retry
+    from runtime.sympy_pool import get_pool
+    from runtime.supervisor import AbortGroup, run_on_loop, supervise
+
+EXECUTORS = ("subprocess", "pool")
+
+
 def _read_text(path):
     return pathlib.Path(path).read_text(encoding="utf-8")
 
@@ -42,42 +56,45 @@ def _extract_json(stdout_text):
     return None, None
 
 
-def run_code(code, template_path=None, timeout=10, python_path=None):
+def _full_code(code, template_path=None):
     template = ""
     if template_path:
         template = _read_text(template_path)
+    return f"{template}\n\n{code}".strip() + "\n"
 
-    full_code = f"{template}\n\n{code}".strip() + "\n"
-    start = time.time()
-    try:
-        proc = subprocess.run(
-            [python_path or sys.executable, "-"],
-            input=full_code,
-            text=True,
-            encoding="utf-8",
-            capture_output=True,
-            timeout=timeout,
-            check=False,
-        )
-    except subprocess.TimeoutExpired:
-        return {
-            "status": "error",
-            "error_type": "Timeout",
-            "message": f"执行超时（>{timeout}s）",
-            "stdout": "",
-            "stderr": "",
-        }
 
-    elapsed = time.time() - start
-    stdout_text = proc.stdout or ""
-    stderr_text = proc.stderr or ""
+def _timeout_result(timeout):
+    return {
+        "status": "error",
+        "error_type": "Timeout",
+        "message": f"执行超时（>{timeout}s）",
+        "stdout": "",
+        "stderr": "",
+    }
+
+
+def _limit_result(usage, message, stderr_text=""):
+    return {
+        "status": "error",
+        "error_type": "ResourceLimit",
+        "message": f"SymPy 超出资源预算: {message}",
+        "stdout": "",
+        "stderr": stderr_text or "",
+        "resources": usage,
+    }
+
+
+def _code_result(returncode, stdout_text, stderr_text, elapsed):
+    stdout_text = stdout_text or ""
+    stderr_text = stderr_text or ""
     parsed, raw = _extract_json(stdout_text)
 
-    if proc.returncode != 0:
+    if returncode != 0:
         return {
             "status": "error",
             "error_type": "RuntimeError",
             "message": "SymPy 执行失败",
+            "returncode": returncode,
             "stdout": stdout_text,
             "stderr": stderr_text,
             "execution_time": round(elapsed, 4),
@@ -93,7 +110,97 @@ def run_code(code, template_path=None, timeout=10, python_path=None):
     }
 
 
+def _pool_result(proc, usage, timeout, start):
+    if proc is None:
+        result = _timeout_result(timeout)
+    elif usage.get("limit_exceeded"):
+        return _limit_result(usage, proc.stderr)
+    else:
+        result = _code_result(proc.returncode, proc.stdout, proc.stderr, time.time() - start)
+    result["resources"] = usage
+    return result
+
+
+async def run_code_async(
+    code, template_path=None, timeout=10, python_path=None, executor="subprocess", pool=None, limits=None
+):
+    """run_code 的协程版本，可取消：subprocess 模式由共享 supervisor 监督（取消即终止进程组），
+    pool 模式在线程中调用 worker 池（取消时杀掉该 worker，池会按需补充）。
+
+    limits（memory_limit_mb / cpu_limit_seconds，来自 routes.sympy）超出时终止执行进程；
+    结果附带 resources（峰值 RSS、user/sys CPU、墙钟时间）。"""
+    full_code = _full_code(code, template_path)
+    start = time.time()
+    if pool is not None or executor == "pool":
+        pool = pool or get_pool(python_path)
+        workers = AbortGroup()
+        usage = {}
+        future = asyncio.get_running_loop().run_in_executor(
+            None,
+            functools.partial(pool.run, full_code, timeout=timeout, on_worker=workers.add, limits=limits, usage=usage),
+        )
+        try:
+            proc = await future
+        except subprocess.TimeoutExpired:
+            proc = None
+        except asyncio.CancelledError:
+            workers.abort()
+            raise
+        return _pool_result(proc, usage, timeout, start)
+
+    proc = await supervise(
+        [python_path or sys.executable, "-"],
+        timeout=timeout or 0,
+        input=full_code,
+        merge_stderr=False,
+        **(limits or {}),
+    )
+    if proc["returncode"] is None:
+        return {
+            "status": "error",
+            "error_type": "NotFound",
+            "message": f"无法执行 Python: {python_path or sys.executable}",
+            "stdout": "",
+            "stderr": proc["output"],
+        }
+    if proc["limit_exceeded"]:
+        return _limit_result(proc["resources"], proc["limit_message"], proc["stderr"])
+    result = _timeout_result(timeout) if proc["timeout"] else _code_result(
+        proc["returncode"], proc["output"], proc["stderr"], time.time() - start
+    )
+    result["resources"] = proc["resources"]
+    return result
+
+
+def run_code(code, template_path=None, timeout=10, python_path=None, executor="subprocess", pool=None, limits=None):
+    """执行 SymPy 代码。
+
+    executor="subprocess" 每次启动新的 `python -`；executor="pool"（或显式传入 pool）
+    则复用已预热 SymPy 的常驻 worker，返回结构与 subprocess 模式一致。
+    """
+    if pool is not None or executor == "pool":
+        # worker 池本身基于线程，直接在调用线程中执行。
+        full_code = _full_code(code, template_path)
+        start = time.time()
+        pool = pool or get_pool(python_path)
+        usage = {}
+        try:
+            proc = pool.run(full_code, timeout=timeout, limits=limits, usage=usage)
+        except subprocess.TimeoutExpired:
+            proc = None
+        return _pool_result(proc, usage, timeout, start)
+    return run_on_loop(
+        run_code_async(code, template_path=template_path, timeout=timeout, python_path=python_path, limits=limits)
+    )
+
+
 def main():
+    # CLI 只是异步 API 的薄封装。
+    try:
+        from . import verify_api
+    except ImportError:  # pragma: no cover
+        import verify_api
+
     parser = argparse.ArgumentParser(description="执行 SymPy 代码并返回结构化结果")
     parser.add_argument("--code", help="Python 代码字符串")
     parser.add_argument("--code-file", help="Python 代码文件路径")
@@ -104,7 +211,17 @@ def main():
     )
     parser.add_argument("--timeout", type=int, default=10, help="超时秒数")
     parser.add_argument("--python", help="指定 Python 路径执行 SymPy")
-    parser.add_argument("--retries", type=int, default=0, help="失败重试次数")
+    parser.add_argument(
+        "--executor",
+        default="subprocess",
+        choices=EXECUTORS,
+        help="执行方式：subprocess（每次新进程）或 pool（常驻预热 worker）",
+    )
+    parser.add_argument("--pool-size", type=int, default=1, help="pool 模式的 worker 数")
+    parser.add_argument("--memory-limit-mb", type=float, default=0, help="执行进程 RSS 上限（MiB，超出即终止；0=不限）")
+    parser.add_argument("--cpu-limit-seconds", type=float, default=0, help="执行进程 user+sys CPU 上限（秒；0=不限）")
+    parser.add_argument("--retries", type=int, default=0, help="瞬时失败（超时、资源超限、worker 崩溃）的重试次数")
+    parser.add_argument("--retry-backoff", type=float, default=DEFAULT_BACKOFF_SECONDS, help="重试退避基数（秒，按 1x/2x/4x… 递增）")
     parser.add_argument("--run-dir", help="运行目录（工作区内）")
     parser.add_argument("--workspace-dir", help="工作区根目录（缺省则使用配置/默认值）")
     parser.add_argument("--out", help="输出结果 JSON 文件路径")
@@ -128,21 +245,39 @@ def main():
     result = None
     while attempts <= args.retries:
         attempts += 1
-        result = run_code(code, template_path=args.template, timeout=args.timeout, python_path=args.python)
+        result = asyncio.run(
+            verify_api.verify_sympy(
+                code,
+                template_path=args.template,
+                timeout=args.timeout,
+                python_path=args.python,
+                executor=args.executor,
+                pool_size=args.pool_size,
+                memory_limit_mb=args.memory_limit_mb,
+                cpu_limit_seconds=args.cpu_limit_seconds,
+            )
+        )
+        failure = classify_failure(result)
         log_event(
             {
                 "event": "sympy_run",
                 "attempt": attempts,
                 "status": result.get("status"),
                 "error_type": result.get("error_type"),
+                "failure_class": failure,
             },
             log_path=args.log,
         )
-        if result.get("status") == "success":
+        # 确定性失败（语法错误、断言失败）与环境问题重试也不会通过。
+        if not should_retry(failure):
             break
+        if attempts <= args.retries:
+            time.sleep(backoff_delay(attempts, args.retry_backoff))
     if result is None:
         result = {"status": "error", "error_type": "Unknown", "message": "未执行"}
     result["attempts"] = attempts
+    if result.get("status") != "success":
+        result["failure_class"] = classify_failure(result)
     output_json = json.dumps(result, ensure_ascii=False, indent=2)
     if args.out:
         out_path = run_path(run_dir, args.out) if not pathlib.Path(args.out).is_absolute() else pathlib.Path(args.out)
@@ -1,7 +1,94 @@
-"""为测试注入 MathProve 包路径。"""
+"""为测试注入 MathProve 包路径，并提供模拟 Lean4 REPL。"""
 import pathlib
 import sys
 
+import pytest
+
 ROOT = pathlib.Path(__file__).resolve().parents[1]
-if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT))
+for path in (ROOT, ROOT / "skill", ROOT / "skill" / "scripts"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+# 模拟 Lean4 REPL 的 JSON 协议：命令以空行分隔，响应为多行 JSON + 空行。
+# 源码中含 `BAD` 产生 error 消息，含 `sorry` 产生 sorries，含 `SLEEP` 则卡住，含 `DELAY` 则短暂延迟。
+# 支持 pickleTo / unpickleEnvFrom（写入/读取占位文件）。
+# 每次进程启动/每条 import/pickle/unpickle 命令都会追加到 FAKE_REPL_LOG，便于断言复用情况。
+_FAKE_REPL = r'''
+import json, os, sys, time
+
+log_path = os.environ.get("FAKE_REPL_LOG")
+
+
+def log(event):
+    if log_path:
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(event + "\n")
+
+
+log("start")
+next_env = 0
+known = set()
+buf = []
+for line in sys.stdin:
+    if line.strip():
+        buf.append(line)
+        continue
+    if not buf:
+        continue
+    cmd = json.loads("".join(buf))
+    buf = []
+    src = cmd.get("cmd", "")
+    if "env" in cmd and cmd["env"] not in known:
+        resp = {"message": "Unknown environment."}
+    elif "pickleTo" in cmd:
+        log("pickle")
+        with open(cmd["pickleTo"], "w", encoding="utf-8") as f:
+            f.write("pickled env")
+        resp = {"env": cmd["env"]}
+    elif "unpickleEnvFrom" in cmd:
+        if os.path.exists(cmd["unpickleEnvFrom"]):
+            log("unpickle")
+            resp = {"env": next_env}
+            known.add(next_env)
+            next_env += 1
+        else:
+            resp = {"message": "file not found"}
+    else:
+        if "import" in src:
+            log("import")
+        if "SLEEP" in src:
+            time.sleep(60)
+        if "DELAY" in src:
+            time.sleep(0.3)
+        resp = {"env": next_env, "messages": []}
+        if "BAD" in src:
+            resp["messages"].append({"severity": "error", "data": "type mismatch"})
+        if "sorry" in src:
+            resp["sorries"] = [{"goal": "⊢ True"}]
+        if "env" in cmd:
+            resp["base"] = cmd["env"]
+        known.add(next_env)
+        next_env += 1
+    sys.stdout.write(json.dumps(resp, indent=2, ensure_ascii=False) + "\n\n")
+    sys.stdout.flush()
+'''
+
+
+class FakeRepl:
+    def __init__(self, root: pathlib.Path):
+        self.script = root / "fake_repl.py"
+        self.script.write_text(_FAKE_REPL, encoding="utf-8")
+        self.log = root / "fake_repl.log"
+        self.cmd = f'"{sys.executable}" "{self.script}"'
+
+    def events(self) -> list[str]:
+        if not self.log.exists():
+            return []
+        return self.log.read_text(encoding="utf-8").split()
+
+
+@pytest.fixture
+def fake_repl(tmp_path, monkeypatch):
+    repl = FakeRepl(tmp_path)
+    monkeypatch.setenv("FAKE_REPL_LOG", str(repl.log))
+    return repl
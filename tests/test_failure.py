@@ -0,0 +1,44 @@
+"""失败分类：确定性 / 瞬时 / 环境。"""
+import importlib.util
+
+import pytest
+
+import verify_sympy
+from runtime.failure import DETERMINISTIC, ENVIRONMENT, TRANSIENT, backoff_delay, classify_failure
+from runtime_paths import assets_dir
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+@pytest.mark.parametrize(
+    "code, expected",
+    [
+        ("assert 1 == 2", DETERMINISTIC),
+        ("x = (", DETERMINISTIC),
+        ("import no_such_module_xyz", ENVIRONMENT),
+        ("import os, signal\nos.kill(os.getpid(), signal.SIGKILL)", TRANSIENT),
+        ("import time\ntime.sleep(30)", TRANSIENT),
+        ("emit({'ok': True})", None),
+    ],
+)
+def test_classify_real_sympy_results(code, expected):
+    result = verify_sympy.run_code(code, template_path=str(assets_dir() / "sympy_template.py"), timeout=5)
+    assert classify_failure(result) == expected
+
+
+def test_classify_lean_and_runner_results():
+    assert classify_failure({"status": "error", "error_type": "LeanError", "message": "type mismatch"}) == DETERMINISTIC
+    assert classify_failure({"status": "error", "error_type": "NotFound", "message": "lake"}) == ENVIRONMENT
+    assert classify_failure({"status": "error", "error_type": "ResourceLimit"}) == TRANSIENT
+    unknown_package = {"status": "error", "error_type": "ReplError", "message": "unknown package 'Mathlib'"}
+    assert classify_failure(unknown_package) == ENVIRONMENT
+    file_mode = {"status": "error", "error_type": "RuntimeError", "returncode": 1, "stdout": "a.lean:3:2: error: unsolved goals"}
+    assert classify_failure(file_mode) == DETERMINISTIC
+    assert classify_failure({"status": "error", "error_type": "RuntimeError", "returncode": 1, "stdout": ""}) == TRANSIENT
+    assert classify_failure({"static_lint": {"error": "sorry"}}) == DETERMINISTIC
+    assert classify_failure({"error": "SymPy 检查缺少 code 或 code_file"}) == DETERMINISTIC
+
+
+def test_backoff_grows_exponentially_and_is_capped():
+    assert [backoff_delay(n, 0.5) for n in (1, 2, 3)] == [0.5, 1.0, 2.0]
+    assert backoff_delay(20, 1.0, cap=30) == 30
+    assert backoff_delay(3, 0) == 0
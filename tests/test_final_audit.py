@@ -4,6 +4,7 @@ import json
 import pathlib
 import subprocess
 import tempfile
+import time
 
 import pytest
 
@@ -96,3 +97,496 @@ def test_final_audit_rejects_forbidden_lean_keywords_even_if_runner_succeeds():
         result = json.loads(proc.stdout)
         assert result["status"] == "failed"
         assert not solution_path.exists()
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+@pytest.mark.parametrize("executor", ["subprocess", "pool"])
+def test_final_audit_fails_on_sympy_assertion(executor):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        steps_path = pathlib.Path(temp_dir) / "steps.json"
+        solution_path = pathlib.Path(temp_dir) / "Solution.md"
+        steps = {
+            "problem": "失败的 SymPy 断言不应通过审计",
+            "steps": [
+                {"id": "S1", "goal": "ok", "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+                {"id": "S2", "goal": "bad", "checker": {"type": "sympy", "code": "assert 1 == 2"}},
+            ],
+        }
+        steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+        script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+        cmd = [
+            "python",
+            str(script_path),
+            "--steps",
+            str(steps_path),
+            "--solution",
+            str(solution_path),
+            "--sympy-executor",
+            executor,
+        ]
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        assert proc.returncode == 0
+        result = json.loads(proc.stdout)
+        assert result["status"] == "failed"
+        assert [r["status"] for r in result["report"]] == ["passed", "failed"]
+        assert not solution_path.exists()
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_inprocess_matches_subprocess_report_shape():
+    import sys
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = pathlib.Path(temp_dir)
+        fake_repl = temp_dir / "fake_repl.py"
+        fake_repl.write_text(
+            "\n".join(
+                [
+                    "import json, sys",
+                    "for i, line in enumerate(l for l in sys.stdin.read().splitlines() if l.strip()):",
+                    "    print(json.dumps({'env': i, 'messages': [], 'goals': [], 'sorries': []}))",
+                ]
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        steps = {
+            "problem": "进程内模式与子进程模式报告一致",
+            "steps": [
+                {"id": "S1", "goal": "sympy", "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+                {
+                    "id": "S2",
+                    "goal": "lean",
+                    "checker": {
+                        "type": "lean4",
+                        "cmds": ["theorem S2 : True := by trivial"],
+                        "repl_cmd": f'"{sys.executable}" "{fake_repl}"',
+                    },
+                },
+            ],
+        }
+        steps_path = temp_dir / "steps.json"
+        steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+        script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+
+        reports = {}
+        for mode in ("subprocess", "inprocess"):
+            cmd = [
+                "python",
+                str(script_path),
+                "--steps",
+                str(steps_path),
+                "--solution",
+                str(temp_dir / f"Solution_{mode}.md"),
+                "--exec-mode",
+                mode,
+                "--no-cache",
+            ]
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+            assert proc.returncode == 0, proc.stderr
+            reports[mode] = json.loads(proc.stdout)
+
+        for mode, result in reports.items():
+            assert result["status"] == "passed", mode
+        sub, inproc = reports["subprocess"]["report"], reports["inprocess"]["report"]
+        assert [(r["id"], r["status"], r["attempts"]) for r in sub] == [(r["id"], r["status"], r["attempts"]) for r in inproc]
+        for a, b in zip(sub, inproc):
+            assert set(a["detail"]) == set(b["detail"])
+        assert sub[1]["detail"]["outputs"] == inproc[1]["detail"]["outputs"]
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_skips_steps_whose_dependencies_failed():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = pathlib.Path(temp_dir)
+        steps = {
+            "problem": "depends_on",
+            "steps": [
+                {"id": "S1", "goal": "bad", "checker": {"type": "sympy", "code": "assert False"}},
+                {"id": "S2", "goal": "ok", "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+                {
+                    "id": "S3",
+                    "goal": "needs S1",
+                    "depends_on": ["S1", "S2"],
+                    "checker": {"type": "sympy", "code": "emit({'ok': True})"},
+                },
+            ],
+        }
+        steps_path = temp_dir / "steps.json"
+        steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+        script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+        cmd = ["python", str(script_path), "--steps", str(steps_path), "--solution", str(temp_dir / "Solution.md"), "--jobs", "4", "--sympy-jobs", "2"]
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        assert proc.returncode == 0, proc.stderr
+        result = json.loads(proc.stdout)
+        assert [r["status"] for r in result["report"]] == ["failed", "passed", "skipped"]
+        assert result["report"][2]["detail"]["blocked_by"] == ["S1"]
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_reuses_cached_pass_results():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = pathlib.Path(temp_dir)
+        steps = {
+            "problem": "缓存",
+            "steps": [
+                {"id": "S1", "goal": "ok", "checker": {"type": "sympy", "code": "emit({'cache': 'S1'})"}},
+                {"id": "S2", "goal": "bad", "checker": {"type": "sympy", "code": "assert False, 'cache'"}},
+            ],
+        }
+        steps_path = temp_dir / "steps.json"
+        steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+        script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+        base = ["python", str(script_path), "--steps", str(steps_path), "--solution", str(temp_dir / "Solution.md")]
+        base += ["--cache-dir", str(temp_dir / "cache")]
+
+        def run(*extra):
+            proc = subprocess.run(base + list(extra), capture_output=True, text=True, check=False)
+            assert proc.returncode == 0, proc.stderr
+            return json.loads(proc.stdout)["report"]
+
+        first = run()
+        assert [(r["status"], r["cache"]) for r in first] == [("passed", "miss"), ("failed", "miss")]
+        second = run()
+        assert [(r["status"], r["cache"]) for r in second] == [("passed", "hit"), ("failed", "miss")]
+        assert second[0]["attempts"] == 0
+        assert second[0]["detail"] == first[0]["detail"]
+        strict = run("--no-cache")
+        assert "cache" not in strict[0] and strict[0]["attempts"] == 1
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_incremental_reuses_unchanged_steps():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = pathlib.Path(temp_dir)
+        run_dir = temp_dir / "run"
+        steps_path = temp_dir / "steps.json"
+        script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+
+        def run(s1_code, *extra):
+            steps = {
+                "problem": "增量复核",
+                "steps": [
+                    {"id": "S1", "goal": "a", "checker": {"type": "sympy", "code": s1_code}},
+                    {"id": "S2", "goal": "b", "checker": {"type": "sympy", "code": "emit({'step': 2})"}},
+                    {"id": "S3", "goal": "c", "depends_on": ["S1"], "checker": {"type": "sympy", "code": "emit({'step': 3})"}},
+                ],
+            }
+            steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+            cmd = ["python", str(script_path), "--steps", str(steps_path), "--run-dir", str(run_dir), "--cache-dir", str(temp_dir / "cache"), *extra]
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+            assert proc.returncode == 0, proc.stderr
+            return {r["id"]: r.get("incremental") for r in json.loads(proc.stdout)["report"]}
+
+        assert run("emit({'step': 1})", "--no-incremental") == {"S1": None, "S2": None, "S3": None}
+        manifest = json.loads((run_dir / "audit" / "audit.json").read_text(encoding="utf-8"))
+        assert set(manifest["steps"]) == {"S1", "S2", "S3"}
+        assert all(entry["hash"] for entry in manifest["steps"].values())
+
+        # 未改动：全部复用上次通过结果。
+        assert run("emit({'step': 1})") == {"S1": "reused", "S2": "reused", "S3": "reused"}
+        # 改动 S1：S1 与其下游 S3 重新复核，S2 仍复用。
+        assert run("emit({'step': 1, 'edited': True})") == {"S1": None, "S2": "reused", "S3": None}
+        assert run("emit({'step': 1, 'edited': True})", "--no-incremental") == {"S1": None, "S2": None, "S3": None}
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_deadline_marks_unrun_steps_budget_exhausted(tmp_path):
+    slow = {"type": "sympy", "code": "import time\ntime.sleep(30)"}
+    steps = {
+        "problem": "deadline",
+        "steps": [
+            {"id": "S1", "difficulty": "hard", "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+            {"id": "S2", "difficulty": "medium", "checker": slow},
+            {"id": "S3", "difficulty": "medium", "checker": slow},
+            {"id": "S4", "difficulty": "medium", "checker": slow},
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"),
+        "--no-cache", "--jobs", "1", "--deadline", "6",
+    ]
+    started = time.monotonic()
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    elapsed = time.monotonic() - started
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout)
+    assert [r["status"] for r in result["report"]] == ["passed"] + ["budget_exhausted"] * 3
+    assert result["status"] == "failed" and result["deadline"]["budget_exhausted"] == ["S2", "S3", "S4"]
+    assert result["report"][0]["budget_seconds"] > result["report"][1].get("budget_seconds", 0)
+    assert elapsed < 15
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_failure_first_uses_timing_history(tmp_path):
+    steps = {
+        "problem": "schedule",
+        "steps": [
+            {"id": "S1", "checker": {"type": "sympy", "code": "emit({'ok': 1})"}},
+            {"id": "S2", "checker": {"type": "sympy", "code": "emit({'ok': 2})"}},
+            {"id": "S3", "checker": {"type": "sympy", "code": "assert False"}},
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    history = tmp_path / "timings.json"
+
+    def run(name, *extra):
+        run_dir = tmp_path / name
+        cmd = [
+            "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+            "--run-dir", str(run_dir), "--no-cache", "--jobs", "1", "--timing-history", str(history), *extra,
+        ]
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        assert proc.returncode == 0, proc.stderr
+        events = [json.loads(ln) for ln in (run_dir / "logs" / "tool_calls.log").read_text(encoding="utf-8").splitlines()]
+        return [e["id"] for e in events if e.get("event") == "final_audit_step_timing"]
+
+    assert run("cold") == ["S1", "S2", "S3"]
+    entries = json.loads(history.read_text(encoding="utf-8"))["entries"]
+    assert sorted(e["failures"] for e in entries.values()) == [0, 0, 1]
+    assert run("warm", "--schedule", "failure-first")[0] == "S3"
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+@pytest.mark.parametrize("extra", [[], ["--exec-mode", "inprocess", "--sympy-executor", "pool"]])
+def test_final_audit_fail_fast_cancels_in_flight_and_reports_not_run(tmp_path, extra):
+    steps = {
+        "problem": "fail fast",
+        "steps": [
+            {"id": "S1", "checker": {"type": "sympy", "code": "assert False"}},
+            {"id": "S2", "checker": {"type": "sympy", "code": "import time\ntime.sleep(60)", "timeout": 120}},
+            {"id": "S3", "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"), "--no-cache",
+        "--jobs", "2", "--sympy-jobs", "2", "--schedule", "file", "--fail-fast", *extra,
+    ]
+    started = time.monotonic()
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr
+    assert time.monotonic() - started < 30
+    result = json.loads(proc.stdout)
+    assert result["status"] == "failed"
+    assert [r["status"] for r in result["report"]] == ["failed", "not_run", "not_run"]
+    assert result["report"][1]["detail"]["reason"] == "cancelled"
+    assert result["report"][2]["detail"]["reason"] == "fail_fast"
+    assert result["fail_fast"] == {"failed_step": "S1", "not_run": ["S2", "S3"]}
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_stream_emits_step_events_and_summary(tmp_path):
+    steps = {
+        "problem": "stream",
+        "steps": [
+            {"id": "S1", "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+            {"id": "S2", "checker": {"type": "sympy", "code": "assert False"}},
+            {"id": "S3", "depends_on": ["S2"], "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"), "--no-cache", "--jobs", "1",
+    ]
+    proc = subprocess.run([*cmd, "--stream"], capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr
+    events = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert [(e["event"], e.get("id")) for e in events] == [
+        ("audit_start", None),
+        ("step_start", "S1"),
+        ("step_finish", "S1"),
+        ("step_start", "S2"),
+        ("step_finish", "S2"),
+        ("step_finish", "S3"),
+        ("summary", None),
+    ]
+    assert [e["status"] for e in events if e["event"] == "step_finish"] == ["passed", "failed", "skipped"]
+    assert events[-2]["blocked_by"] == ["S2"]
+    summary = events[-1]
+    assert summary["status"] == "failed" and summary["failed"] == ["S2", "S3"]
+    assert json.loads(pathlib.Path(summary["manifest"]).read_text(encoding="utf-8"))["steps"]["S1"]["result"]["status"] == "passed"
+
+    stream_path = tmp_path / "progress.jsonl"
+    proc = subprocess.run([*cmd, "--stream", str(stream_path)], capture_output=True, text=True, check=False)
+    assert json.loads(proc.stdout)["status"] == "failed"
+    lines = stream_path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[-1])["event"] == "summary"
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_hybrid_counterexample_kills_pending_lean(tmp_path):
+    slow_lean = tmp_path / "slow_lean_runner.py"
+    slow_lean.write_text(
+        "import json, time\ntime.sleep(60)\nprint(json.dumps({'status': 'success', 'outputs': [{'goals': []}]}))\n",
+        encoding="utf-8",
+    )
+    fast_lean = tmp_path / "fast_lean_runner.py"
+    fast_lean.write_text("import json\nprint(json.dumps({'status': 'success', 'outputs': [{'goals': []}]}))\n", encoding="utf-8")
+    lean_part = {"cmds": ["theorem S1 : True := by trivial"]}
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+
+    def run(name, sympy_code, runner, *extra):
+        steps = {
+            "problem": "hybrid",
+            "steps": [{"id": "S1", "checker": {"type": "hybrid", "sympy": {"code": sympy_code}, "lean4": lean_part}}],
+        }
+        steps_path = tmp_path / f"{name}.json"
+        steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+        cmd = [
+            "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / f"{name}.md"),
+            "--run-dir", str(tmp_path / name), "--workspace-dir", str(tmp_path / "ws"), "--no-cache",
+            "--lean-runner", str(runner), *extra,
+        ]
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        assert proc.returncode == 0, proc.stderr
+        return json.loads(proc.stdout)["report"][0]
+
+    started = time.monotonic()
+    step = run("refuted", "assert 1 == 2", slow_lean, "--hybrid-policy", "lean")
+    assert time.monotonic() - started < 30
+    assert step["status"] == "failed"
+    assert step["detail"]["decided_by"] == "sympy"
+    assert step["detail"]["lean4"]["status"] == "cancelled"
+
+    step = run("passed", "emit({'ok': True})", fast_lean)
+    assert step["status"] == "passed"
+    assert step["detail"]["decided_by"] == "both"
+
+    started = time.monotonic()
+    step = run("lean-only", "import time\ntime.sleep(60)", fast_lean, "--hybrid-policy", "lean")
+    assert time.monotonic() - started < 30
+    assert step["status"] == "passed"
+    assert step["detail"]["decided_by"] == "lean4"
+    assert step["detail"]["sympy"]["status"] == "cancelled"
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_retries_only_transient_failures(tmp_path):
+    steps = {
+        "problem": "retries",
+        "steps": [
+            {"id": "S1", "checker": {"type": "sympy", "code": "assert 1 == 2", "retries": 3}},
+            {"id": "S2", "checker": {"type": "sympy", "code": "import time\ntime.sleep(30)", "timeout": 1, "retries": 1}},
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"), "--no-cache",
+        "--retry-backoff", "0.1",
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr
+    report = {r["id"]: r for r in json.loads(proc.stdout)["report"]}
+    assert (report["S1"]["attempts"], report["S1"]["failure_class"]) == (1, "deterministic")
+    assert (report["S2"]["attempts"], report["S2"]["failure_class"]) == (2, "transient")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_hybrid_out_of_budget_is_budget_exhausted(tmp_path):
+    slow_lean = tmp_path / "slow_lean_runner.py"
+    slow_lean.write_text("import time\ntime.sleep(60)\n", encoding="utf-8")
+    steps = {
+        "problem": "hybrid deadline",
+        "steps": [
+            {
+                "id": "S1",
+                "checker": {
+                    "type": "hybrid",
+                    "sympy": {"code": "import time\ntime.sleep(60)"},
+                    "lean4": {"cmds": ["theorem S1 : True := by trivial"]},
+                },
+            }
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"), "--no-cache",
+        "--lean-runner", str(slow_lean), "--deadline", "3", "--fail-fast",
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout)
+    step = result["report"][0]
+    assert step["status"] == "budget_exhausted"
+    assert "failure_class" not in step
+    assert "fail_fast" not in result
+
+
+@pytest.mark.parametrize("extra", [["--sympy-executor", "pool"], ["--exec-mode", "inprocess"]])
+def test_final_audit_custom_sympy_runner_is_never_bypassed(tmp_path, extra):
+    runner = tmp_path / "fake_sympy_runner.py"
+    runner.write_text(
+        "import json\nprint(json.dumps({'status': 'success', 'runner': 'custom', 'stdout': '', 'stderr': ''}))\n",
+        encoding="utf-8",
+    )
+    steps = {"problem": "runner", "steps": [{"id": "S1", "checker": {"type": "sympy", "code": "assert False"}}]}
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"), "--no-cache",
+        "--sympy-runner", str(runner), *extra,
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout)
+    assert result["status"] == "passed"
+    assert result["report"][0]["detail"]["runner"] == "custom"
+
+
+def test_final_audit_explicit_lean_jobs_respect_memory_budget(tmp_path):
+    steps = {"problem": "jobs", "steps": []}
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"), "--no-cache",
+        "--lean-jobs", "8", "--lean-worker-memory-mb", "1000", "--lean-memory-budget-mb", "2000",
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    assert "--lean-jobs 8" in proc.stderr and "降为 2" in proc.stderr
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+@pytest.mark.parametrize("extra", [[], ["--sympy-executor", "pool"], ["--exec-mode", "inprocess"]])
+def test_final_audit_missing_code_file_fails_only_that_step(tmp_path, extra):
+    steps = {
+        "problem": "code_file",
+        "steps": [
+            {"id": "S1", "checker": {"type": "sympy", "code_file": str(tmp_path / "missing.py")}},
+            {"id": "S2", "checker": {"type": "sympy", "code": "emit({'ok': True})"}},
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps, ensure_ascii=False), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python", str(script_path), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--run-dir", str(tmp_path / "run"), "--workspace-dir", str(tmp_path / "ws"), "--no-cache", *extra,
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout)
+    assert [r["status"] for r in result["report"]] == ["failed", "passed"]
+    assert result["report"][0]["failure_class"] != "transient"
@@ -0,0 +1,269 @@
+"""验证常驻 Lean4 REPL 会话与会话池。"""
+import importlib.util
+import json
+import os
+import pathlib
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lean_repl_client import LeanReplPool, LeanReplSession, close_sessions, run_payload
+from runtime.failure import TRANSIENT, classify_failure
+from runtime.resources import plan_workers, tree_usage
+
+
+def test_session_imports_header_once_and_reuses_env(fake_repl):
+    session = LeanReplSession(repl_cmd=fake_repl.cmd)
+    try:
+        first = session.run(["import Mathlib", "theorem S1 : True := by trivial"], timeout=10)
+        second = session.run(["theorem S2 : True := by trivial"], timeout=10)
+    finally:
+        session.close()
+
+    assert first["status"] == "success" and second["status"] == "success"
+    assert first["session"]["header_env"] == second["session"]["header_env"] == 0
+    assert first["outputs"][0]["base"] == 0 and second["outputs"][0]["base"] == 0
+    assert fake_repl.events() == ["start", "import"]
+
+
+def test_session_reports_lean_errors_and_recovers_from_timeout(fake_repl):
+    session = LeanReplSession(repl_cmd=fake_repl.cmd)
+    try:
+        bad = session.run(["theorem S1 : True := BAD"], timeout=10)
+        hung = session.run(["theorem S2 : True := SLEEP"], timeout=0.5)
+        again = session.run(["theorem S3 : True := by trivial"], timeout=10)
+    finally:
+        session.close()
+
+    assert bad["status"] == "error" and bad["error_type"] == "LeanError"
+    assert hung["status"] == "error" and hung["error_type"] == "Timeout"
+    assert again["status"] == "success" and again["session"]["restarted"] is True
+    assert fake_repl.events() == ["start", "import", "start", "import"]
+
+
+def test_session_chains_preamble_and_memoizes_step_headers(fake_repl):
+    session = LeanReplSession(repl_cmd=fake_repl.cmd, preamble="import Mathlib\n\nset_option autoImplicit false\n\nnamespace MathProve")
+    aux = "open Real\n\ndef helper : Nat := 1"
+    try:
+        first = session.run(["import Mathlib", aux, "theorem S1 : helper = 1 := rfl"], timeout=10)
+        second = session.run([aux, "theorem S2 : helper = 1 := rfl"], timeout=10)
+        plain = session.run(["theorem S3 : True := by trivial"], timeout=10)
+    finally:
+        session.close()
+
+    assert session.header == "import Mathlib"
+    assert [r["status"] for r in (first, second, plain)] == ["success"] * 3
+    # env 0 = import，env 1 = preamble，env 2 = 共享的 step header。
+    assert first["session"]["preamble_env"] == 1
+    assert first["session"]["step_header_reused"] is False
+    assert second["session"]["step_header_reused"] is True
+    assert first["session"]["step_env"] == second["session"]["step_env"] == 2
+    assert first["outputs"][0]["base"] == second["outputs"][0]["base"] == 2
+    assert "step_header" not in plain["session"] and plain["outputs"][0]["base"] == 1
+    assert fake_repl.events() == ["start", "import"]
+
+
+def test_session_failing_step_header_is_reported_and_not_memoized(fake_repl):
+    session = LeanReplSession(repl_cmd=fake_repl.cmd)
+    try:
+        bad = [session.run(["def helper : Nat := BAD", f"theorem {sid} : True := by trivial"], timeout=10) for sid in ("S1", "S2")]
+    finally:
+        session.close()
+
+    assert all(r["status"] == "error" and r["error_type"] == "LeanError" for r in bad)
+    assert bad[1]["session"]["step_header_reused"] is False
+
+
+def test_session_restores_pickled_env_instead_of_reimporting(fake_repl, tmp_path):
+    pickle_dir = tmp_path / "lean_env"
+    preamble = "set_option autoImplicit false\n\nnamespace MathProve"
+    results = []
+    for _ in range(2):
+        session = LeanReplSession(repl_cmd=fake_repl.cmd, preamble=preamble, pickle_dir=str(pickle_dir))
+        try:
+            results.append(session.run(["theorem S1 : True := by trivial"], timeout=10))
+        finally:
+            session.close()
+
+    assert [r["status"] for r in results] == ["success", "success"]
+    assert [r["session"]["restored"] for r in results] == [False, True]
+    assert results[1]["outputs"][0]["base"] == results[1]["session"]["header_env"] == 0
+    assert len(list(pickle_dir.glob("env_*.olean"))) == 1
+    assert not list(pickle_dir.glob("*.tmp.olean"))
+    assert fake_repl.events() == ["start", "import", "pickle", "start", "unpickle"]
+
+
+def test_run_payload_session_mode_shares_process(fake_repl):
+    try:
+        for sid in ("S1", "S2", "S3"):
+            result = run_payload([f"theorem {sid} : True := by trivial"], mode="session", repl_cmd=fake_repl.cmd, timeout=10)
+            assert result["status"] == "success"
+    finally:
+        close_sessions()
+    assert fake_repl.events().count("start") == 1
+
+
+def test_final_audit_session_mode_loads_header_once(fake_repl, tmp_path):
+    steps = {
+        "problem": "session",
+        "steps": [
+            {
+                "id": f"S{i}",
+                "goal": "lean",
+                "checker": {
+                    "type": "lean4",
+                    "cmds": ["import Mathlib", f"theorem S{i} : True := by trivial"],
+                    "repl_cmd": fake_repl.cmd,
+                },
+            }
+            for i in (1, 2, 3)
+        ],
+    }
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python",
+        str(script_path),
+        "--steps",
+        str(steps_path),
+        "--solution",
+        str(tmp_path / "Solution.md"),
+        "--lean-mode",
+        "session",
+        "--lean-pickle-dir",
+        str(tmp_path / "lean_env"),
+    ]
+    for run in ("run1", "run2"):
+        extra = ["--run-dir", str(tmp_path / run), "--cache-dir", str(tmp_path / run / "cache")]
+        proc = subprocess.run(cmd + extra, capture_output=True, text=True, check=False)
+        assert proc.returncode == 0, proc.stderr
+        result = json.loads(proc.stdout)
+        assert result["status"] == "passed"
+    # 第二次运行的新进程从 pickle 恢复起始 env，不再 import。
+    assert fake_repl.events() == ["start", "import", "pickle", "start", "unpickle"]
+
+
+def test_pool_dispatches_concurrent_steps_to_distinct_workers(fake_repl):
+    pool = LeanReplPool(repl_cmd=fake_repl.cmd, size=2)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(lambda sid: pool.run([f"theorem {sid} : True := DELAY"], timeout=10), ["S1", "S2"]))
+    finally:
+        pool.close()
+    assert all(r["status"] == "success" for r in results)
+    assert {r["session"]["worker"] for r in results} == {0, 1}
+    assert fake_repl.events().count("start") == 2
+
+
+def test_pool_queue_wait_counts_against_step_timeout(fake_repl):
+    pool = LeanReplPool(repl_cmd=fake_repl.cmd, size=1)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            busy = executor.submit(pool.run, ["theorem S1 : True := SLEEP"], 3)
+            while pool._idle:
+                time.sleep(0.01)
+            started = time.time()
+            queued = pool.run(["theorem S2 : True := by trivial"], timeout=0.5)
+            waited = time.time() - started
+            busy.result()
+    finally:
+        pool.close()
+    assert queued["status"] == "error" and queued["error_type"] == "Timeout"
+    assert classify_failure(queued) == TRANSIENT
+    assert waited < 2
+
+
+def test_plan_workers_respects_memory_budget():
+    assert plan_workers(8, memory_per_worker_mb=6000, memory_budget_mb=13000) == 2
+    assert plan_workers(8, memory_per_worker_mb=6000, memory_budget_mb=1000) == 1
+    assert plan_workers(4, memory_per_worker_mb=0) == 4
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_final_audit_parallel_lean_steps_keep_step_order(fake_repl, tmp_path):
+    steps = {
+        "problem": "parallel",
+        "steps": [
+            {
+                "id": f"S{i}",
+                "goal": "lean",
+                "checker": {"type": "lean4", "cmds": [f"theorem S{i} : True := DELAY"], "repl_cmd": fake_repl.cmd},
+            }
+            for i in range(1, 5)
+        ],
+    }
+    steps["steps"].insert(2, {"id": "S9", "goal": "sympy", "checker": {"type": "sympy", "code": "emit({'ok': True})"}})
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps), encoding="utf-8")
+    script_path = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        "python",
+        str(script_path),
+        "--steps",
+        str(steps_path),
+        "--solution",
+        str(tmp_path / "Solution.md"),
+        "--run-dir",
+        str(tmp_path / "run"),
+        "--lean-mode",
+        "session",
+        "--lean-workers",
+        "2",
+        "--lean-worker-memory-mb",
+        "0",
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout)
+    assert result["status"] == "passed"
+    assert [r["id"] for r in result["report"]] == ["S1", "S2", "S9", "S3", "S4"]
+    assert fake_repl.events().count("start") == 2
+
+
+def test_interactive_mode_stops_at_first_failure(fake_repl):
+    cmds = [
+        {"cmd": "theorem S1 : True := trivial"},
+        '{"cmd": "theorem S2 : True := BAD"}',
+        {"cmd": "import Mathlib"},
+    ]
+    result = run_payload(cmds, mode="interactive", repl_cmd=fake_repl.cmd, timeout=10)
+    assert result["status"] == "error" and result["error_type"] == "LeanError"
+    assert result["failed_index"] == 1 and result["skipped"] == 1
+    assert len(result["outputs"]) == 2
+    # 第三条命令（含 import）从未发送。
+    assert fake_repl.events() == ["start"]
+
+    ok = run_payload(["theorem S1 : True := trivial", "theorem S2 : True := trivial"], mode="interactive", repl_cmd=fake_repl.cmd)
+    assert ok["status"] == "success" and len(ok["outputs"]) == 2
+
+    hung = run_payload(
+        ["theorem S1 : True := trivial", "theorem S2 : True := SLEEP", "theorem S3 : True := trivial"],
+        mode="interactive",
+        repl_cmd=fake_repl.cmd,
+        timeout=1,
+    )
+    assert hung["error_type"] == "Timeout"
+    assert hung["failed_index"] == 1 and hung["skipped"] == 1
+
+
+@pytest.mark.skipif(tree_usage(os.getpid()) is None, reason="无法采样进程资源")
+def test_session_records_resources_and_restarts_over_memory_budget(fake_repl):
+    session = LeanReplSession(repl_cmd=fake_repl.cmd)
+    try:
+        ok = session.run(["theorem S1 : True := by trivial"], timeout=10)
+        assert ok["status"] == "success"
+        assert ok["resources"]["peak_rss_mb"] > 0 and ok["resources"]["limit_exceeded"] is None
+
+        session.limits = {"memory_limit_mb": 1}
+        over = session.run(["theorem S2 : True := by trivial"], timeout=10)
+        assert over["error_type"] == "ResourceLimit" and over["resources"]["limit_exceeded"] == "memory"
+
+        session.limits = {}
+        again = session.run(["theorem S3 : True := by trivial"], timeout=10)
+        assert again["status"] == "success"
+    finally:
+        session.close()
+    assert fake_repl.events() == ["start", "import", "start", "import"]
@@ -0,0 +1,52 @@
+"""验证内容寻址结果缓存的读写与 LRU 淘汰。"""
+import os
+import time
+
+from runtime.result_cache import ResultCache, fingerprint
+
+
+def test_fingerprint_is_stable_and_sensitive():
+    assert fingerprint("sympy", {"a": 1, "b": 2}) == fingerprint("sympy", {"b": 2, "a": 1})
+    assert fingerprint("ab", "c") != fingerprint("a", "bc")
+
+
+def test_result_cache_roundtrip_and_lru_eviction(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10**6)
+    keys = [fingerprint("k", i) for i in range(3)]
+    for key in keys:
+        cache.put(key, {"status": "success", "pad": "x" * 200})
+    assert cache.get(keys[0]) == {"status": "success", "pad": "x" * 200}
+    assert cache.get(fingerprint("missing")) is None
+
+    # Age the entries, then touch keys[0] via a hit so keys[1] becomes the LRU victim.
+    now = time.time()
+    for i, key in enumerate(keys):
+        os.utime(cache._path(key), (now - 100 + i, now - 100 + i))
+    cache.get(keys[0])
+    cache.max_bytes = sum(cache._path(k).stat().st_size for k in (keys[0], keys[2]))
+    assert cache.evict() == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+
+def test_result_cache_put_leaves_no_temp_file_on_unserialisable_result(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10**6)
+    key = fingerprint("bad")
+    cache.put(key, {"status": "success", "value": object()})
+    assert cache.get(key) is None
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_result_cache_put_scans_only_when_over_the_limit(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path, max_bytes=10**6)
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, "entries", lambda: scans.append(1) or entries())
+    for i in range(20):
+        cache.put(fingerprint("k", i), {"status": "success"})
+    assert len(scans) == 1  # initial size only
+
+    cache.max_bytes = cache.size() + 50
+    scans.clear()
+    cache.put(fingerprint("big"), {"status": "success", "pad": "x" * 200})
+    assert len(scans) == 1 and cache.size() <= cache.max_bytes
@@ -0,0 +1,205 @@
+"""验证 Python 版 reverse gate：有界流式输出、超时与 lint。"""
+import os
+import pathlib
+import sys
+
+import pytest
+
+from check_reverse_lean4 import run_gate, stream_process
+
+_GATE = """import Mathlib
+
+-- RIGOR_STEP_MAP
+-- S1: trivial
+
+namespace MathProve
+
+theorem S1 : True := by
+  trivial
+
+end MathProve
+"""
+
+
+def test_stream_process_bounds_large_output():
+    code = "import sys\nfor _ in range(64):\n    sys.stdout.write('x' * 16384 + '\\n')\nprint('END')"
+    run = stream_process([sys.executable, "-c", code], cwd=None, timeout=30, max_output_bytes=1024)
+    assert run["returncode"] == 0 and run["timeout"] is None
+    assert run["output_bytes"] > 64 * 16384
+    assert len(run["output"]) < 2048
+    assert run["output"].rstrip().endswith("END")
+
+
+def test_stream_process_enforces_no_output_and_total_timeouts():
+    silent = stream_process([sys.executable, "-c", "import time; time.sleep(30)"], None, timeout=30, no_output_timeout=0.3)
+    assert silent["timeout"] == "no_output" and silent["seconds"] < 10
+
+    chatty = "import time\nwhile True:\n    print('tick', flush=True)\n    time.sleep(0.05)"
+    busy = stream_process([sys.executable, "-c", chatty], None, timeout=0.5, no_output_timeout=0.3)
+    assert busy["timeout"] == "total" and busy["seconds"] < 10
+
+
+def test_run_gate_reports_lint_issues(tmp_path):
+    gate = tmp_path / "reverse_gate.lean"
+    gate.write_text(_GATE.replace("-- RIGOR_STEP_MAP\n-- S1: trivial\n", ""), encoding="utf-8")
+    ok, detail = run_gate(str(gate), require_step_map=True)
+    assert not ok
+    assert detail["stage"] == "lint"
+    assert detail["issues"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="fake lake is a POSIX script")
+def test_run_gate_compiles_with_lake_env_lean(tmp_path):
+    project = tmp_path / "proj"
+    project.mkdir()
+    (project / "lakefile.lean").write_text("-- fake\n", encoding="utf-8")
+    gate = project / "reverse_gate.lean"
+    gate.write_text(_GATE, encoding="utf-8")
+    fake_lake = tmp_path / "lake"
+    fake_lake.write_text(f"#!{sys.executable}\nimport sys\nprint('compiled', *sys.argv[1:])\n", encoding="utf-8")
+    fake_lake.chmod(0o755)
+
+    ok, detail = run_gate(str(gate), project_dir=str(project), require_mathlib=True, require_step_map=True, lake_path=str(fake_lake))
+    assert ok, detail
+    assert detail["mode"] == "lake_env_lean"
+    assert detail["output"].startswith("compiled env lean")
+
+    fake_lake.write_text(f"#!{sys.executable}\nimport sys\nprint('error: boom')\nsys.exit(1)\n", encoding="utf-8")
+    ok, detail = run_gate(str(gate), project_dir=str(project), require_mathlib=True, lake_path=str(fake_lake))
+    assert not ok and detail["stage"] == "compile" and "boom" in detail["output"]
+
+
+def _lean_step(n, goal="trivial"):
+    return {
+        "id": f"S{n}",
+        "goal": goal,
+        "checker": {"type": "lean4", "cmds": [f"theorem S{n} : True := by trivial"], "mode": "file", "file_cmd": "true"},
+    }
+
+
+@pytest.mark.skipif(os.name == "nt", reason="fake lake is a POSIX script")
+def test_final_audit_module_layout_builds_with_lake(tmp_path):
+    import json
+    import subprocess
+
+    project = tmp_path / "proj"
+    project.mkdir()
+    lakefile = project / "lakefile.lean"
+    lakefile.write_text("import Lake\nopen Lake DSL\n\npackage demo\n", encoding="utf-8")
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    record = tmp_path / "lake_calls.json"
+    fake_lake = bindir / "lake"
+    fake_lake.write_text(
+        f"#!{sys.executable}\n"
+        "import json, os, pathlib, sys\n"
+        "src = pathlib.Path('.mathprove_gate')\n"
+        f"pathlib.Path({str(record)!r}).write_text(json.dumps({{\n"
+        "    'argv': sys.argv[1:],\n"
+        "    'lakefile': pathlib.Path('lakefile.lean').read_text(),\n"
+        "    'modules': sorted(str(p.relative_to(src)) for p in src.rglob('*.lean')),\n"
+        "    'root': (src / 'MathProve.lean').read_text(),\n"
+        "}))\n"
+        "print('Build completed successfully.')\n",
+        encoding="utf-8",
+    )
+    fake_lake.chmod(0o755)
+
+    steps = {"problem": "modules", "steps": [_lean_step(1), {"id": "S2", "goal": "sympy", "checker": {"type": "sympy", "code": "emit(1)"}}, _lean_step(3)]}
+    steps_path = tmp_path / "steps.json"
+    steps_path.write_text(json.dumps(steps), encoding="utf-8")
+    script = pathlib.Path(__file__).resolve().parents[1] / "scripts" / "final_audit.py"
+    cmd = [
+        sys.executable, str(script), "--steps", str(steps_path), "--solution", str(tmp_path / "Solution.md"),
+        "--lean-cwd", str(project), "--lean-gate", "--lean-gate-layout", "modules", "--no-cache",
+    ]
+    env = dict(os.environ, PATH=f"{bindir}{os.pathsep}{os.environ.get('PATH', '')}")
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False, env=env)
+    assert proc.returncode == 0, proc.stderr
+    gate = json.loads(proc.stdout)["reverse_gate"]
+    assert gate["status"] == "passed", gate
+    assert gate["detail"]["mode"] == "lake_build"
+
+    calls = json.loads(record.read_text(encoding="utf-8"))
+    assert calls["argv"] == ["build", "MathProve"]
+    assert "lean_lib MathProve" in calls["lakefile"] and 'srcDir := ".mathprove_gate"' in calls["lakefile"]
+    assert calls["modules"] == ["MathProve.lean", "MathProve/Preamble.lean", "MathProve/S1.lean", "MathProve/S3.lean"]
+    # The user's project is left as it was: lakefile restored, generated sources removed.
+    assert lakefile.read_text(encoding="utf-8") == "import Lake\nopen Lake DSL\n\npackage demo\n"
+    assert not (project / ".mathprove_gate").exists()
+    assert sorted(p.name for p in project.iterdir()) == ["lakefile.lean"]
+    root = calls["root"]
+    assert "-- S2: sympy" in root and "import MathProve.S3" in root and "import MathProve.S2" not in root
+
+
+def test_module_gate_lint_catches_mismatched_step_module(tmp_path):
+    from check_reverse_lean4 import run_module_gate
+
+    src = tmp_path / ".mathprove_gate"
+    (src / "MathProve").mkdir(parents=True)
+    (src / "MathProve.lean").write_text("-- RIGOR_STEP_MAP\n-- S1: a\nimport MathProve.S1\n", encoding="utf-8")
+    (src / "MathProve" / "Preamble.lean").write_text("import Mathlib\n", encoding="utf-8")
+    (src / "MathProve" / "S1.lean").write_text("import MathProve.Preamble\ntheorem S2 : True := trivial\n", encoding="utf-8")
+    modules = [src / "MathProve.lean", src / "MathProve" / "Preamble.lean", src / "MathProve" / "S1.lean"]
+    ok, detail = run_module_gate(str(tmp_path), str(src), [str(m) for m in modules])
+    assert not ok and detail["stage"] == "lint"
+    assert "MODULE_STEP_MISMATCH" in {i["code"] for i in detail["issues"]}
+
+
+def test_module_layout_imports_used_steps_and_repeats_scoped_commands(tmp_path):
+    from final_audit import _generate_reverse_gate_modules
+
+    template = tmp_path / "template.lean"
+    template.write_text(
+        "import Mathlib\n\nset_option autoImplicit false\nopen Real\n\n-- RIGOR_STEP_MAP\n\n"
+        "namespace MathProve\n\nvariable (n : Nat)\nopen Finset\n\ndef helper : Nat := 1\n\nend MathProve\n",
+        encoding="utf-8",
+    )
+
+    def lean(n, code, **extra):
+        return {"id": f"S{n}", "goal": f"g{n}", "checker": {"type": "lean4", "cmds": [code]}, **extra}
+
+    steps = [
+        lean(1, "theorem S1 : True := trivial"),
+        {"id": "S2", "goal": "sympy", "depends_on": ["S1"], "checker": {"type": "sympy", "code": "emit(1)"}},
+        lean(3, "theorem S3 : True := trivial", depends_on=["S2"]),
+        lean(4, "theorem S4 : True := S1 -- not S3"),
+    ]
+    ok, msg, modules = _generate_reverse_gate_modules(steps, tmp_path / "gate", template)
+    assert ok, msg
+    text = {m.stem: m.read_text(encoding="utf-8") for m in modules}
+    assert "import MathProve.S1" in text["S3"] and "import MathProve.S1" in text["S4"]
+    assert "import MathProve.S3" not in text["S4"] and "import MathProve.S" not in text["S1"]
+    for name in ("S1", "S3", "S4"):
+        assert "open Real" in text[name] and "set_option autoImplicit false" in text[name]
+        body = text[name].split("namespace MathProve", 1)[1]
+        assert "variable (n : Nat)" in body and "open Finset" in body and "def helper" not in body
+    assert text["Preamble"].count("def helper") == 1
+
+
+@pytest.mark.skipif(os.name == "nt", reason="fake lake is a POSIX script")
+def test_module_gate_recovers_lakefile_left_by_a_killed_gate(tmp_path):
+    from check_reverse_lean4 import _gate_state, run_module_gate
+
+    project = tmp_path / "proj"
+    src = project / ".mathprove_gate"
+    (src / "MathProve").mkdir(parents=True)
+    (src / "MathProve.lean").write_text("import Mathlib\n-- RIGOR_STEP_MAP\n-- S1: a\nimport MathProve.S1\n", encoding="utf-8")
+    (src / "MathProve" / "Preamble.lean").write_text("import Mathlib\n", encoding="utf-8")
+    (src / "MathProve" / "S1.lean").write_text("import MathProve.Preamble\ntheorem S1 : True := trivial\n", encoding="utf-8")
+    lakefile = project / "lakefile.lean"
+    original = "import Lake\nopen Lake DSL\n\npackage demo\n"
+    # State after a SIGKILL mid-build: target still appended, original only in the backup.
+    lakefile.write_text(original + "\n-- MATHPROVE_GATE_TARGET\nlean_lib MathProve where\n", encoding="utf-8")
+    backup = _gate_state(project.resolve(), ".lakefile")
+    backup.write_text(original, encoding="utf-8")
+    fake_lake = tmp_path / "lake"
+    fake_lake.write_text(f"#!{sys.executable}\nimport pathlib\nprint(pathlib.Path('lakefile.lean').read_text().count('MATHPROVE_GATE_TARGET'))\n", encoding="utf-8")
+    fake_lake.chmod(0o755)
+
+    modules = [src / "MathProve.lean", src / "MathProve" / "Preamble.lean", src / "MathProve" / "S1.lean"]
+    ok, detail = run_module_gate(str(project), str(src), [str(m) for m in modules], lake_path=str(fake_lake), cleanup_src=True)
+    assert ok, detail
+    assert detail["output"].strip() == "1"  # one fresh target, not the stale one plus another
+    assert lakefile.read_text(encoding="utf-8") == original
+    assert not backup.exists() and not src.exists()
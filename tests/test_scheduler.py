@@ -0,0 +1,106 @@
+"""验证依赖感知的并发调度器。"""
+import threading
+import time
+
+from runtime.scheduler import run_dag
+
+
+def _skip(item, blockers, reason):
+    return {"id": item["id"], "status": "skipped", "reason": reason, "blocked_by": blockers}
+
+
+def _schedule(items, run, **kwargs):
+    return run_dag(
+        items,
+        run,
+        key=lambda it: it["id"],
+        deps=lambda it: it.get("depends_on", []),
+        engine=lambda it: it.get("engine", "sympy"),
+        skip=_skip,
+        **kwargs,
+    )
+
+
+def test_dependencies_run_after_upstream_and_failures_propagate():
+    finished = []
+
+    def run(item):
+        finished.append(item["id"])
+        return {"id": item["id"], "status": "failed" if item["id"] == "S2" else "passed"}
+
+    items = [
+        {"id": "S3", "depends_on": ["S1"]},
+        {"id": "S1"},
+        {"id": "S2"},
+        {"id": "S4", "depends_on": ["S2"]},
+        {"id": "S5", "depends_on": ["S4"]},
+        {"id": "S6", "depends_on": ["S9"]},
+    ]
+    results = _schedule(items, run, jobs=1)
+
+    assert [r["id"] for r in results] == ["S3", "S1", "S2", "S4", "S5", "S6"]
+    assert finished.index("S1") < finished.index("S3")
+    by_id = {r["id"]: r for r in results}
+    assert by_id["S3"]["status"] == "passed"
+    assert by_id["S4"]["reason"] == "dependency_failed" and by_id["S4"]["blocked_by"] == ["S2"]
+    assert by_id["S5"]["reason"] == "dependency_failed"
+    assert by_id["S6"]["reason"] == "unknown_dependency"
+
+
+def test_cycles_are_reported_not_deadlocked():
+    items = [{"id": "S1", "depends_on": ["S2"]}, {"id": "S2", "depends_on": ["S1"]}, {"id": "S3"}]
+    results = _schedule(items, lambda it: {"id": it["id"], "status": "passed"}, jobs=2)
+    assert [r["status"] for r in results] == ["skipped", "skipped", "passed"]
+    assert results[0]["reason"] == "dependency_cycle"
+
+
+def test_engine_caps_and_parallel_wall_clock():
+    lock = threading.Lock()
+    active = {"sympy": 0, "lean4": 0}
+    peak = {"sympy": 0, "lean4": 0}
+
+    def run(item):
+        eng = item["engine"]
+        with lock:
+            active[eng] += 1
+            peak[eng] = max(peak[eng], active[eng])
+        time.sleep(0.2)
+        with lock:
+            active[eng] -= 1
+        return {"id": item["id"], "status": "passed"}
+
+    items = [{"id": f"S{i}", "engine": "lean4" if i % 2 else "sympy"} for i in range(1, 9)]
+    start = time.time()
+    results = _schedule(items, run, jobs=8, limits={"sympy": 4, "lean4": 2})
+    elapsed = time.time() - start
+
+    assert all(r["status"] == "passed" for r in results)
+    assert peak == {"sympy": 4, "lean4": 2}
+    assert elapsed < 0.2 * 8 / 2
+
+
+def test_expired_budget_stops_scheduling_new_items():
+    items = [{"id": f"S{i}"} for i in range(4)]
+    started = []
+
+    def run(item):
+        started.append(item["id"])
+        return {"id": item["id"], "status": "passed"}
+
+    report = _schedule(items, run, jobs=1, stop=lambda: "budget_exhausted" if len(started) >= 2 else None)
+    assert started == ["S0", "S1"]
+    assert [r["status"] for r in report] == ["passed", "passed", "skipped", "skipped"]
+    assert {r["reason"] for r in report[2:]} == {"budget_exhausted"}
+
+
+def test_priority_orders_ready_items_but_not_results():
+    items = [{"id": "slow", "cost": 3}, {"id": "fast", "cost": 1}, {"id": "mid", "cost": 2}]
+    started = []
+
+    def run(item):
+        started.append(item["id"])
+        return {"id": item["id"], "status": "passed"}
+
+    report = _schedule(items, run, jobs=1, priority=lambda it: it["cost"])
+    assert started == ["fast", "mid", "slow"]
+    assert [r["id"] for r in report] == ["slow", "fast", "mid"]
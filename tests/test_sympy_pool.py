@@ -0,0 +1,57 @@
+"""验证常驻 SymPy worker 池与 verify_sympy 的 pool 模式。"""
+import importlib.util
+
+import pytest
+
+from runtime.sympy_pool import SympyWorkerPool
+
+pytestmark = pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+
+
+def test_pool_runs_snippets_in_fresh_namespace():
+    with SympyWorkerPool(size=1) as pool:
+        first = pool.run("leak = 1\nprint('a')\n", timeout=30)
+        second = pool.run("print('leak' in globals())\n", timeout=30)
+    assert first.returncode == 0 and first.stdout.strip() == "a"
+    assert second.returncode == 0 and second.stdout.strip() == "False"
+
+
+def test_pool_timeout_replaces_worker():
+    import subprocess
+
+    with SympyWorkerPool(size=1) as pool:
+        pool.run("pass\n", timeout=30)
+        with pytest.raises(subprocess.TimeoutExpired):
+            pool.run("import time\ntime.sleep(5)\n", timeout=0.5)
+        after = pool.run("print('alive')\n", timeout=30)
+    assert after.stdout.strip() == "alive"
+
+
+def test_run_code_pool_matches_subprocess_contract():
+    import verify_sympy
+    from runtime_paths import assets_dir
+
+    template = str(assets_dir() / "sympy_template.py")
+    ok_code = "a, b = symbols('a b')\nemit({'verified': expand((a + b)**2) == a**2 + 2*a*b + b**2})"
+    with SympyWorkerPool(size=1) as pool:
+        pooled = verify_sympy.run_code(ok_code, template_path=template, timeout=30, pool=pool)
+        failed = verify_sympy.run_code("assert False", template_path=template, timeout=30, pool=pool)
+    plain = verify_sympy.run_code(ok_code, template_path=template, timeout=30)
+
+    assert pooled["status"] == plain["status"] == "success"
+    assert pooled["output"] == plain["output"] == {"verified": True}
+    assert failed["status"] == "error"
+    assert "AssertionError" in failed["stderr"]
+
+
+def test_pool_enforces_cpu_budget_and_reports_usage():
+    import verify_sympy
+
+    limits = {"cpu_limit_seconds": 0.5}
+    with SympyWorkerPool(size=1) as pool:
+        busy = verify_sympy.run_code("while True:\n    pass\n", timeout=30, pool=pool, limits=limits)
+        after = verify_sympy.run_code("print(sum(range(10**6)))\n", timeout=30, pool=pool, limits=limits)
+    if busy["status"] == "error" and busy["error_type"] == "Timeout":
+        pytest.skip("无法采样进程资源")
+    assert busy["error_type"] == "ResourceLimit" and busy["resources"]["limit_exceeded"] == "cpu"
+    assert after["status"] == "success" and after["resources"]["peak_rss_mb"] > 0
@@ -0,0 +1,87 @@
+"""验证多阶段等价判定：随机数值点 → 精确规范化 → 限时 simplify。"""
+import importlib.util
+
+import pytest
+
+pytestmark = pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+
+
+def test_numeric_stage_rejects_with_counterexample():
+    from runtime.sympy_verifier import verify
+
+    result = verify("(x+1)**2", "x**2+1")
+    assert result["status"] == "not_equal"
+    assert result["stage"] == "numeric" and result["confidence"] == "high"
+    assert set(result["counterexample"]) == {"x"}
+
+
+def test_exact_and_simplify_stages_prove_equivalence():
+    from runtime.sympy_verifier import verify
+
+    assert verify("(x**3-1)/(x-1)", "x**2+x+1")["stage"] == "exact"
+    result = verify("sin(x)**2+cos(x)**2", "1")
+    assert (result["status"], result["stage"], result["confidence"]) == ("verified", "simplify", "exact")
+
+
+def test_numeric_only_verdict_when_simplify_runs_out_of_time():
+    from runtime.sympy_verifier import verify
+
+    result = verify("sin(x)**2+cos(x)**2", "1", simplify_timeout=0)
+    assert (result["status"], result["stage"]) == ("verified", "numeric")
+    assert result["confidence"] == "high" and result["samples"] == 64
+
+
+@pytest.mark.parametrize(
+    "lhs, rhs, status, stage",
+    [
+        ("x", "x+10**-12", "not_equal", "exact"),
+        ("x", "x+1e-12", "not_equal", "exact"),
+        ("sin(x)", "sin(x)+cos(x)/10**12", "unknown", "simplify"),
+        ("exp(x)", "exp(x)+exp(x)/10**11", "unknown", "simplify"),
+    ],
+)
+def test_small_perturbations_are_never_numerically_verified(lhs, rhs, status, stage):
+    from runtime.sympy_verifier import verify
+
+    result = verify(lhs, rhs)
+    assert (result["status"], result["stage"]) == (status, stage)
+
+
+def test_symbol_free_differences_are_decided_exactly():
+    from runtime.sympy_verifier import verify
+
+    assert verify("sqrt(8)", "2*sqrt(2)")["status"] == "verified"
+    result = verify("pi", "pi+10**-30")
+    assert (result["status"], result["stage"]) == ("not_equal", "exact")
+
+
+def test_mpmath_fallback_without_numpy(monkeypatch):
+    from runtime import sympy_verifier
+
+    monkeypatch.setattr(sympy_verifier, "np", None)
+    result = sympy_verifier.verify("tan(x)", "sin(x)/cos(x)*(1+y-y)+x")
+    assert result["status"] == "not_equal" and result["stage"] == "numeric"
+    assert result["samples"] == sympy_verifier._MPMATH_SAMPLES
+
+
+@pytest.mark.parametrize("lhs, rhs", [("floor(x)", "x"), ("ceiling(x)", "x+1")])
+def test_counterexamples_for_functions_that_need_sympy_numbers(lhs, rhs):
+    from runtime.sympy_verifier import verify
+
+    result = verify(lhs, rhs)
+    assert (result["status"], result["stage"]) == ("not_equal", "numeric")
+
+
+def test_simplify_worker_is_reused_and_replaced_after_timeout():
+    from runtime import sympy_verifier
+    from sympy import sympify
+
+    diff = sympify("sin(x)**2+cos(x)**2-1")
+    assert sympy_verifier._simplify_within(diff, 30) == 0
+    worker = sympy_verifier._idle_workers[-1]
+    assert sympy_verifier._simplify_within(diff, 30) == 0
+    assert sympy_verifier._idle_workers[-1] is worker
+
+    assert sympy_verifier._simplify_within(sympify("(sin(x)**8+cos(x)**8)**6-1"), 1e-6) is None
+    assert not worker.proc.is_alive() and worker not in sympy_verifier._idle_workers
+    assert sympy_verifier._simplify_within(diff, 30) == 0
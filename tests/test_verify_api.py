@@ -0,0 +1,57 @@
+"""验证异步 Python API：并发共享池、取消与 deadline。"""
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+
+import pytest
+
+from lean_repl_client import close_sessions
+from verify_api import verify_lean, verify_sympy
+
+
+@pytest.mark.skipif(importlib.util.find_spec("sympy") is None, reason="未安装 sympy")
+def test_concurrent_sympy_calls_share_pool():
+    async def main():
+        return await asyncio.gather(*(verify_sympy(f"emit({{'n': {i}}})", pool_size=2) for i in range(4)))
+
+    results = asyncio.run(main())
+    assert [r["output"] for r in results] == [{"n": i} for i in range(4)]
+
+
+def test_cancel_kills_file_mode_process(tmp_path):
+    pid_file = tmp_path / "pid"
+    code = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)"
+    file_cmd = f'"{sys.executable}" -c "{code}"'
+
+    async def main():
+        task = asyncio.ensure_future(verify_lean(["theorem S1 : True := trivial"], mode="file", file_cmd=file_cmd, timeout=60))
+        while not pid_file.exists():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    pid = int(pid_file.read_text())
+    with pytest.raises(OSError):
+        os.kill(pid, 0)
+
+
+def test_deadline_bounds_session_call(fake_repl):
+    async def main():
+        started = time.monotonic()
+        result = await verify_lean(
+            ["theorem S1 : True := SLEEP"], mode="session", repl_cmd=fake_repl.cmd, deadline=started + 0.5
+        )
+        return result, time.monotonic() - started
+
+    try:
+        result, elapsed = asyncio.run(main())
+        expired = asyncio.run(verify_lean(["theorem S2 : True := trivial"], mode="session", repl_cmd=fake_repl.cmd, deadline=0))
+    finally:
+        close_sessions()
+    assert result["status"] == "error" and result["error_type"] == "Timeout"
+    assert elapsed < 5
+    assert expired["error_type"] == "Timeout"
@@ -1,5 +1,12 @@
+import os
+import signal
+import subprocess
 import sys
+import time
 
+from lean_repl_client import _run_file_mode
+from runtime.resources import tree_usage
+from runtime.supervisor import run_supervised
 from runtime.watchdog import run_watchdog
 
 
@@ -11,3 +18,89 @@ def test_watchdog_allows_output():
 def test_watchdog_times_out_on_silence():
     rc = run_watchdog([sys.executable, "-c", "import time; time.sleep(0.2)"], cwd=None, timeout_no_output=0.05)
     assert rc in {124, 125}
+
+
+def test_supervisor_terminates_without_fixed_grace_sleep():
+    result = run_supervised([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.3, grace=5)
+    assert result["timeout"] == "total" and result["killed"] == "terminate"
+    assert result["kill_seconds"] < 2 and result["seconds"] < 3
+
+
+def test_supervisor_escalates_to_kill_after_grace():
+    code = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print('ready', flush=True); time.sleep(30)"
+    result = run_supervised([sys.executable, "-c", code], no_output_timeout=0.5, grace=0.3)
+    assert result["timeout"] == "no_output" and result["killed"] == "kill"
+    assert 0.3 <= result["kill_seconds"] < 3
+    assert "ready" in result["output"]
+
+
+def test_file_mode_reports_kill_duration():
+    file_cmd = f'"{sys.executable}" -c "import time; time.sleep(30)"'
+    result = _run_file_mode(["theorem S1 : True := trivial"], file_cmd=file_cmd, timeout=0.3)
+    assert result["error_type"] == "Timeout"
+    assert result["killed"] == "terminate" and result["kill_seconds"] is not None
+
+
+def test_supervisor_spills_full_output_and_bounds_memory(tmp_path):
+    log = tmp_path / "logs" / "out.log"
+    code = "import sys; sys.stdout.write('A' * 5000 + 'x' * 200000 + 'Z' * 5000)"
+    result = run_supervised([sys.executable, "-c", code], max_output_bytes=4096, output_log=str(log))
+    assert result["returncode"] == 0
+    assert result["output_bytes"] == 210000 and result["output_truncated"] is True
+    assert len(result["output"]) < 8192
+    assert result["output"].startswith("A") and result["output"].rstrip().endswith("Z")
+    assert "bytes omitted" in result["output"] and str(log) in result["output"]
+    assert log.read_text().count("x") == 200000
+
+
+def test_file_mode_writes_output_log(tmp_path):
+    log = tmp_path / "lean_S1.log"
+    file_cmd = f'"{sys.executable}" -c "print(\'line\\n\' * 2000)"'
+    result = _run_file_mode(["theorem S1 : True := trivial"], file_cmd=file_cmd, timeout=10, output_log=str(log), max_output_bytes=256)
+    assert result["output_log"] == str(log) and result["output_truncated"] is True
+    assert log.read_text().count("line") == 2000
+
+
+def test_supervisor_kills_tree_over_memory_budget():
+    # The allocation happens in a grandchild: the budget covers the whole process tree.
+    inner = "x = bytearray(300 * 2**20); import time; time.sleep(30)"
+    code = f"import subprocess, sys; subprocess.run([sys.executable, '-c', {inner!r}])"
+    result = run_supervised([sys.executable, "-c", code], timeout=20, memory_limit_mb=150)
+    if result["resources"]["peak_rss_mb"] == 0:
+        return  # no /proc and no psutil: nothing to sample
+    assert result["limit_exceeded"] == "memory" and result["timeout"] is None
+    assert result["resources"]["peak_rss_mb"] > 150 and result["seconds"] < 10
+
+
+def test_supervisor_samples_only_when_asked():
+    code = "x = bytearray(50 * 2**20); import time; time.sleep(0.5)"
+    plain = run_supervised([sys.executable, "-c", code], timeout=20)
+    assert plain["resources"]["peak_rss_mb"] == 0 and plain["resources"]["wall_seconds"] > 0
+    recorded = run_supervised([sys.executable, "-c", code], timeout=20, record_usage=True)
+    if tree_usage(os.getpid()) is not None:
+        assert recorded["resources"]["peak_rss_mb"] > 40
+
+
+def test_tree_usage_covers_only_the_supervised_tree():
+    if tree_usage(os.getpid()) is None:
+        return  # no /proc and no psutil: nothing to sample
+    inner = "x = bytearray(80 * 2**20); import time; time.sleep(30)"
+    code = f"import subprocess, sys; subprocess.run([sys.executable, '-c', {inner!r}])"
+    outside = subprocess.Popen([sys.executable, "-c", "x = bytearray(200 * 2**20); import time; time.sleep(30)"])
+    tree = subprocess.Popen([sys.executable, "-c", code], start_new_session=True)
+    try:
+        time.sleep(1.5)
+        usage = tree_usage(tree.pid)
+        assert 80 * 2**20 < usage["rss"] < 200 * 2**20
+    finally:
+        os.killpg(tree.pid, signal.SIGKILL)
+        outside.kill()
+        for proc in (outside, tree):
+            proc.wait()
+
+
+def test_watchdog_maps_signal_deaths_to_shell_exit_codes():
+    code = "import os, signal; os.kill(os.getpid(), signal.SIGTERM)"
+    rc = run_watchdog([sys.executable, "-c", code], cwd=None, timeout_no_output=5)
+    assert rc == 128 + signal.SIGTERM
+    assert run_watchdog([sys.executable, "-c", "raise SystemExit(3)"], cwd=None, timeout_no_output=5) == 3
@@ -14,3 +14,52 @@ def test_ephemeral_workspace_copies_and_cleans(tmp_path):
         temp_dir = pathlib.Path(ws.temp_dir)
 
     assert not temp_dir.exists()
+
+
+def test_ephemeral_workspace_link_mode_keeps_artifacts_isolated(tmp_path):
+    src = tmp_path / "src"
+    (src / "Proj").mkdir(parents=True)
+    (src / "Proj" / "Basic.lean").write_text("theorem t : True := trivial\n", encoding="utf-8")
+    (src / ".lake" / "build" / "lib").mkdir(parents=True)
+    (src / ".lake" / "build" / "lib" / "Basic.olean").write_bytes(b"olean")
+    (src / ".lake" / "packages" / "mathlib").mkdir(parents=True)
+    (src / ".lake" / "packages" / "mathlib" / "Mathlib.olean").write_bytes(b"mathlib")
+    (src / ".git").mkdir()
+
+    ws = EphemeralWorkspace(str(src), mode="link", temp_root=str(tmp_path / "ephemeral"))
+    with ws as workdir:
+        proj = pathlib.Path(workdir)
+        assert not (proj / ".lake" / "packages").is_symlink()
+        assert (proj / ".lake" / "packages" / "mathlib" / "Mathlib.olean").read_bytes() == b"mathlib"
+        assert (proj / ".lake" / "build" / "lib" / "Basic.olean").read_bytes() == b"olean"
+        assert not (proj / ".git").exists()
+
+        # Files the run writes are private copies.
+        (proj / "Proj" / "Basic.lean").write_text("changed\n", encoding="utf-8")
+        (proj / "reverse_gate.lean").write_text("gate\n", encoding="utf-8")
+        # A dependency rebuilt / updated inside the workspace stays there.
+        (proj / ".lake" / "packages" / "mathlib" / "Mathlib.olean").write_bytes(b"rebuilt")
+        (proj / ".lake" / "packages" / "new_dep").mkdir()
+        assert ws.stats["cloned"] + ws.stats["copied"] == 3 and ws.stats["seconds"] >= 0
+
+    assert (src / "Proj" / "Basic.lean").read_text(encoding="utf-8") == "theorem t : True := trivial\n"
+    assert not (src / "reverse_gate.lean").exists()
+    assert (src / ".lake" / "packages" / "mathlib" / "Mathlib.olean").read_bytes() == b"mathlib"
+    assert not (src / ".lake" / "packages" / "new_dep").exists()
+    assert not pathlib.Path(ws.temp_dir).exists()
+
+
+def test_link_mode_never_shares_build_outputs_with_the_source(tmp_path):
+    src = tmp_path / "src"
+    (src / ".lake" / "build" / "lib").mkdir(parents=True)
+    olean = src / ".lake" / "build" / "lib" / "Basic.olean"
+    olean.write_bytes(b"olean")
+
+    with EphemeralWorkspace(str(src), mode="link", temp_root=str(tmp_path / "ephemeral")) as workdir:
+        clone = pathlib.Path(workdir) / ".lake" / "build" / "lib" / "Basic.olean"
+        assert clone.stat().st_ino != olean.stat().st_ino
+        # Lake rewrites its own outputs in place: that must not reach the source project.
+        with open(clone, "r+b") as fp:
+            fp.write(b"OLEAN")
+
+    assert olean.read_bytes() == b"olean"
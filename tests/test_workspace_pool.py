@@ -0,0 +1,111 @@
+import os
+import pathlib
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from runtime.workspace_pool import WorkspacePool
+
+
+def _make_project(root: pathlib.Path) -> pathlib.Path:
+    src = root / "src"
+    (src / "Proj").mkdir(parents=True)
+    (src / "Proj" / "Basic.lean").write_text("theorem t : True := trivial\n", encoding="utf-8")
+    (src / ".lake" / "build").mkdir(parents=True)
+    (src / ".lake" / "build" / "Basic.olean").write_bytes(b"olean")
+    (src / ".lake" / "packages" / "mathlib").mkdir(parents=True)
+    (src / ".lake" / "packages" / "mathlib" / "Mathlib.olean").write_bytes(b"mathlib")
+    return src
+
+
+def test_workspace_pool_resets_only_touched_files(tmp_path):
+    src = _make_project(tmp_path)
+    pool = WorkspacePool(str(src), tmp_path / "pool", size=1)
+
+    lease = pool.lease()
+    with lease as workdir:
+        proj = pathlib.Path(workdir)
+        assert lease.stats["provisioned"] is True
+        (proj / "Proj" / "Basic.lean").write_text("edited\n", encoding="utf-8")
+        (proj / "reverse_gate.lean").write_text("gate\n", encoding="utf-8")
+        (proj / "MathProve").mkdir()
+        (proj / "MathProve" / "S1.lean").write_text("s1\n", encoding="utf-8")
+
+    assert (proj / "Proj" / "Basic.lean").read_text(encoding="utf-8") == "theorem t : True := trivial\n"
+    assert not (proj / "reverse_gate.lean").exists()
+    assert not (proj / "MathProve").exists()
+    assert not (proj / ".lake" / "packages").is_symlink()
+    assert (proj / ".lake" / "packages" / "mathlib" / "Mathlib.olean").read_bytes() == b"mathlib"
+    assert (src / "Proj" / "Basic.lean").read_text(encoding="utf-8") == "theorem t : True := trivial\n"
+
+    # Edits to the source project are picked up by the next lease.
+    (src / "Proj" / "Extra.lean").write_text("extra\n", encoding="utf-8")
+    lease = pool.lease()
+    with lease as workdir:
+        assert workdir == str(proj)
+        assert lease.stats["provisioned"] is False
+        assert (proj / "Proj" / "Extra.lean").exists()
+
+
+def test_workspace_pool_leases_are_exclusive(tmp_path):
+    src = _make_project(tmp_path)
+    pool = WorkspacePool(str(src), tmp_path / "pool", size=2)
+    with pool.lease() as a, pool.lease() as b:
+        assert a != b
+        with pytest.raises(TimeoutError):
+            pool.lease(timeout=0).__enter__()
+        assert all(s["leased"] for s in pool.status())
+    assert not any(s["leased"] for s in pool.status())
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses os._exit in a child process")
+def test_workspace_pool_recovers_from_crashed_holder(tmp_path):
+    src = _make_project(tmp_path)
+    root = tmp_path / "pool"
+    skill_dir = pathlib.Path(__file__).resolve().parents[1] / "skill"
+    child = textwrap.dedent(
+        f"""
+        import os, pathlib, sys
+        sys.path.insert(0, {str(skill_dir)!r})
+        from runtime.workspace_pool import WorkspacePool
+        pool = WorkspacePool({str(src)!r}, {str(root)!r}, size=1)
+        workdir = pool.lease().__enter__()
+        pathlib.Path(workdir, "leftover.lean").write_text("x", encoding="utf-8")
+        os._exit(3)
+        """
+    )
+    proc = subprocess.run([sys.executable, "-c", child], capture_output=True, text=True, check=False)
+    assert proc.returncode == 3, proc.stderr
+
+    pool = WorkspacePool(str(src), root, size=1)
+    lease = pool.lease(timeout=5)
+    with lease as workdir:
+        assert lease.stats["recovered"] is True
+        assert not pathlib.Path(workdir, "leftover.lean").exists()
+
+
+def test_workspace_pool_copy_mode_resets_only_touched_files(tmp_path):
+    src = _make_project(tmp_path)
+    (src / "build").mkdir()
+    (src / "build" / "old.olean").write_bytes(b"old")
+    pool = WorkspacePool(str(src), tmp_path / "pool", size=1, mode="copy")
+
+    with pool.lease() as workdir:
+        proj = pathlib.Path(workdir)
+        assert not (proj / "build").exists() and not (proj / ".lake" / "build" / "Basic.olean").exists()
+        assert not (proj / ".lake" / "packages").is_symlink()
+        kept = (proj / ".lake" / "packages" / "mathlib").stat().st_ino
+        (proj / "Proj" / "Basic.lean").write_text("edited\n", encoding="utf-8")
+        (proj / "reverse_gate.lean").write_text("gate\n", encoding="utf-8")
+
+    assert (proj / "Proj" / "Basic.lean").read_text(encoding="utf-8") == "theorem t : True := trivial\n"
+    assert not (proj / "reverse_gate.lean").exists()
+
+    lease = pool.lease()
+    with lease as workdir:
+        assert workdir == str(proj) and lease.stats["provisioned"] is False
+        # Untouched entries survive the reset instead of being re-cloned.
+        assert (proj / ".lake" / "packages" / "mathlib").stat().st_ino == kept
+        assert lease.stats["removed"] == 0 and lease.stats["restored"] == 0